@@ -0,0 +1,246 @@
+import asyncio
+import inspect
+import os
+import re
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from telemetry import REGISTRY, get_logger
+
+
+# --- 이미지 asset GC 설정 ---
+ASSET_GC_INTERVAL = float(os.getenv("ASSET_GC_INTERVAL", "3600"))  # 초, 0이면 백그라운드 GC를 끈다
+# 참조가 없어도 이 시간(초)보다 최근에 만들어진 파일은 지우지 않는다.
+# 생성 직후 클라이언트가 레코드를 저장하기 전까지의 결과를 보호한다.
+# STORAGE_BACKEND=sqlite로 여러 워커를 띄우면 다른 워커가 아직 저장하지 않은 결과도 이 시간으로만 보호되므로
+# 생성 결과를 저장하는 데 걸리는 시간보다 넉넉히 잡는다.
+ASSET_GC_GRACE_PERIOD = float(os.getenv("ASSET_GC_GRACE_PERIOD", str(24 * 3600)))
+
+# GC 대상 확장자 (default.svg 같은 정적 파일은 건드리지 않는다)
+ASSET_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+# character_sheet_<ns>_<랜덤>.png → character_sheet
+_GENERATED_NAME = re.compile(r"^([a-z_]+?)_\d+_[0-9a-f]+\.\w+$")
+# 캐릭터 등록 시 올린 원본: <초>_<원래 파일명>
+_UPLOADED_NAME = re.compile(r"^\d+_")
+
+log = get_logger("assets")
+
+ASSETS_COLLECTED = REGISTRY.counter("assets_collected_total", "Unreferenced image files removed by the asset GC", ("type",))
+ASSETS_COLLECTED_BYTES = REGISTRY.counter("assets_collected_bytes_total", "Bytes freed by the asset GC", ("type",))
+
+
+def asset_type(filename: str) -> str:
+    match = _GENERATED_NAME.match(filename)
+    if match:
+        return match.group(1)
+    if _UPLOADED_NAME.match(filename):
+        return "character"
+    return "other"
+
+
+class AssetRegistry:
+    # static/images 아래 파일 ↔ 그 파일을 참조하는 레코드.
+    # 레코드 컬렉션이 인덱싱할 때 retain(owner, urls), 빠질 때 release(owner)를 부른다.
+    # 파일의 refcount = 참조하는 owner 수 (owner = "characters:3" 같은 레코드 키).
+    # GC는 mark-and-sweep: 레코드 참조 + 추가 루트(생성 캐시, 체인, 작업 결과)로 살아있는 파일을 표시하고,
+    # 표시되지 않았고 grace_period보다 오래된 파일만 지운다.
+    def __init__(self, root_dir: str, base_url: str, grace_period: float = ASSET_GC_GRACE_PERIOD):
+        self.root_dir = root_dir
+        self.base_url = base_url.rstrip("/")
+        self.grace_period = grace_period
+        self.runs = 0
+        self.collected = 0
+        self.collected_bytes = 0
+        self.last_run: Optional[dict] = None
+        self._abs_root = os.path.abspath(root_dir)
+        self._refs: Dict[str, Set[str]] = {}
+        self._owned: Dict[str, Set[str]] = {}
+        self._roots: List[Callable[[], Union[Iterable[str], Awaitable[Iterable[str]]]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def relative_path(self, ref: str) -> Optional[str]:
+        # 이 서버의 이미지 URL이나 root_dir 아래 파일 경로 → "ab/storyboard_..png" (root_dir 기준)
+        if not ref:
+            return None
+        if ref.startswith(self.base_url + "/"):
+            return ref[len(self.base_url) + 1:]
+        if "://" in ref:
+            return None
+        path = os.path.abspath(ref)
+        if not path.startswith(self._abs_root + os.sep):
+            return None
+        return os.path.relpath(path, self._abs_root).replace(os.sep, "/")
+
+    # --- 참조 카운트 ---
+    def retain(self, owner: str, refs: Iterable[str]):
+        # owner의 참조 목록을 통째로 바꾼다
+        self.release(owner)
+        paths = {path for path in map(self.relative_path, refs) if path}
+        if not paths:
+            return
+        self._owned[owner] = paths
+        for path in paths:
+            self._refs.setdefault(path, set()).add(owner)
+
+    def release(self, owner: str):
+        for path in self._owned.pop(owner, ()):
+            owners = self._refs.get(path)
+            if owners is not None:
+                owners.discard(owner)
+                if not owners:
+                    del self._refs[path]
+
+    def refcount(self, ref: str) -> int:
+        path = self.relative_path(ref)
+        return len(self._refs.get(path, ())) if path else 0
+
+    def add_root(self, refs: Callable[[], Union[Iterable[str], Awaitable[Iterable[str]]]]):
+        # 레코드가 아니지만 파일을 붙잡고 있는 것 (URL이나 경로를 돌려주는 함수).
+        # 디스크/DB를 읽는 루트는 async 함수로 넘겨 이벤트 루프를 막지 않게 한다.
+        self._roots.append(refs)
+
+    async def mark(self) -> Set[str]:
+        # 루트를 먼저 돈다 (루트가 레코드를 읽으면서 retain 할 수 있다)
+        live = set()
+        for root in self._roots:
+            refs = root()
+            if inspect.isawaitable(refs):
+                refs = await refs
+            for ref in refs:
+                path = self.relative_path(ref)
+                if path:
+                    live.add(path)
+        live.update(self._refs)
+        return live
+
+    # --- mark-and-sweep ---
+    async def collect(self, dry_run: bool = False) -> dict:
+        started = time.perf_counter()
+        live = await self.mark()
+        files = await asyncio.to_thread(self._scan)
+        cutoff = time.time() - self.grace_period
+        candidates = [(path, size) for path, size, mtime in files if path not in live and mtime < cutoff]
+        # 스캔하는 동안 새로 참조된 파일은 빼고 지운다
+        if candidates:
+            live = await self.mark()
+            candidates = [(path, size) for path, size in candidates if path not in live]
+        removed = candidates if dry_run else await asyncio.to_thread(self._remove, candidates)
+
+        freed = sum(size for _, size in removed)
+        if not dry_run:
+            self.runs += 1
+            self.collected += len(removed)
+            self.collected_bytes += freed
+            for path, size in removed:
+                kind = asset_type(os.path.basename(path))
+                ASSETS_COLLECTED.inc(type=kind)
+                ASSETS_COLLECTED_BYTES.inc(size, type=kind)
+        result = {
+            "dryRun": dry_run,
+            "scanned": len(files),
+            "live": len(live),
+            "collected": len(removed),
+            "bytes": freed,
+            "durationMs": round((time.perf_counter() - started) * 1000, 1),
+            "at": time.time(),
+        }
+        if dry_run:
+            result["files"] = [path for path, _ in removed]
+        else:
+            self.last_run = result
+        log.info("Asset GC finished", dry_run=dry_run, scanned=len(files), collected=len(removed), bytes=freed)
+        return result
+
+    async def report(self) -> dict:
+        # asset 종류별 디스크 사용량과 참조 여부
+        live = await self.mark()
+        files = await asyncio.to_thread(self._scan)
+        by_type: Dict[str, dict] = {}
+        shards = set()
+        for path, size, _ in files:
+            kind = asset_type(os.path.basename(path))
+            usage = by_type.setdefault(kind, {"files": 0, "bytes": 0, "unreferenced": 0, "unreferencedBytes": 0})
+            usage["files"] += 1
+            usage["bytes"] += size
+            if path not in live:
+                usage["unreferenced"] += 1
+                usage["unreferencedBytes"] += size
+            if "/" in path:
+                shards.add(path.split("/", 1)[0])
+        return {
+            "types": dict(sorted(by_type.items())),
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "unshardedFiles": sum(1 for path, _, _ in files if "/" not in path),
+            "shards": len(shards),
+            "referencedFiles": len(self._refs),
+            "gracePeriod": self.grace_period,
+            "gc": self.stats(),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "collected": self.collected,
+            "collectedBytes": self.collected_bytes,
+            "lastRun": self.last_run,
+        }
+
+    # --- 백그라운드 GC ---
+    def start(self, interval: float = ASSET_GC_INTERVAL) -> Optional[asyncio.Task]:
+        if interval <= 0 or (self._task is not None and not self._task.done()):
+            return self._task
+        self._task = asyncio.create_task(self._run(interval))
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.collect()
+            except Exception as e:
+                log.error("Asset GC failed", exc_info=True, error=e)
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        # (상대 경로, 크기, mtime). 해시 샤드 폴더와 샤딩 전의 평평한 배치를 모두 본다.
+        files = []
+
+        def visit(directory: str, prefix: str):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not prefix:
+                            visit(entry.path, f"{entry.name}/")
+                        continue
+                    if not entry.name.lower().endswith(ASSET_EXTENSIONS):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((prefix + entry.name, st.st_size, st.st_mtime))
+
+        visit(self.root_dir, "")
+        return files
+
+    def _remove(self, candidates: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        removed = []
+        for path, size in candidates:
+            try:
+                os.remove(os.path.join(self.root_dir, path))
+                removed.append((path, size))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Failed to remove asset", path=path, error=e)
+        return removed
@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, List
+
+# 엔드포인트 벤치마크: 모델은 fake 백엔드로 대체하고 ASGI 앱을 httpx로 직접 호출한다 (네트워크/서버 프로세스 없음).
+# 데이터셋 크기마다 새 프로세스에서 임시 작업 폴더에 데이터를 만들어 main을 import 한다
+# (main은 import 시점에 data/를 읽기 때문).
+#
+#   cd server && python benchmarks/bench_endpoints.py --sizes 1000,10000,100000 --concurrency 16 --output bench.json
+#
+# 결과 JSON은 커밋 간 비교용: {"meta": {...}, "results": [{"size", "endpoint", "p50Ms", ...}]}
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = [
+    "character_upload",
+    "sketch_save",
+    "sketch_list",
+    "sketch_list_page",
+    "storyboard_save",
+    "storyboard_list",
+    "storyboard_list_page",
+    "story_update",
+    "generate_character_sheet",
+    "create_storyboard",
+    "generate_story_image",
+    "generate_next_scene",
+]
+
+
+def png_bytes(size: int = 64, color=(120, 80, 200)) -> bytes:
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# --- 데이터셋 ---
+def seed_dataset(work_dir: str, size: int, characters: int = 20):
+    # main이 읽는 스냅샷 형식 그대로 만든다 (storage.JournaledStore)
+    data_dir = os.path.join(work_dir, "data")
+    images_dir = os.path.join(work_dir, "static", "images")
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(images_dir, exist_ok=True)
+
+    image = png_bytes(256)
+    for name in ["bench_character.png", "bench_sheet.png", "bench_frame.png"]:
+        with open(os.path.join(images_dir, name), "wb") as f:
+            f.write(image)
+    images_url = "http://localhost:8000/static/images"
+
+    character_records = [
+        {
+            "id": i,
+            "name": f"character {i}",
+            "imageUrl": f"{images_url}/bench_character.png",
+            "characterSheets": [f"{images_url}/bench_sheet.png"] * 5,
+        }
+        for i in range(1, characters + 1)
+    ]
+    sketch_records = [
+        {
+            "id": i,
+            "name": f"sketch {i}",
+            "dataUrl": None,
+            "blobId": None,
+            "imageUrl": f"{images_url}/bench_frame.png",
+            "mimeType": "image/png",
+            "size": len(image),
+            "createdAt": "2024-01-01T00:00:00",
+        }
+        for i in range(1, size + 1)
+    ]
+    storyboard_records = [
+        {
+            "id": i,
+            "imageUrl": f"{images_url}/bench_frame.png",
+            "description": f"scene {i}",
+            "endFrameUrl": None,
+            "characterIds": [i % characters + 1],
+        }
+        for i in range(1, size + 1)
+    ]
+    story_records = [
+        {
+            "id": i,
+            "text": f"story {i}",
+            "elements": [{"type": "character", "content": "c", "character": {"id": i % characters + 1}}],
+            "createdAt": "2024-01-01T00:00:00",
+            "updatedAt": None,
+        }
+        for i in range(1, 101)
+    ]
+    snapshots = {
+        "characters.json": {"characters": character_records, "next_id": characters + 1},
+        "sketches.json": {"sketches": sketch_records},
+        "storyboards.json": {"storyboards": storyboard_records},
+        "stories.json": {"stories": story_records},
+    }
+    for filename, data in snapshots.items():
+        with open(os.path.join(data_dir, filename), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+
+# --- 요청 시나리오 ---
+def build_scenarios(client, size: int, bypass_cache: bool) -> Dict[str, Callable[[int], Awaitable]]:
+    images_url = "http://localhost:8000/static/images"
+    image = png_bytes(64)
+    data_url = "data:image/png;base64," + base64.b64encode(image).decode()
+    character = {
+        "id": 1,
+        "name": "character 1",
+        "imageUrl": f"{images_url}/bench_character.png",
+        "characterSheets": [f"{images_url}/bench_sheet.png"] * 5,
+    }
+    base_id = 10 ** 9
+
+    def character_upload(i):
+        return client.post("/api/characters", data={"name": f"bench {i}"}, files={"image": (f"bench_{i}.png", image, "image/png")})
+
+    def sketch_save(i):
+        return client.post("/api/sketches", json={"id": base_id + i, "name": f"bench {i}", "dataUrl": data_url, "createdAt": "2024-01-01T00:00:00"})
+
+    def storyboard_save(i):
+        scene = {"id": base_id + i, "imageUrl": f"{images_url}/bench_frame.png", "description": f"bench {i}"}
+        return client.post("/api/storyboards", json={"scenes": [scene]})
+
+    def story_update(i):
+        story_id = i % 100 + 1
+        return client.put(f"/api/stories/{story_id}", json={"text": f"story {story_id} rev {i}", "elements": [], "createdAt": "2024-01-01T00:00:00"})
+
+    def generate_character_sheet(i):
+        return client.post("/api/generate-character-sheet", json={"character": {**character, "characterSheets": []}, "bypassCache": bypass_cache})
+
+    def create_storyboard(i):
+        return client.post("/api/create-storyboard", json={
+            "backgroundImage": data_url,
+            "characters": [{"character": character, "x": 100 + i % 400, "y": 200}],
+            "prompt": f"bench scene {i}",
+            "bypassCache": bypass_cache,
+        })
+
+    def generate_story_image(i):
+        return client.post("/api/generate-story-image", json={
+            "story": f"bench story {i}",
+            "elements": [],
+            "characters": [character],
+            "bypassCache": bypass_cache,
+        })
+
+    def generate_next_scene(i):
+        return client.post("/api/generate-next-scene", json={
+            "startFrameUrl": f"{images_url}/bench_frame.png",
+            "prompt": f"bench direction {i}",
+            "bypassCache": bypass_cache,
+        })
+
+    return {
+        "character_upload": character_upload,
+        "sketch_save": sketch_save,
+        "sketch_list": lambda i: client.get("/api/sketches"),
+        "sketch_list_page": lambda i: client.get("/api/sketches", params={"limit": 50, "after": (i * 97) % max(1, size - 50) + 1}),
+        "storyboard_save": storyboard_save,
+        "storyboard_list": lambda i: client.get("/api/storyboards"),
+        "storyboard_list_page": lambda i: client.get("/api/storyboards", params={"limit": 50, "after": (i * 97) % max(1, size - 50) + 1}),
+        "story_update": story_update,
+        "generate_character_sheet": generate_character_sheet,
+        "create_storyboard": create_storyboard,
+        "generate_story_image": generate_story_image,
+        "generate_next_scene": generate_next_scene,
+    }
+
+
+async def run_scenario(request: Callable[[int], Awaitable], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await request(i)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsedSec": round(elapsed, 3),
+        "throughputRps": round(total / elapsed, 2) if elapsed > 0 else None,
+        "meanMs": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "p50Ms": round(percentile(latencies, 0.50), 3),
+        "p95Ms": round(percentile(latencies, 0.95), 3),
+        "p99Ms": round(percentile(latencies, 0.99), 3),
+        "maxMs": round(max(latencies), 3) if latencies else None,
+    }
+
+
+async def bench_size(args) -> List[dict]:
+    import httpx
+    import main
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        scenarios = build_scenarios(client, args.size, not args.use_cache)
+        for name in args.endpoints:
+            total = args.generation_requests if name.startswith(("generate", "create")) else args.requests
+            # 워밍업 (첫 요청의 import/디스크 캐시 비용 제외)
+            await scenarios[name](total + 1)
+            result = await run_scenario(scenarios[name], total, args.concurrency)
+            results.append({"size": args.size, "endpoint": name, "concurrency": args.concurrency, **result})
+            print(
+                f"[bench] size={args.size:<7} {name:<26} {result['throughputRps']:>9} rps"
+                f"  p50 {result['p50Ms']:>9.2f}  p95 {result['p95Ms']:>9.2f}  p99 {result['p99Ms']:>9.2f} ms"
+                f"  errors {result['errors']}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def run_worker(args):
+    # 임시 작업 폴더에서 데이터셋을 만들고 main을 import 해서 측정한다
+    with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+        seed_dataset(work_dir, args.size)
+        os.chdir(work_dir)
+        os.environ.setdefault("MODEL_BACKEND", "fake")
+        os.environ.setdefault("FAKE_LATENCY_MS", str(args.fake_latency_ms))
+        os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+        sys.path.insert(0, SERVER_DIR)
+        results = asyncio.run(bench_size(args))
+    # main이 stdout에 로그를 찍으므로 결과는 파일로 넘긴다
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=SERVER_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FastAPI endpoints with the model stubbed out.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated sketch/storyboard dataset sizes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per CRUD endpoint")
+    parser.add_argument("--generation-requests", type=int, default=50, help="requests per generation endpoint")
+    parser.add_argument("--fake-latency-ms", type=float, default=0, help="median latency of the fake model backend")
+    parser.add_argument("--use-cache", action="store_true", help="let generation requests hit the result caches")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of endpoints")
+    parser.add_argument("--output", default=None, help="write JSON results here (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="show the server's own log output")
+    # 내부용: 크기 하나를 측정하는 하위 프로세스
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    args.endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    if args.size is not None:
+        run_worker(args)
+        return
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+            result_path = result_file.name
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--size", str(size),
+            "--result-file", result_path,
+            "--concurrency", str(args.concurrency),
+            "--requests", str(args.requests),
+            "--generation-requests", str(args.generation_requests),
+            "--fake-latency-ms", str(args.fake_latency_ms),
+            "--endpoints", ",".join(args.endpoints),
+        ]
+        if args.use_cache:
+            command.append("--use-cache")
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL if not args.verbose else None)
+            with open(result_path, "r", encoding="utf-8") as f:
+                results.extend(json.load(f))
+        finally:
+            os.remove(result_path)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "generationRequests": args.generation_requests,
+            "fakeLatencyMs": args.fake_latency_ms,
+            "useCache": args.use_cache,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[bench] Wrote {len(results)} results to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
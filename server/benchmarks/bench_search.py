@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import List
+
+# 검색 색인 벤치마크: 한글/영어 단어가 Zipf 분포로 섞인 합성 문서를 SearchIndex에 넣고
+# 흔한 검색어/드문 검색어/여러 단어/캐릭터·컬렉션 필터 조합의 지연을 잰다.
+#
+#   cd server && python benchmarks/bench_search.py --sizes 10000,100000 --output search.json
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from search import SearchIndex  # noqa: E402
+from bench_endpoints import git_commit, percentile  # noqa: E402
+
+KINDS = ["stories", "storyboards", "sketches"]
+VOCABULARY = 4000
+CHARACTERS = 20
+
+
+def build_vocabulary(rng: random.Random):
+    syllables = [chr(0xAC00 + i) for i in range(0, 11172, 7)]
+    korean = ["".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(VOCABULARY)]
+    english = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(VOCABULARY)]
+    return korean, english
+
+
+def run_size(size: int, repeat: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    korean, english = build_vocabulary(rng)
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY)]
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    for record_id in range(size):
+        words = rng.choices(korean, weights, k=rng.randint(5, 25)) + rng.choices(english, weights, k=rng.randint(3, 15))
+        characters = [rng.randrange(CHARACTERS) for _ in range(rng.randint(0, 3))]
+        index.add(rng.choice(KINDS), record_id, " ".join(words), characters)
+    build_seconds = time.perf_counter() - started
+
+    queries = {
+        "common_en": {"query": english[0]},
+        "common_ko": {"query": korean[1]},
+        "rare_ko": {"query": korean[500]},
+        "two_terms": {"query": f"{english[0]} {english[1]}"},
+        "mixed": {"query": f"{korean[2]} {english[2]}"},
+        "single_syllable": {"query": korean[10][:1]},
+        "character_filter": {"query": english[0], "character_id": 3},
+        "type_filter": {"query": korean[1], "kinds": {"stories"}},
+        "deep_page": {"query": english[0], "offset": 200},
+    }
+    results = []
+    for name, params in queries.items():
+        params = dict(params)
+        query = params.pop("query")
+        # 첫 호출은 임팩트 순 목록을 만드는 비용이 들어가므로 따로 잰다
+        started = time.perf_counter()
+        _, total = index.search(query, **params)
+        first_ms = (time.perf_counter() - started) * 1000
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            index.search(query, **params)
+            timings.append((time.perf_counter() - started) * 1000)
+        results.append({
+            "size": size,
+            "query": name,
+            "matches": total,
+            "firstMs": round(first_ms, 3),
+            "p50Ms": round(percentile(timings, 0.5), 3),
+            "p95Ms": round(percentile(timings, 0.95), 3),
+            "buildSeconds": round(build_seconds, 2),
+        })
+
+    started = time.perf_counter()
+    for i in range(1000):
+        index.add("stories", size + i, f"{english[0]} {korean[1]} 새로운 장면", [3])
+    results.append({"size": size, "query": "incremental_add_x1000", "p50Ms": round((time.perf_counter() - started) * 1000, 3)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full-text search index on synthetic records.")
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated document counts")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per query")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write JSON results here (default: stdout)")
+    args = parser.parse_args()
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        results.extend(run_size(size, args.repeat, args.seed))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+# 시작 시간 벤치마크: 데이터셋 크기와 시작 모드(eager / LAZY_STARTUP=1)별로 새 프로세스를 띄워
+#   importMs      main import에 걸린 시간
+#   firstRequestMs  import 후 첫 요청(GET /api/sketches?limit=50) 응답까지
+#   readyMs       import + 첫 요청 = 첫 응답을 줄 수 있을 때까지
+#   firstSearchMs 첫 검색 요청 (지연 모드면 검색 색인을 만드는 시간 포함)
+#   processMs     인터프리터 시작부터 측정 종료까지 (프로세스 밖에서 잰 값)
+# 을 잰다. 각 조합은 --repeat 번 돌려 중앙값을 쓴다.
+#
+#   cd server && python benchmarks/bench_startup.py --sizes 1000,100000 --output startup.json
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import git_commit, percentile, seed_dataset  # noqa: E402
+
+MODES = {"eager": "0", "lazy": "1"}
+
+
+def run_worker(result_file: str):
+    # 작업 폴더(데이터셋이 있는 곳)에서 main을 import 하고 첫 요청까지 잰다
+    sys.path.insert(0, SERVER_DIR)
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    import httpx
+
+    async def first_requests():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            before = time.perf_counter()
+            response = await client.get("/api/sketches", params={"limit": 50})
+            response.raise_for_status()
+            listed = time.perf_counter()
+            response = await client.get("/api/search", params={"q": "scene"})
+            response.raise_for_status()
+            return listed - before, time.perf_counter() - listed
+
+    first_request, first_search = asyncio.run(first_requests())
+    result = {
+        "importMs": (imported - started) * 1000,
+        "firstRequestMs": first_request * 1000,
+        "readyMs": (imported - started + first_request) * 1000,
+        "firstSearchMs": first_search * 1000,
+    }
+    with open(result_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def measure(size: int, mode: str, repeat: int, verbose: bool) -> dict:
+    samples: List[dict] = []
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work_dir:
+        seed_dataset(work_dir, size)
+        env = {**os.environ, "LAZY_STARTUP": MODES[mode], "MODEL_BACKEND": "fake", "ASSET_GC_INTERVAL": "0"}
+        for _ in range(repeat):
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+                result_path = result_file.name
+            try:
+                started = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", result_path],
+                    check=True,
+                    cwd=work_dir,
+                    env=env,
+                    stdout=None if verbose else subprocess.DEVNULL,
+                )
+                process_ms = (time.perf_counter() - started) * 1000
+                with open(result_path, "r", encoding="utf-8") as f:
+                    samples.append({**json.load(f), "processMs": process_ms})
+            finally:
+                os.remove(result_path)
+
+    result = {"size": size, "mode": mode}
+    for key in ["importMs", "firstRequestMs", "readyMs", "firstSearchMs", "processMs"]:
+        result[key] = round(percentile([sample[key] for sample in samples], 0.5), 1)
+    print(
+        f"[bench] size={size:<7} {mode:<5} import {result['importMs']:>8.1f}  ready {result['readyMs']:>8.1f}"
+        f"  first search {result['firstSearchMs']:>8.1f}  process {result['processMs']:>8.1f} ms",
+        file=sys.stderr,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server import and time-to-first-response.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated sketch/storyboard dataset sizes")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated startup modes (eager, lazy)")
+    parser.add_argument("--repeat", type=int, default=3, help="process launches per size and mode")
+    parser.add_argument("--output", default=None, help="write JSON results here (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="show the server's own log output")
+    # 내부용: 측정 한 번을 맡는 하위 프로세스
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        for mode in modes:
+            results.append(measure(size, mode, args.repeat, args.verbose))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import uuid
+from typing import Optional, Tuple
+
+
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+}
+
+# 업로드 한 건의 최대 크기. Content-Length로 먼저 거르고, 스트리밍 중에도 센다.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class BlobTooLargeError(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+def decode_data_url(data_url: str) -> Tuple[str, bytes]:
+    # "data:image/png;base64,...." → ("image/png", bytes). 헤더가 없으면 PNG로 본다.
+    if data_url.startswith("data:"):
+        header, data = data_url.split(",", 1)
+        mime_type = header[5:].split(";", 1)[0] or "image/png"
+        return mime_type, base64.b64decode(data)
+    return "image/png", base64.b64decode(data_url)
+
+
+class BlobStore:
+    # 내용 해시(sha256)로 주소를 정하는 파일 저장소. 같은 바이트는 한 번만 저장된다.
+    # blob id = "<sha256><확장자>", 경로 = <root>/<해시 앞 2자리>/<blob id>
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, data: bytes, mime_type: str = "application/octet-stream") -> str:
+        blob_id = hashlib.sha256(data).hexdigest() + EXTENSIONS.get(mime_type, "")
+        path = self.path(blob_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return blob_id
+
+    def writer(self, max_bytes: int = UPLOAD_MAX_BYTES) -> "BlobWriter":
+        return BlobWriter(self, max_bytes)
+
+    def path(self, blob_id: str) -> str:
+        # blob id는 URL에서 들어오므로 경로 조작을 막는다
+        if not blob_id or "/" in blob_id or "\\" in blob_id or blob_id.startswith("."):
+            raise ValueError(f"Invalid blob id: {blob_id}")
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def exists(self, blob_id: str) -> bool:
+        try:
+            return os.path.exists(self.path(blob_id))
+        except ValueError:
+            return False
+
+    def read(self, blob_id: str) -> bytes:
+        with open(self.path(blob_id), 'rb') as f:
+            return f.read()
+
+    def size(self, blob_id: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(blob_id))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def mime_type(blob_id: str) -> str:
+        return mimetypes.guess_type(blob_id)[0] or "application/octet-stream"
+
+
+class BlobWriter:
+    # 업로드 본문을 청크 단위로 임시 파일에 쓰면서 해시를 같이 계산한다.
+    # 전체 바이트를 메모리에 모으지 않고, max_bytes를 넘는 순간 중단한다.
+    #   writer = store.writer(); writer.write(chunk)...; blob_id = writer.commit(mime_type)
+    HEAD_SIZE = 16  # 형식 판별(매직 바이트)에 쓰는 앞부분
+
+    def __init__(self, store: BlobStore, max_bytes: int = UPLOAD_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self._digest = hashlib.sha256()
+        self._tmp_path = os.path.join(store.root, f"upload-{uuid.uuid4().hex}.tmp")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise BlobTooLargeError(self.max_bytes)
+        if len(self.head) < self.HEAD_SIZE:
+            self.head += chunk[:self.HEAD_SIZE - len(self.head)]
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self, mime_type: str) -> str:
+        self._file.close()
+        blob_id = self._digest.hexdigest() + EXTENSIONS.get(mime_type, "")
+        path = self.store.path(blob_id)
+        if os.path.exists(path):
+            # 같은 내용이 이미 있다
+            os.remove(self._tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+        return blob_id
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
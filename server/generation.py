@@ -0,0 +1,205 @@
+import asyncio
+import functools
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimitExceeded,
+    RetryPolicy,
+    TokenBucket,
+    is_retryable,
+)
+from telemetry import BYTES_BUCKETS, REGISTRY, get_logger
+
+
+# --- 생성 호출 설정 ---
+# 동시에 모델로 나갈 수 있는 생성 요청 수와 호출당 타임아웃(초)
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "120"))
+
+log = get_logger("generation")
+
+MODEL_CALLS = REGISTRY.counter("model_calls_total", "Model calls by outcome (success, error, retry, unavailable)", ("model", "outcome"))
+MODEL_CALL_SECONDS = REGISTRY.histogram("model_call_duration_seconds", "Latency of a single model call attempt", ("model",))
+MODEL_REQUEST_BYTES = REGISTRY.histogram("model_request_size_bytes", "Prompt + inline image bytes sent to the model", ("model",), BYTES_BUCKETS)
+MODEL_RESPONSE_BYTES = REGISTRY.histogram("model_response_size_bytes", "Text + inline image bytes returned by the model", ("model",), BYTES_BUCKETS)
+GENERATION_COALESCED = REGISTRY.counter("generation_coalesced_total", "Generation requests that joined an identical in-flight call instead of calling the model", ("endpoint",))
+
+T = TypeVar("T")
+
+
+class GenerationTimeoutError(Exception):
+    pass
+
+
+class GenerationUnavailableError(Exception):
+    # 업스트림이 지금은 응답할 수 없는 상태 (서킷 열림 / 재시도 소진 / 레이트 리밋 대기 초과).
+    # 가짜 성공 대신 503 + Retry-After로 알려준다.
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationGateway:
+    # 모델 호출은 ModelBackend(model_backend.py)를 거친다. async 호출이라 이벤트 루프를 막지 않는다.
+    # 세마포어로 동시 호출 수를 제한해서 나머지 요청(CRUD, static)은 계속 처리된다.
+    # 호출 전에 서킷 브레이커와 토큰 버킷(쿼터)을 거치고, 일시적 오류는 지터 백오프로 재시도한다.
+    def __init__(
+        self,
+        backend,
+        concurrency: int = GENERATION_CONCURRENCY,
+        timeout: float = GENERATION_TIMEOUT,
+        retry: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._backend = backend
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.in_flight = 0
+        self.waiting = 0
+        self.retries = 0
+        self.unavailable = 0
+
+    async def generate_content(self, model: str, contents: List[Any], timeout: Optional[float] = None):
+        call_timeout = timeout if timeout is not None else self.timeout
+        attempt = 0
+        while True:
+            try:
+                # 토큰을 먼저 받는다: before_call 뒤에 거절/취소되면 half_open 시험 자리가 남아 버린다
+                await self.rate_limiter.acquire(max_wait=call_timeout)
+                probe = self.breaker.before_call()
+            except (CircuitOpenError, RateLimitExceeded) as e:
+                self.unavailable += 1
+                MODEL_CALLS.inc(model=model, outcome="unavailable")
+                raise GenerationUnavailableError(f"{model} unavailable: {e}", e.retry_after)
+
+            try:
+                response = await self._call(model, contents, call_timeout)
+            except Exception as e:
+                if not (is_retryable(e) or isinstance(e, GenerationTimeoutError)):
+                    # 요청 자체의 문제(400 등) - 업스트림은 살아 있다
+                    self.breaker.record_success()
+                    MODEL_CALLS.inc(model=model, outcome="error")
+                    raise
+                self.breaker.record_failure()
+                delay = self.retry.delay(attempt)
+                attempt += 1
+                if attempt >= self.retry.max_attempts or self.breaker.state == "open":
+                    self.unavailable += 1
+                    MODEL_CALLS.inc(model=model, outcome="unavailable")
+                    retry_after = max(delay, self.breaker.retry_after())
+                    raise GenerationUnavailableError(f"{model} unavailable after {attempt} attempts: {e}", retry_after) from e
+                self.retries += 1
+                MODEL_CALLS.inc(model=model, outcome="retry")
+                log.warning("Model call failed, retrying", model=model, attempt=attempt, delay_s=round(delay, 2), error=e)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # 취소(CancelledError) 등으로 결과 없이 끝나면 시험 자리를 돌려준다
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            MODEL_CALLS.inc(model=model, outcome="success")
+            MODEL_RESPONSE_BYTES.observe(response_size(response), model=model)
+            return response
+
+    async def _call(self, model: str, contents: List[Any], call_timeout: float):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        MODEL_REQUEST_BYTES.observe(contents_size(contents), model=model)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                self._backend.generate_content(model=model, contents=contents),
+                timeout=call_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise GenerationTimeoutError(f"{model} call timed out after {call_timeout:.0f}s")
+        finally:
+            MODEL_CALL_SECONDS.observe(time.perf_counter() - started, model=model)
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "inFlight": self.in_flight,
+            "waiting": self.waiting,
+            "timeout": self.timeout,
+            "retries": self.retries,
+            "unavailable": self.unavailable,
+            "rateLimit": self.rate_limiter.stats(),
+            "circuit": self.breaker.stats(),
+        }
+
+
+class SingleFlight:
+    # 같은 키(generation_key)의 생성이 이미 진행 중이면 모델을 다시 부르지 않고 그 결과를 같이 기다린다
+    # (더블 클릭, 프론트엔드 재시도). 모두 같은 결과 URL을 받는다.
+    # 공유 호출은 별도 태스크로 돌리고 asyncio.shield로 기다리므로 대기자 하나가 취소돼도
+    # (클라이언트 연결 끊김 등) 호출과 다른 대기자는 그대로다. 모두 떠나도 끝까지 돌아 결과 캐시에 남는다.
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]], endpoint: str = "") -> Tuple[T, bool]:
+        # (결과, 진행 중인 호출에 합류했는지)
+        task = self._calls.get(key)
+        joined = task is not None
+        if task is None:
+            task = asyncio.create_task(call())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(functools.partial(self._finished, key))
+        else:
+            self.coalesced += 1
+            GENERATION_COALESCED.inc(endpoint=endpoint)
+            log.info("Joined in-flight generation", endpoint=endpoint, key=key[:12])
+        return await asyncio.shield(task), joined
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 대기자가 모두 취소된 뒤 실패해도 "exception was never retrieved" 경고가 나지 않게
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {"inFlight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
+
+
+def contents_size(contents: List[Any]) -> int:
+    size = 0
+    for item in contents:
+        if isinstance(item, str):
+            size += len(item.encode("utf-8"))
+            continue
+        if getattr(item, "text", None):
+            size += len(item.text.encode("utf-8"))
+        inline_data = getattr(item, "inline_data", None)
+        if inline_data is not None and inline_data.data:
+            size += len(inline_data.data)
+    return size
+
+
+def response_size(response) -> int:
+    candidates = getattr(response, "candidates", None) or []
+    if not candidates or candidates[0].content is None:
+        return 0
+    return contents_size(candidates[0].content.parts or [])
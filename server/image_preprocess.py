@@ -0,0 +1,201 @@
+import hashlib
+import os
+import threading
+import time
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from telemetry import get_logger
+
+
+# --- 참조 이미지 전처리 설정 ---
+# 모델에 올리기 전에 긴 변을 REFERENCE_MAX_EDGE로 줄이고 WEBP/JPEG로 다시 인코딩한다.
+REFERENCE_MAX_EDGE = int(os.getenv("REFERENCE_MAX_EDGE", "1024"))
+REFERENCE_FORMAT = os.getenv("REFERENCE_FORMAT", "WEBP").upper()  # WEBP | JPEG
+REFERENCE_QUALITY = int(os.getenv("REFERENCE_QUALITY", "85"))
+REFERENCE_SHEETS_PER_CHARACTER = int(os.getenv("REFERENCE_SHEETS_PER_CHARACTER", "3"))
+REFERENCE_VARIANTS_MAX_BYTES = int(os.getenv("REFERENCE_VARIANTS_MAX_BYTES", str(512 * 1024 ** 2)))
+# 이보다 최근에 쓰였거나 읽힌 변형(쓰는 중인 임시 파일 포함)은 용량이 넘쳐도 지우지 않는다
+REFERENCE_VARIANTS_MIN_AGE = float(os.getenv("REFERENCE_VARIANTS_MIN_AGE", "60"))
+
+log = get_logger("preprocess")
+
+FORMAT_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+FORMAT_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+# 캐릭터 시트 5종 순서: 0 비율, 1 삼면도, 2 표정, 3 포즈, 4 의상
+# 장면 생성에는 삼면도와 의상이 가장 중요하고, 그다음 표정/포즈/비율 순
+SHEET_PRIORITY = [1, 4, 2, 3, 0]
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
+
+
+def select_sheets(sheet_urls: List[str], limit: int = REFERENCE_SHEETS_PER_CHARACTER) -> List[str]:
+    # 모든 시트를 붙이지 않고 캐릭터당 limit장만 고른다
+    if limit <= 0 or len(sheet_urls) <= limit:
+        return list(sheet_urls)
+    if len(sheet_urls) == len(SHEET_PRIORITY):
+        chosen = sorted(SHEET_PRIORITY[:limit])
+        return [sheet_urls[i] for i in chosen]
+    return list(sheet_urls[:limit])
+
+
+class ReferencePreprocessor:
+    # 결과는 원본 해시 기준으로 디스크에 저장해 두고 재사용한다.
+    # <cache_dir>/<해시 앞 2자리>/<sha256>_<edge>_<format><quality>.<ext>
+    # 폴더 총 용량이 max_bytes를 넘으면 가장 오래 안 쓰인 것(mtime 기준)부터 지운다.
+    # 방금 다른 요청이 쓰거나 읽은 변형은 REFERENCE_VARIANTS_MIN_AGE 동안 지우지 않는다.
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = REFERENCE_VARIANTS_MAX_BYTES,
+        max_edge: int = REFERENCE_MAX_EDGE,
+        image_format: str = REFERENCE_FORMAT,
+        quality: int = REFERENCE_QUALITY,
+    ):
+        if image_format not in FORMAT_MIME_TYPES:
+            image_format = "WEBP"
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.image_format = image_format
+        self.quality = quality
+        self.evictions = 0
+        self._total_bytes: Optional[int] = None
+        # prepare는 여러 스레드에서 동시에 불리므로 용량 계산/삭제는 잠금 안에서
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def prepare(self, data: bytes) -> Tuple[bytes, str]:
+        # 동기 함수: CPU 작업이므로 호출하는 쪽에서 스레드로 돌린다
+        source_mime = sniff_mime_type(data) or "image/png"
+        digest = hashlib.sha256(data).hexdigest()
+        variant_path = os.path.join(
+            self.cache_dir,
+            digest[:2],
+            f"{digest}_{self.max_edge}_{self.image_format.lower()}{self.quality}{FORMAT_EXTENSIONS[self.image_format]}",
+        )
+        try:
+            with open(variant_path, "rb") as f:
+                encoded = f.read()
+            _touch(variant_path)
+            return encoded, FORMAT_MIME_TYPES[self.image_format]
+        except FileNotFoundError:
+            pass
+
+        try:
+            image = Image.open(BytesIO(data))
+            image.load()
+        except Exception as e:
+            log.warning("Could not decode reference image, sending original", error=e)
+            return data, source_mime
+
+        resized = max(image.size) > self.max_edge
+        if resized:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        if self.image_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+            image = _flatten(image) if self.image_format == "JPEG" else image.convert("RGBA")
+
+        buffer = BytesIO()
+        image.save(buffer, format=self.image_format, quality=self.quality)
+        encoded = buffer.getvalue()
+
+        # 줄이지도 않았고 다시 인코딩해도 작아지지 않으면 원본 그대로 보낸다
+        if not resized and len(encoded) >= len(data):
+            return data, source_mime
+
+        # 같은 이미지를 여러 스레드가 동시에 만들 수 있으므로 임시 파일은 스레드마다 따로
+        tmp_path = f"{variant_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(encoded)
+            os.replace(tmp_path, variant_path)
+        except OSError as e:
+            # 디스크 캐시는 재사용용일 뿐이다. 못 남겨도 인코딩한 결과는 그대로 보낸다
+            log.warning("Could not store reference variant", error=e)
+            return encoded, FORMAT_MIME_TYPES[self.image_format]
+        self._account(len(encoded))
+        return encoded, FORMAT_MIME_TYPES[self.image_format]
+
+    def _account(self, size: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = _directory_size(self.cache_dir)
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._total_bytes = self._evict()
+
+    def _evict(self) -> int:
+        # 용량의 90%까지 오래된 것부터 삭제. 최근에 쓰인 것은 용량에만 넣고 건너뛴다
+        files = []
+        recent = time.time() - REFERENCE_VARIANTS_MIN_AGE
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for mtime, size, path in sorted(files):
+            if total <= target or mtime > recent:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "bytes": self._total_bytes,
+            "maxBytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    # JPEG는 알파가 없으므로 흰 배경에 합성
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[3])
+        return background
+    return image.convert("RGB")
+
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
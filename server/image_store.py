@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from typing import BinaryIO, Set, Tuple
+
+from PIL import Image
+
+from blob_store import EXTENSIONS
+from image_preprocess import sniff_mime_type
+from telemetry import get_logger
+
+
+# --- 생성 이미지 저장 설정 ---
+# 1이면 저장 후 백그라운드에서 PIL로 한 번 더 검증한다 (응답은 기다리지 않음)
+IMAGE_VERIFY = os.getenv("IMAGE_VERIFY", "0") == "1"
+
+log = get_logger("images")
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+class GeneratedImageStore:
+    # 모델이 돌려준 인코딩된 바이트를 디코드/재인코드 없이 그대로 디스크에 쓴다.
+    # 형식은 매직 바이트로 확인하고, 파일명은 ns 타임스탬프 + 랜덤 접미사라 겹치지 않는다.
+    # 한 폴더에 파일이 무한정 쌓이지 않게 파일명 해시 앞 2자리 폴더로 나눠 저장한다 (<images>/ab/<파일명>).
+    def __init__(self, images_dir: str, base_url: str, verify: bool = IMAGE_VERIFY):
+        self.images_dir = images_dir
+        self.base_url = base_url.rstrip("/")
+        self.verify = verify
+        self._verifications: Set[asyncio.Task] = set()
+        self._shards: Set[str] = set()
+        os.makedirs(images_dir, exist_ok=True)
+
+    def new_filename(self, prefix: str, extension: str) -> str:
+        return f"{prefix}_{time.time_ns()}_{uuid.uuid4().hex[:8]}{extension}"
+
+    def shard_path(self, filename: str) -> str:
+        # images_dir 기준 상대 경로. 샤드 폴더는 처음 쓸 때 만든다.
+        shard = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+        if shard not in self._shards:
+            os.makedirs(os.path.join(self.images_dir, shard), exist_ok=True)
+            self._shards.add(shard)
+        return f"{shard}/{filename}"
+
+    async def save(self, data: bytes, prefix: str) -> Tuple[str, str]:
+        # (이미지 URL, 저장 경로)를 돌려준다
+        mime_type = sniff_mime_type(data)
+        if mime_type is None:
+            raise InvalidImageError(f"Generated {prefix} data is not a known image format ({len(data)} bytes)")
+
+        relative_path = self.shard_path(self.new_filename(prefix, EXTENSIONS[mime_type]))
+        path = os.path.join(self.images_dir, relative_path)
+        await asyncio.to_thread(_write_file, path, data)
+
+        if self.verify:
+            task = asyncio.create_task(asyncio.to_thread(_verify_image, path))
+            self._verifications.add(task)
+            task.add_done_callback(self._verifications.discard)
+        return f"{self.base_url}/{relative_path}", path
+
+    async def save_upload(self, source: BinaryIO, prefix: str) -> Tuple[str, str]:
+        # 사용자가 올린 파일: 올린 파일명/확장자는 믿지 않고 매직 바이트로 형식을 확인해 그 확장자로 저장한다.
+        # 이름은 겹치지 않게 새로 만들고, 읽기/복사는 스레드에서.
+        mime_type = sniff_mime_type(await asyncio.to_thread(_read_head, source))
+        if mime_type is None:
+            raise InvalidImageError("Upload is not a PNG, JPEG, WEBP or GIF image")
+        relative_path = self.shard_path(self.new_filename(prefix, EXTENSIONS[mime_type]))
+        path = os.path.join(self.images_dir, relative_path)
+        await asyncio.to_thread(_copy_file, path, source)
+        return f"{self.base_url}/{relative_path}", path
+
+
+def _write_file(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_head(source: BinaryIO) -> bytes:
+    # 형식 판별에 필요한 앞부분만 읽고 되돌린다
+    head = source.read(16)
+    source.seek(0)
+    return head
+
+
+def _copy_file(path: str, source: BinaryIO):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(source, f)
+    os.replace(tmp_path, path)
+
+
+def _verify_image(path: str):
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception as e:
+        log.error("Saved image failed verification", path=path, error=e)
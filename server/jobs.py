@@ -0,0 +1,382 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from storage import SqliteDatabase
+from telemetry import get_logger
+
+
+# --- 잡 큐 설정 ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))            # 동시에 실행되는 잡 수 (max in-flight)
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "200"))    # 대기열 상한, 넘으면 거절
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "1000"))     # 메모리에 남겨둘 완료 잡 수
+# 공유 저장소(sqlite)일 때 다른 워커가 실행하는 잡의 상태를 다시 읽는 간격 (초)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# 공유 저장소일 때 워커는 이 간격의 1/3마다 살아 있다고 기록한다.
+# 이 시간(초) 동안 기록이 없는 워커의 잡은 다른 워커가 가져간다 (대기 중이면 다시 큐에, 실행 중이었으면 실패).
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+log = get_logger("jobs")
+
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str = "queued"  # queued | running | succeeded | failed
+    priority: int = 0
+    payload: dict = {}
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    worker: Optional[str] = None  # 잡을 실행할 JobQueue (공유 저장소에서 주인 없는 잡을 찾을 때)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    # 러너가 결과를 돌려줬지만 실패로 기록해야 할 때 (기본 이미지로 대신한 응답 등). 결과는 잡에 남긴다.
+    def __init__(self, message: str, result: Optional[dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+# --- 잡 저장소 ---
+# JobQueue는 이 인터페이스만 사용하므로 Redis/DB 구현으로 교체할 수 있다.
+class JobStore(ABC):
+    # True면 I/O를 하는 저장소: JobQueue가 put/get을 스레드에서 부른다
+    blocking = False
+    # True면 다른 워커도 같은 저장소를 본다: 다른 워커가 실행하는 잡은 주기적으로 다시 읽는다
+    shared = False
+
+    @abstractmethod
+    def put(self, job: Job):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        ...
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def heartbeat(self, worker: str):
+        # 공유 저장소만 필요하다: 프로세스 안 저장소의 잡은 프로세스와 같이 사라진다
+        pass
+
+    def reclaim(self, worker: str, lease: float) -> List[Job]:
+        # lease 동안 heartbeat가 없는 워커의 미완료 잡을 worker에게 넘기고, 다시 큐에 넣을 잡을 돌려준다
+        return []
+
+
+class InMemoryJobStore(JobStore):
+    def __init__(self, retention: int = JOB_RETENTION):
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._retention = retention
+
+    def put(self, job: Job):
+        self._jobs[job.id] = job
+        self._jobs.move_to_end(job.id)
+        self._evict()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        return [job for job in self._jobs.values() if status is None or job.status == status]
+
+    def _evict(self):
+        # 오래된 완료 잡부터 정리 (대기/실행 중인 잡은 남긴다)
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in TERMINAL_STATUSES]
+        overflow = len(self._jobs) - self._retention
+        for job_id in finished[:max(0, overflow)]:
+            del self._jobs[job_id]
+
+
+class SqliteJobStore(JobStore):
+    # STORAGE_BACKEND=sqlite: 잡을 레코드와 같은 SQLite 파일에 둔다.
+    # 잡은 제출받은 워커가 실행하지만, 조회/대기/SSE는 어느 워커로 와도 된다.
+    blocking = True
+    shared = True
+
+    def __init__(self, db: SqliteDatabase, retention: int = JOB_RETENTION):
+        self.db = db
+        self._retention = retention
+        with db.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, status TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS job_workers (id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+
+    def put(self, job: Job):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, data = excluded.data",
+                (job.id, job.status, job.json()),
+            )
+            if job.status in TERMINAL_STATUSES:
+                self._evict(conn)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.db.transaction(immediate=False) as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.parse_raw(row[0]) if row else None
+
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        with self.db.transaction(immediate=False) as conn:
+            if status is None:
+                rows = conn.execute("SELECT data FROM jobs ORDER BY seq").fetchall()
+            else:
+                rows = conn.execute("SELECT data FROM jobs WHERE status = ? ORDER BY seq", (status,)).fetchall()
+        return [Job.parse_raw(data) for data, in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self.db.transaction(immediate=False) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def heartbeat(self, worker: str):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO job_workers (id, heartbeat) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (worker, time.time()),
+            )
+
+    def reclaim(self, worker: str, lease: float) -> List[Job]:
+        # 한 쓰기 트랜잭션에서 하므로 두 워커가 같은 잡을 가져가지 않는다
+        cutoff = time.time() - lease
+        requeued = []
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM job_workers WHERE heartbeat < ?", (cutoff,))
+            live = {row[0] for row in conn.execute("SELECT id FROM job_workers")}
+            rows = conn.execute("SELECT data FROM jobs WHERE status IN ('queued', 'running') ORDER BY seq").fetchall()
+            for data, in rows:
+                job = Job.parse_raw(data)
+                if job.worker in live:
+                    continue
+                if job.status == "queued":
+                    job.worker = worker
+                    requeued.append(job)
+                else:
+                    # 실행 중에 워커가 죽었다. 생성이 어디까지 됐는지 모르므로 다시 돌리지 않고 실패로 닫는다.
+                    job.status = "failed"
+                    job.error = "Worker stopped while running the job"
+                    job.finishedAt = time.time()
+                conn.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?", (job.status, job.json(), job.id))
+        for job in requeued:
+            log.info("Reclaimed queued job from a stopped worker", job_id=job.id, kind=job.kind)
+        return requeued
+
+    def _evict(self, conn):
+        # 오래된 완료 잡부터 정리 (대기/실행 중인 잡은 남긴다)
+        total = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        overflow = total - self._retention
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM jobs WHERE seq IN (SELECT seq FROM jobs WHERE status IN (?, ?) ORDER BY seq LIMIT ?)",
+                (*TERMINAL_STATUSES, overflow),
+            )
+
+
+# --- 잡 큐 ---
+class JobQueue:
+    # priority 값이 클수록 먼저 실행된다. 같은 priority는 들어온 순서대로.
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[str, dict], Awaitable[dict]],
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_MAX_QUEUED,
+    ):
+        self.store = store
+        self._runner = runner
+        self._workers = max(1, workers)
+        self._max_queued = max_queued
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        self._changed: Dict[str, asyncio.Event] = {}
+        self.worker_id = uuid.uuid4().hex
+        self._lease_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        # 공유 저장소면 서버 시작 때 띄워서, 제출이 없어도 죽은 워커의 잡을 가져오게 한다
+        if self.store.shared:
+            await asyncio.to_thread(self.store.heartbeat, self.worker_id)
+        self._ensure_workers()
+
+    async def stop(self):
+        tasks = self._tasks + ([self._lease_task] if self._lease_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._lease_task = None
+
+    def _ensure_workers(self):
+        # 워커는 실행 중인 이벤트 루프에서 처음 submit 될 때 띄운다
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self._workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+        if self.store.shared and (self._lease_task is None or self._lease_task.done()):
+            self._lease_task = asyncio.create_task(self._keep_lease())
+
+    async def submit(self, kind: str, payload: dict, priority: int = 0) -> Job:
+        self._ensure_workers()
+        if self._queue.qsize() >= self._max_queued:
+            raise QueueFullError(f"job queue is full ({self._max_queued} queued)")
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, priority=priority, payload=payload, createdAt=time.time(), worker=self.worker_id)
+        await self._save(job)
+        self._queue.put_nowait((-priority, next(self._seq), job.id))
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        if self.store.blocking:
+            return await asyncio.to_thread(self.store.get, job_id)
+        return self.store.get(job_id)
+
+    async def list(self) -> List[Job]:
+        if self.store.blocking:
+            return await asyncio.to_thread(self.store.list)
+        return self.store.list()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        # long-poll: 잡이 끝나거나 timeout이 지날 때까지 대기
+        deadline = time.monotonic() + timeout
+        job = await self.get(job_id)
+        while job is not None and job.status not in TERMINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._event(job_id).wait(), timeout=self._poll_timeout(remaining))
+            except asyncio.TimeoutError:
+                if not self.store.shared:
+                    break
+            job = await self.get(job_id)
+        self._forget(job)
+        return job
+
+    async def events(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[str]:
+        # SSE 스트림: 상태가 바뀔 때마다 잡 전체를 보내고, 끝나면 종료한다
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            job = await self.get(job_id)
+            if job is None:
+                yield "event: error\ndata: {\"error\": \"Job not found\"}\n\n"
+                return
+            if job.status != last_status:
+                last_status = job.status
+                last_sent = time.monotonic()
+                data = json.dumps(job.dict(exclude={"payload", "worker"}), ensure_ascii=False)
+                yield f"event: {job.status}\ndata: {data}\n\n"
+            if job.status in TERMINAL_STATUSES:
+                self._forget(job)
+                return
+            try:
+                await asyncio.wait_for(self._event(job_id).wait(), timeout=self._poll_timeout(heartbeat))
+            except asyncio.TimeoutError:
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+
+    def queued(self) -> int:
+        # 이 워커의 큐에서 실행을 기다리는 잡 수 (저장소를 읽지 않는다)
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stats(self) -> dict:
+        counts = await asyncio.to_thread(self.store.counts) if self.store.blocking else self.store.counts()
+        return {
+            "workers": self._workers,
+            "queued": self.queued(),
+            "jobs": counts,
+        }
+
+    def _poll_timeout(self, timeout: float) -> float:
+        # 다른 워커가 실행하는 잡은 이 워커의 이벤트가 울리지 않으므로 저장소를 주기적으로 다시 읽는다
+        return min(timeout, JOB_POLL_INTERVAL) if self.store.shared else timeout
+
+    def _event(self, job_id: str) -> asyncio.Event:
+        if job_id not in self._changed:
+            self._changed[job_id] = asyncio.Event()
+        return self._changed[job_id]
+
+    def _forget(self, job: Optional[Job]):
+        # 다른 워커의 잡을 기다리느라 만든 이벤트는 잡이 끝나면 치운다
+        if job is not None and job.status in TERMINAL_STATUSES:
+            self._changed.pop(job.id, None)
+
+    async def _save(self, job: Job):
+        if self.store.blocking:
+            await asyncio.to_thread(self.store.put, job)
+        else:
+            self.store.put(job)
+        # 기다리는 쪽을 깨우고 다음 변경을 위해 이벤트를 새로 만든다
+        event = self._changed.pop(job.id, None)
+        if event is not None:
+            event.set()
+        if job.status not in TERMINAL_STATUSES:
+            self._changed[job.id] = asyncio.Event()
+
+    async def _keep_lease(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.worker_id)
+                for job in await asyncio.to_thread(self.store.reclaim, self.worker_id, JOB_LEASE_SECONDS):
+                    self._queue.put_nowait((-job.priority, next(self._seq), job.id))
+            except Exception as e:
+                log.error("Job lease renewal failed", exc_info=True, error=e)
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                job = await self.get(job_id)
+                # 이 워커가 멈춘 사이 다른 워커가 가져간 잡은 건너뛴다
+                if job is None or job.status != "queued" or job.worker != self.worker_id:
+                    continue
+                job.status = "running"
+                job.startedAt = time.time()
+                await self._save(job)
+                try:
+                    job.result = await self._runner(job.kind, job.payload)
+                    job.status = "succeeded"
+                except JobFailed as e:
+                    log.warning("Job failed", job_id=job.id, kind=job.kind, error=e)
+                    job.result = e.result
+                    job.error = str(e)
+                    job.status = "failed"
+                except Exception as e:
+                    log.warning("Job failed", job_id=job.id, kind=job.kind, error=e)
+                    job.error = str(e)
+                    job.status = "failed"
+                job.finishedAt = time.time()
+                await self._save(job)
+            finally:
+                self._queue.task_done()
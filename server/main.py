@@ -1,24 +1,41 @@
 import asyncio
 import os
-import shutil
 import time  # time 모듈을 임포트합니다.
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 import json
 import base64
+import math
+import uuid
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from google import genai
-from PIL import Image
-from io import BytesIO
+from pydantic import BaseModel, model_validator
 from dotenv import load_dotenv
-from google.genai import types
+
+from assets import AssetRegistry
+from blob_store import UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES, BlobStore, BlobTooLargeError, decode_data_url
+from generation import GenerationGateway, GenerationUnavailableError, SingleFlight
+from image_preprocess import ReferencePreprocessor, select_sheets, sniff_mime_type
+from image_store import GeneratedImageStore, InvalidImageError
+from jobs import InMemoryJobStore, JobFailed, JobQueue, QueueFullError, SqliteJobStore
+from model_backend import create_backend, types
+from reference_images import ReferenceByteCache, ReferenceImage, local_path_from_url
+from records import RecordCollection, etag_matches, parse_fields
+from result_cache import GenerationCache, generation_key
+from search import SearchIndex
+from storage import STORAGE_BACKEND, ConflictError, open_store, shared_database, write_json_atomic
+from telemetry import GENERATION_STAGE_SECONDS, PROMETHEUS_CONTENT_TYPE, REGISTRY, MetricsMiddleware, StageTimer, get_logger
+from thumbnails import ThumbnailNotFound, ThumbnailService, ThumbnailUnsupported, is_raster, thumbnail_url
+
+log = get_logger("api")
+IMPORT_STARTED = time.perf_counter()
 
 # Load environment variables
 success = load_dotenv("../.env")
-print(f".env loaded? {success}")
+log.info("Environment loaded", dotenv=success, api_key_set=bool(os.getenv("GOOGLE_API_KEY")))
 
 # --- Static 파일 설정 ---
 STATIC_DIR = "static"
@@ -28,18 +45,93 @@ CHARACTERS_JSON = os.path.join(DATA_DIR, "characters.json")
 SKETCHES_JSON = os.path.join(DATA_DIR, "sketches.json")
 STORYBOARDS_JSON = os.path.join(DATA_DIR, "storyboards.json")
 STORIES_JSON = os.path.join(DATA_DIR, "stories.json")
+GENERATION_CACHE_JSON = os.path.join(DATA_DIR, "generation_cache.json")
+SCENE_CACHE_JSON = os.path.join(DATA_DIR, "scene_cache.json")
+BLOBS_DIR = os.path.join(DATA_DIR, "blobs")
+REFERENCE_VARIANTS_DIR = os.path.join(DATA_DIR, "derived", "references")
+THUMBNAILS_DIR = os.path.join(DATA_DIR, "derived", "thumbs")
+CHAINS_DIR = os.path.join(DATA_DIR, "chains")
+IMAGES_URL = f"http://localhost:8000/{STATIC_DIR}/images"
+BLOBS_URL = "http://localhost:8000/api/blobs"
+THUMBS_URL = f"http://localhost:8000/{STATIC_DIR}/thumbs"
 os.makedirs(IMAGES_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
-print("GOOGLE_API_KEY in env:", os.getenv("GOOGLE_API_KEY"))
 
-# --- Gemini AI 클라이언트 설정 ---
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+# --- 캐릭터 시트 설정 ---
+# single: 모델 호출 한 번에 5종을 모두 만든다 (기존 방식)
+# sections: 시트마다 따로 병렬 호출하고, 끝나는 대로 저장한다. 실패한 시트만 다시 만들 수 있다.
+CHARACTER_SHEET_MODE = os.getenv("CHARACTER_SHEET_MODE", "single").lower()
+# characterSheets의 순서 = 이 순서 (image_preprocess.SHEET_PRIORITY도 이 순서를 가정한다)
+CHARACTER_SHEET_SECTIONS = [
+    ("proportions", "Proportion settings (height comparisons, head-to-body ratios, etc.)"),
+    ("views", "Three views (front, side, back)"),
+    ("expressions", "Expression settings (Expression Sheet) - showing various facial expressions"),
+    ("poses", "Action settings (Pose Sheet) - showing various common poses"),
+    ("costumes", "Clothing settings (Costume Design) - showing different outfit variations"),
+]
+CHARACTER_SHEET_SECTION_NAMES = [name for name, _ in CHARACTER_SHEET_SECTIONS]
+# 시트를 저장할 때 다른 수정과 충돌하면 다시 읽어 합치는 최대 횟수
+CHARACTER_SHEET_WRITE_ATTEMPTS = 5
+
+# --- 시작 모드 ---
+# LAZY_STARTUP=1 이면 레코드 컬렉션을 import 시점이 아니라 처음 접근할 때 읽고,
+# 검색 색인은 첫 검색 때 만든다 (콜드 스타트/오토스케일 시 첫 요청까지의 시간 단축).
+# 모델 클라이언트와 google.genai import는 모드와 상관없이 첫 생성 때로 미룬다.
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0") == "1"
+
+# --- 모델 백엔드 설정 ---
+# MODEL_BACKEND=gemini(기본) | fake (네트워크 없이 합성 이미지, 부하 테스트용)
+model_backend = create_backend()
+# 생성 호출은 모두 generator를 거친다 (async 호출 + 동시성 제한 + 타임아웃)
+generator = GenerationGateway(model_backend)
+# 생성 키가 같은 동시 요청은 진행 중인 모델 호출 하나를 같이 기다린다
+generation_flights = SingleFlight()
+IMAGE_MODEL = "gemini-2.5-flash-image-preview"
+VISION_MODEL = "gemini-2.0-flash-exp"
+
+# 동일한 입력(모델, 프롬프트, 참조 이미지, 비율)의 생성 결과를 재사용한다
+generation_cache = GenerationCache(GENERATION_CACHE_JSON)
+# create-storyboard 1단계(비전 분석) 장면 설명 캐시: (스케치, 캐릭터 위치, 프롬프트) 기준
+scene_cache = GenerationCache(SCENE_CACHE_JSON)
+
+# 스케치 캔버스 같은 업로드 이미지의 원본 바이트 (내용 해시 기준 중복 제거)
+blob_store = BlobStore(BLOBS_DIR)
+
+# 생성된 이미지는 받은 바이트 그대로 저장한다 (디코드/재인코드 없음)
+image_store = GeneratedImageStore(IMAGES_DIR, IMAGES_URL)
+
+# static/images 파일을 참조하는 레코드 추적 (refcount) + 참조 없는 파일 GC
+asset_registry = AssetRegistry(IMAGES_DIR, IMAGES_URL)
+
+# 스토리 본문/장면 설명/스케치 이름 전문 검색 (레코드 컬렉션이 저장·수정마다 갱신)
+search_index = SearchIndex(active=not LAZY_STARTUP)
+
+# 갤러리 타일용 축소본 (/static/thumbs/{w}/{file})
+thumbnail_service = ThumbnailService(IMAGES_DIR, THUMBNAILS_DIR)
+
+# 참조 이미지는 모델에 보내기 전에 축소/재인코딩하고(결과는 원본 해시로 디스크에 보관),
+# 변환된 바이트를 경로+mtime+크기 기준 LRU로 캐시한다
+reference_preprocessor = ReferencePreprocessor(REFERENCE_VARIANTS_DIR)
+reference_cache = ReferenceByteCache(prepare=reference_preprocessor.prepare)
 
 
 
 # --- FastAPI 앱 초기화 ---
-app = FastAPI()
-app.mount(f"/{STATIC_DIR}", StaticFiles(directory=STATIC_DIR), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 백그라운드 작업: 참조 없는 이미지 정리 (ASSET_GC_INTERVAL마다)
+    asset_registry.start()
+    # 잡 워커 + (sqlite) 죽은 워커가 남긴 잡 회수
+    await job_queue.start()
+    log.info("Server ready", lazy=LAZY_STARTUP, startup_ms=round((time.perf_counter() - IMPORT_STARTED) * 1000, 1))
+    yield
+    await asset_registry.stop()
+    await job_queue.stop()
+    # 모아 두었던 결과 캐시 인덱스 쓰기를 마저 한다
+    generation_cache.flush()
+    scene_cache.flush()
+
+app = FastAPI(lifespan=lifespan)
 
 
 # --- CORS 설정 ---
@@ -54,6 +146,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# CORS 바깥에 둬서 preflight 응답까지 센다
+app.add_middleware(MetricsMiddleware)
 
 
 # --- Pydantic 데이터 모델 ---
@@ -77,17 +171,45 @@ class StoryboardGenerationRequest(BaseModel):
 
 class CharacterSheetRequest(BaseModel):
     character: Character
+    bypassCache: bool = False  # true면 생성 결과 캐시를 건너뛴다
+    mode: Optional[str] = None  # 'single' | 'sections' (기본 CHARACTER_SHEET_MODE)
+    sections: Optional[List[str]] = None  # sections 모드에서 다시 만들 시트만 (예: ["expressions"]). 없으면 5종 전부
+
+    @model_validator(mode="after")
+    def check_sections(self):
+        if self.mode is not None and self.mode not in ("single", "sections"):
+            raise ValueError(f"Unknown mode: {self.mode}")
+        unknown = [name for name in self.sections or [] if name not in CHARACTER_SHEET_SECTION_NAMES]
+        if unknown:
+            raise ValueError(f"Unknown sections: {', '.join(unknown)} (expected {', '.join(CHARACTER_SHEET_SECTION_NAMES)})")
+        if self.sections and self.mode == "single":
+            raise ValueError("sections requires mode 'sections'")
+        return self
 
 class StoryboardCreationRequest(BaseModel):
-    backgroundImage: str  # base64 data URL
+    backgroundImage: Optional[str] = None  # base64 data URL
+    backgroundAssetId: Optional[str] = None  # /api/uploads로 올린 이미지 (backgroundImage 대신)
     characters: List[dict]  # [{"character": Character, "x": float, "y": float}]
     prompt: str
     aspectRatio: str = "1:1"
+    bypassCache: bool = False
+
+    @model_validator(mode="after")
+    def check_background(self):
+        if not self.backgroundImage and not self.backgroundAssetId:
+            raise ValueError("backgroundImage or backgroundAssetId is required")
+        if self.backgroundAssetId and not blob_store.exists(self.backgroundAssetId):
+            raise ValueError(f"Unknown backgroundAssetId: {self.backgroundAssetId}")
+        return self
 
 class Sketch(BaseModel):
     id: int
     name: str
-    dataUrl: str
+    dataUrl: Optional[str] = None  # 입력용 data URL. 저장 시 blob으로 옮기고 비운다.
+    blobId: Optional[str] = None
+    imageUrl: Optional[str] = None
+    mimeType: Optional[str] = None
+    size: Optional[int] = None
     createdAt: str
 
 class StoryboardScene(BaseModel):
@@ -95,6 +217,7 @@ class StoryboardScene(BaseModel):
     imageUrl: str
     description: str
     endFrameUrl: Optional[str] = None
+    characterIds: List[int] = []  # 장면에 등장하는 캐릭터 id
 
 class StoryElement(BaseModel):
     type: str  # 'text' or 'character'
@@ -113,162 +236,602 @@ class StoryImageRequest(BaseModel):
     elements: List[StoryElement]
     characters: List[dict]
     aspectRatio: str = "1:1"
+    bypassCache: bool = False
 
 class NextSceneRequest(BaseModel):
     startFrameUrl: str
     prompt: Optional[str] = None
     aspectRatio: str = "1:1"
+    bypassCache: bool = False
+
+class StoryboardBatchPanel(BaseModel):
+    kind: str  # 'create-storyboard' | 'generate-story-image'
+    payload: dict
+
+class StoryboardBatchRequest(BaseModel):
+    panels: List[StoryboardBatchPanel]
+    concurrency: Optional[int] = None  # 최대 STORYBOARD_BATCH_CONCURRENCY
+
+class NextSceneChainRequest(BaseModel):
+    startFrameUrl: Optional[str] = None
+    directions: List[Optional[str]] = []  # 단계별 연출 지시 (None이면 자연스러운 다음 장면)
+    aspectRatio: str = "1:1"
+    bypassCache: bool = False
+    chainId: Optional[str] = None  # 있으면 저장된 체인을 이어서 생성
+    fromStep: Optional[int] = None  # 이 단계부터 다시 생성 (기본: 마지막 성공 다음 단계)
+
+class JobSubmission(BaseModel):
+    kind: str  # 'generate-character-sheet' | 'create-storyboard' | 'generate-story-image' | 'generate-next-scene'
+    payload: dict
+    priority: int = 0
 
 
 # --- 데이터 저장/로드 함수 ---
+# 각 컬렉션은 JSON 스냅샷 + append-only 로그(storage.JournaledStore)로 저장된다.
+# STORAGE_BACKEND=sqlite면 여러 워커가 공유하는 SQLite 파일(storage.SqliteStore)에 저장한다.
+# save_* 함수는 넘겨받은 레코드만 upsert 하므로 전체 데이터 크기와 무관하다.
+# 쓰기(fsync, SQLite BEGIN IMMEDIATE의 잠금 대기)는 이벤트 루프를 막지 않게 스레드에서 한다.
+characters_store = open_store(CHARACTERS_JSON, "characters")
+sketches_store = open_store(SKETCHES_JSON, "sketches")
+storyboards_store = open_store(STORYBOARDS_JSON, "storyboards")
+stories_store = open_store(STORIES_JSON, "stories")
+
 def load_characters() -> List[Character]:
     try:
-        with open(CHARACTERS_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [Character(**char) for char in data["characters"]]
-    except FileNotFoundError:
-        return []
+        records, _ = characters_store.load()
+        return [Character(**char) for char in records]
     except Exception as e:
-        print(f"Error loading characters: {e}")
+        log.error("Error loading characters", error=e)
         return []
 
-def save_characters(characters: List[Character]):
+async def save_characters(characters: List[Character]):
     try:
-        data = {
-            "characters": [char.dict() for char in characters],
-            "next_id": max([char.id for char in characters] + [0]) + 1
-        }
-        with open(CHARACTERS_JSON, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(characters_store.put_many, [char.dict() for char in characters])
+        db_characters.touch()
     except Exception as e:
-        print(f"Error saving characters: {e}")
+        log.error("Error saving characters", error=e)
 
-def get_next_character_id() -> int:
+async def delete_characters(record_ids: List[int]):
     try:
-        with open(CHARACTERS_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get("next_id", 1)
-    except:
-        return 1
+        for record_id in record_ids:
+            await asyncio.to_thread(characters_store.delete, record_id)
+        db_characters.touch()
+    except Exception as e:
+        log.error("Error deleting characters", error=e)
+
+async def allocate_character_id() -> int:
+    # 저장소에서 원자적으로 받는다 (여러 워커가 동시에 만들어도 겹치지 않음).
+    # meta가 없던 예전 데이터는 기존 최대 id 다음부터.
+    floor = max((char.id for char in db_characters), default=0) + 1
+    return await asyncio.to_thread(characters_store.allocate_id, "next_id", floor)
 
 # 스케치 관련 함수들
 def load_sketches() -> List[Sketch]:
     try:
-        with open(SKETCHES_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [Sketch(**sketch) for sketch in data["sketches"]]
-    except FileNotFoundError:
-        return []
+        records, _ = sketches_store.load()
+        sketches = [Sketch(**sketch) for sketch in records]
+        # 예전 형식(dataUrl에 base64를 그대로 저장)은 blob store로 옮긴다
+        migrated = [sketch for sketch in sketches if sketch.dataUrl]
+        for sketch in migrated:
+            move_sketch_to_blob_store(sketch)
+        if migrated:
+            log.info("Migrated inline sketches to the blob store", count=len(migrated))
+            sketches_store.put_many(sketch.dict() for sketch in migrated)
+        return sketches
     except Exception as e:
-        print(f"Error loading sketches: {e}")
+        log.error("Error loading sketches", error=e)
         return []
 
-def save_sketches(sketches: List[Sketch]):
+def move_sketch_to_blob_store(sketch: Sketch):
+    mime_type, data = decode_data_url(sketch.dataUrl)
+    sketch.blobId = blob_store.put(data, mime_type)
+    sketch.imageUrl = f"{BLOBS_URL}/{sketch.blobId}"
+    sketch.mimeType = mime_type
+    sketch.size = len(data)
+    sketch.dataUrl = None
+
+def attach_sketch_blob(sketch: Sketch):
+    # dataUrl 대신 /api/uploads로 미리 올린 blob id만 보낸 경우
+    size = blob_store.size(sketch.blobId)
+    if size is None:
+        raise ValueError(f"Unknown blobId: {sketch.blobId}")
+    sketch.imageUrl = f"{BLOBS_URL}/{sketch.blobId}"
+    sketch.mimeType = blob_store.mime_type(sketch.blobId)
+    sketch.size = size
+
+async def save_sketches(sketches: List[Sketch]):
     try:
-        data = {
-            "sketches": [sketch.dict() for sketch in sketches]
-        }
-        with open(SKETCHES_JSON, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(sketches_store.put_many, [sketch.dict() for sketch in sketches])
+        db_sketches.touch()
     except Exception as e:
-        print(f"Error saving sketches: {e}")
+        log.error("Error saving sketches", error=e)
+
+async def delete_sketches(record_ids: List[int]):
+    try:
+        for record_id in record_ids:
+            await asyncio.to_thread(sketches_store.delete, record_id)
+        db_sketches.touch()
+    except Exception as e:
+        log.error("Error deleting sketches", error=e)
 
 # 스토리보드 관련 함수들
 def load_storyboards() -> List[StoryboardScene]:
     try:
-        with open(STORYBOARDS_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [StoryboardScene(**scene) for scene in data["storyboards"]]
-    except FileNotFoundError:
-        return []
+        records, _ = storyboards_store.load()
+        return [StoryboardScene(**scene) for scene in records]
     except Exception as e:
-        print(f"Error loading storyboards: {e}")
+        log.error("Error loading storyboards", error=e)
         return []
 
-def save_storyboards(storyboards: List[StoryboardScene]):
+async def save_storyboards(storyboards: List[StoryboardScene]):
     try:
-        data = {
-            "storyboards": [storyboard.dict() for storyboard in storyboards]
-        }
-        with open(STORYBOARDS_JSON, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(storyboards_store.put_many, [storyboard.dict() for storyboard in storyboards])
+        db_storyboards.touch()
+    except Exception as e:
+        log.error("Error saving storyboards", error=e)
+
+async def delete_storyboards(record_ids: List[int]):
+    try:
+        for record_id in record_ids:
+            await asyncio.to_thread(storyboards_store.delete, record_id)
+        db_storyboards.touch()
     except Exception as e:
-        print(f"Error saving storyboards: {e}")
+        log.error("Error deleting storyboards", error=e)
 
 def load_stories() -> List[Story]:
     try:
-        with open(STORIES_JSON, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [Story(**story) for story in data["stories"]]
-    except FileNotFoundError:
-        return []
+        records, _ = stories_store.load()
+        return [Story(**story) for story in records]
     except Exception as e:
-        print(f"Error loading stories: {e}")
+        log.error("Error loading stories", error=e)
         return []
 
-def save_stories(stories: List[Story]):
+async def save_stories(stories: List[Story]):
     try:
-        data = {
-            "stories": [story.dict() for story in stories]
-        }
-        with open(STORIES_JSON, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        await asyncio.to_thread(stories_store.put_many, [story.dict() for story in stories])
+        db_stories.touch()
     except Exception as e:
-        print(f"Error saving stories: {e}")
+        log.error("Error saving stories", error=e)
+
+async def delete_stories(record_ids: List[int]):
+    try:
+        for record_id in record_ids:
+            await asyncio.to_thread(stories_store.delete, record_id)
+        db_stories.touch()
+    except Exception as e:
+        log.error("Error deleting stories", error=e)
+
+def character_thumbnails(char: Character) -> dict:
+    return {
+        "thumbnailUrl": thumbnail_url(char.imageUrl, IMAGES_URL, THUMBS_URL),
+        # 비어 있는 시트 자리(기본 이미지)는 그대로 둔다
+        "characterSheetThumbnails": [
+            url if url == DEFAULT_IMAGE_URL else thumbnail_url(url, IMAGES_URL, THUMBS_URL) for url in char.characterSheets or []
+        ],
+    }
+
+def storyboard_thumbnails(scene: StoryboardScene) -> dict:
+    return {"thumbnailUrl": thumbnail_url(scene.imageUrl, IMAGES_URL, THUMBS_URL)}
+
+def character_assets(char: Character) -> List[str]:
+    return [char.imageUrl, *(char.characterSheets or [])]
+
+def storyboard_assets(scene: StoryboardScene) -> List[Optional[str]]:
+    return [scene.imageUrl, scene.endFrameUrl]
+
+def story_character_ids(story: Story) -> List[int]:
+    return [element.character["id"] for element in story.elements if element.character and "id" in element.character]
+
+# 검색 색인에 넣을 (텍스트, 등장 캐릭터 id)
+def story_search_text(story: Story) -> Tuple[str, List[int]]:
+    names = [element.content for element in story.elements if element.type == "character"]
+    return " ".join([story.text, *names]), story_character_ids(story)
+
+def storyboard_search_text(scene: StoryboardScene) -> Tuple[str, List[int]]:
+    return scene.description, scene.characterIds
+
+def sketch_search_text(sketch: Sketch) -> Tuple[str, List[int]]:
+    return sketch.name, []
 
 # --- 데이터 초기화 ---
 DEFAULT_IMAGE_URL = "http://localhost:8000/static/images/default.svg"
-db_characters: List[Character] = load_characters()
-next_character_id = get_next_character_id()
-db_sketches: List[Sketch] = load_sketches()
-db_storyboards: List[StoryboardScene] = load_storyboards()
-db_stories: List[Story] = load_stories()
+
+# LAZY_STARTUP이면 목록을 loader로 넘겨 처음 접근할 때 읽는다
+def collection_source(load) -> dict:
+    return {"loader": load} if LAZY_STARTUP else {"items": load()}
+
+
+db_characters = RecordCollection(
+    "characters",
+    **collection_source(load_characters),
+    decorate=character_thumbnails,
+    assets=character_assets,
+    registry=asset_registry,
+)
+db_sketches = RecordCollection("sketches", **collection_source(load_sketches), search=sketch_search_text, search_index=search_index)
+db_storyboards = RecordCollection(
+    "storyboards",
+    **collection_source(load_storyboards),
+    references=lambda scene: scene.characterIds,
+    decorate=storyboard_thumbnails,
+    assets=storyboard_assets,
+    registry=asset_registry,
+    search=storyboard_search_text,
+    search_index=search_index,
+)
+db_stories = RecordCollection(
+    "stories",
+    **collection_source(load_stories),
+    references=story_character_ids,
+    search=story_search_text,
+    search_index=search_index,
+)
+
+# 컬렉션 이름 → (저장소, 모델)
+record_stores = {
+    db_characters.name: (characters_store, Character),
+    db_sketches.name: (sketches_store, Sketch),
+    db_storyboards.name: (storyboards_store, StoryboardScene),
+    db_stories.name: (stories_store, Story),
+}
+shared_collections = [db_characters, db_sketches, db_storyboards, db_stories]
+
+def changed_collections(collections: List[RecordCollection]) -> List[Tuple[RecordCollection, List[BaseModel]]]:
+    # 다른 워커가 바꾼 컬렉션만 저장소에서 다시 읽는다 (journal 모드에서는 항상 False).
+    # 저장소만 읽으므로 스레드에서 불러도 된다.
+    reloaded = []
+    for collection in collections:
+        store, model = record_stores[collection.name]
+        if store.changed():
+            records, _ = store.load()
+            reloaded.append((collection, [model(**record) for record in records]))
+    return reloaded
+
+def apply_reloaded(reloaded: List[Tuple[RecordCollection, List[BaseModel]]]):
+    for collection, records in reloaded:
+        collection.reset(records)
+        log.debug("Reloaded collection changed by another worker", collection=collection.name, records=len(collection))
+
+def loaded_shared_collections() -> List[RecordCollection]:
+    # 아직 안 읽은 컬렉션은 처음 접근할 때 최신 내용을 읽는다
+    return [collection for collection in shared_collections if collection.loaded]
+
+async def refresh_collections():
+    # 요청마다 부르는 쪽: 확인/다시 읽기는 스레드에서, 컬렉션 교체는 루프에서
+    apply_reloaded(await asyncio.to_thread(changed_collections, loaded_shared_collections()))
+
+if STORAGE_BACKEND == "sqlite":
+    @app.middleware("http")
+    async def sync_shared_state(request: Request, call_next):
+        await refresh_collections()
+        return await call_next(request)
+
+
+# --- 목록 응답 ---
+# limit/after 커서 페이지네이션, fields 프로젝션, ETag/If-None-Match 조건부 GET.
+# 컬렉션 버전이 그대로면 304를 돌려주고 직렬화도 하지 않는다.
+def collection_response(
+    request: Request,
+    collection: RecordCollection,
+    wrap: Optional[str],
+    limit: Optional[int],
+    after: Optional[int],
+    fields: Optional[str],
+) -> Response:
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    field_list = parse_fields(fields)
+    etag = collection.etag(wrap, limit, after, field_list)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body, next_cursor = collection.render(wrap, limit, after, field_list)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# --- 단건 조회/수정/삭제 ---
+# id 인덱스(RecordCollection.get)로 O(1) 조회
+# 단건 응답의 ETag는 레코드 리비전이다. 수정할 때 If-Match로 돌려보내면
+# 그 사이 다른 요청/워커가 바꾼 경우 409로 거절한다 (낙관적 동시성, 없으면 마지막 쓰기가 이김).
+async def record_revision(store, record_id: int) -> int:
+    # sqlite 저장소는 리비전 조회도 쿼리라 루프 밖에서 읽는다
+    return await asyncio.to_thread(store.revision, record_id)
+
+async def record_etag(collection: RecordCollection, record_id: int) -> str:
+    # epoch: journal은 프로세스마다 새 값(리비전이 메모리에만 있음), sqlite는 DB 파일에 저장된 값이라
+    # 모든 워커가 같은 ETag를 내고 다른 워커가 준 ETag로 If-Match 해도 된다.
+    store, _ = record_stores[collection.name]
+    return f'"{store.epoch}-{await record_revision(store, record_id)}"'
+
+async def expected_revision(collection: RecordCollection, record_id: int, if_match: Optional[str]) -> Optional[int]:
+    if not if_match or if_match.strip() == "*":
+        return None
+    store, _ = record_stores[collection.name]
+    epoch, _, revision = if_match.strip().removeprefix("W/").strip('"').rpartition("-")
+    if epoch != store.epoch or not revision.isdigit():
+        # 재시작 전/다른 저장소의 ETag
+        raise HTTPException(status_code=409, detail={"error": "Stale If-Match", "etag": await record_etag(collection, record_id)})
+    return int(revision)
+
+async def put_record(collection: RecordCollection, record: BaseModel, if_match: Optional[str] = None):
+    store, _ = record_stores[collection.name]
+    try:
+        await asyncio.to_thread(store.put, record.dict(), await expected_revision(collection, record.id, if_match))
+    except ConflictError as e:
+        raise HTTPException(status_code=409, detail={"error": str(e), "etag": await record_etag(collection, record.id)})
+    collection.append(record)
+    collection.touch()
+
+async def get_record(collection: RecordCollection, record_id: int) -> Response:
+    record = collection.get(record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"{collection.name} {record_id} not found")
+    return JSONResponse(content=collection.serialize(record), headers={"ETag": await record_etag(collection, record_id)})
+
+async def replace_record(collection: RecordCollection, model, record_id: int, data: dict, if_match: Optional[str] = None) -> BaseModel:
+    if collection.get(record_id) is None:
+        raise HTTPException(status_code=404, detail=f"{collection.name} {record_id} not found")
+    try:
+        record = model(**{**data, "id": record_id})
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await put_record(collection, record, if_match)
+    return record
+
+async def delete_record(collection: RecordCollection, delete, record_id: int) -> dict:
+    if collection.remove(record_id) is None:
+        raise HTTPException(status_code=404, detail=f"{collection.name} {record_id} not found")
+    await delete([record_id])
+    return {"success": True}
+
+
+# --- 검색 ---
+# 스토리 본문, 장면 설명, 스케치 이름을 검색어 AND로 찾아 BM25 점수 순으로 돌려준다.
+# type=stories,storyboards 로 컬렉션을, characterId로 등장 캐릭터를 거른다.
+SEARCH_MAX_LIMIT = 100
+searchable_collections = {collection.name: collection for collection in (db_stories, db_storyboards, db_sketches)}
+
+def ensure_search_index():
+    # 지연 시작 모드에서는 첫 검색 때 색인을 채운다. 이후로는 컬렉션이 저장마다 갱신한다.
+    if search_index.active:
+        return
+    started = time.perf_counter()
+    search_index.active = True
+    for collection in searchable_collections.values():
+        collection.index_search()
+    log.info("Built search index", documents=len(search_index), duration_ms=round((time.perf_counter() - started) * 1000, 1))
+
+@app.get("/api/search")
+async def search_records(
+    q: str,
+    characterId: Optional[int] = None,
+    type: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_MAX_LIMIT}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+    kinds = None
+    if type:
+        kinds = {name.strip() for name in type.split(",") if name.strip()}
+        unknown = kinds - set(searchable_collections)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown search type: {', '.join(sorted(unknown))}")
+
+    ensure_search_index()
+    hits, total = search_index.search(q, kinds, characterId, limit, offset)
+    results = []
+    for score, kind, record_id in hits:
+        collection = searchable_collections[kind]
+        record = collection.get(record_id)
+        if record is not None:
+            results.append({"type": kind, "id": record_id, "score": round(score, 4), "record": collection.serialize(record)})
+    next_offset = offset + limit if offset + limit < total else None
+    return {"results": results, "total": total, "nextOffset": next_offset}
+
+
+def stage_timer(endpoint: str, http_request: Optional[Request] = None) -> StageTimer:
+    # HTTP로 들어온 요청이면 미들웨어가 받은 시각부터 잰다 (본문 수신 + 파싱 포함)
+    request_started = getattr(http_request.state, "request_started", None) if http_request is not None else None
+    return StageTimer(endpoint, request_started)
+
+async def coalesced_generation(cache_key: str, generate, timer: StageTimer):
+    # 같은 키의 생성이 진행 중이면 합류한다. 합류한 요청은 기다린 시간을 coalesced_wait로 남긴다.
+    started = time.perf_counter()
+    result, joined = await generation_flights.run(cache_key, generate, timer.endpoint)
+    if joined:
+        timer.record("coalesced_wait", time.perf_counter() - started)
+    return result, joined
+
+def degraded_response(result: dict, error: Exception) -> dict:
+    # 기본 이미지로 대신한 응답임을 명시한다 (프론트엔드가 성공으로 오인하지 않도록)
+    return {**result, "degraded": True, "error": str(error)}
+
+def retry_after(error: Exception) -> Optional[float]:
+    if isinstance(error, GenerationUnavailableError):
+        return round(error.retry_after, 1)
+    return None
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# --- 참조 이미지 로드 ---
+def reference_path(url: str) -> Optional[str]:
+    # 업로드한 blob URL도 참조 이미지/시작 프레임으로 쓸 수 있다
+    if url.startswith(f"{BLOBS_URL}/"):
+        try:
+            return blob_store.path(url[len(BLOBS_URL) + 1:])
+        except ValueError:
+            return None
+    return local_path_from_url(url)
+
+async def read_reference_parts(urls: List[str]) -> Dict[str, "types.Part"]:
+    # URL → Part. 캐시를 거쳐 병렬로 읽고, 이 서버의 URL이 아니거나 실패한 항목은 빠진다.
+    paths = [(url, reference_path(url)) for url in dict.fromkeys(urls)]
+    paths = [(url, path) for url, path in paths if path]
+    results = await reference_cache.read_many([path for _, path in paths])
+
+    parts = {}
+    for (url, _), image in zip(paths, results):
+        if isinstance(image, BaseException):
+            log.warning("Failed to load reference image", url=url, error=image)
+            continue
+        parts[url] = types.Part(
+            inline_data=types.Blob(
+                mime_type=image.mime_type,
+                data=image.data,
+            )
+        )
+    return parts
+
+async def load_reference_parts(
+    references: List[Tuple[str, str]],
+    preloaded: Optional[Dict[str, "types.Part"]] = None,
+) -> List["types.Part"]:
+    # references: (로그용 라벨, 이미지 URL). preloaded(일괄 작업에서 미리 읽어 둔 것)에 없는 것만 새로 읽는다.
+    parts = dict(preloaded or {})
+    missing = [url for _, url in references if url not in parts]
+    if missing:
+        parts.update(await read_reference_parts(missing))
+
+    loaded = []
+    for label, url in references:
+        part = parts.get(url)
+        if part is not None:
+            loaded.append(part)
+            log.debug("Added reference image", label=label)
+    return loaded
+
+def usable_sheets(sheet_urls: List[str]) -> List[str]:
+    # sections 모드에서 아직 없거나 실패한 시트 자리는 기본 이미지다 (참조로 보내지 않는다)
+    return [url for url in select_sheets(sheet_urls) if url != DEFAULT_IMAGE_URL]
+
+def storyboard_sheet_references(request: StoryboardCreationRequest) -> List[Tuple[str, str]]:
+    # 캐릭터당 우선순위 높은 시트 몇 장
+    references = []
+    for char_data in request.characters:
+        char = char_data["character"]
+        for i, sheet_url in enumerate(usable_sheets(char.get("characterSheets") or [])):
+            references.append((f"character sheet {i+1} for {char['name']}", sheet_url))
+    return references
+
+def story_image_references(request: StoryImageRequest) -> List[Tuple[str, str]]:
+    references = []
+    for char in request.characters:
+        if char.get("characterSheets") and len(char["characterSheets"]) > 0:
+            for sheet_url in usable_sheets(char["characterSheets"]):
+                references.append((f"character sheet for {char['name']}", sheet_url))
+        elif char.get("imageUrl"):
+            # 캐릭터 기본 이미지 사용
+            references.append((f"character image for {char['name']}", char["imageUrl"]))
+    return references
 
 
 # --- API 엔드포인트 ---
 
+@app.exception_handler(GenerationUnavailableError)
+async def generation_unavailable_handler(request: Request, exc: GenerationUnavailableError):
+    # 모델 쪽이 막혀 있을 때는 가짜 성공 대신 503을 돌려주고 언제 다시 시도할지 알려준다
+    log.warning("Generation unavailable", error=exc, retry_after=round(exc.retry_after, 1))
+    return JSONResponse(
+        status_code=503,
+        content={"degraded": True, "error": str(exc), "retryAfter": round(exc.retry_after, 1)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
 @app.get("/")
 def read_root():
     return {"message": "AI Animation Studio Backend is running."}
 
+@app.get("/api/generation/status")
+async def get_generation_status():
+    return {**generator.stats(), "backend": model_backend.name, "jobs": await job_queue.stats(), "coalescing": generation_flights.stats()}
+
+# 스크랩할 때 현재 값으로 채우는 게이지들
+GENERATION_IN_FLIGHT = REGISTRY.gauge("generation_in_flight", "Model calls currently running")
+GENERATION_WAITING = REGISTRY.gauge("generation_waiting", "Model calls waiting for a concurrency slot")
+CIRCUIT_OPEN = REGISTRY.gauge("generation_circuit_open", "1 while the model circuit breaker is open")
+JOBS_QUEUED = REGISTRY.gauge("jobs_queued", "Generation jobs waiting for a worker")
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    stats = generator.stats()
+    GENERATION_IN_FLIGHT.set(stats["inFlight"])
+    GENERATION_WAITING.set(stats["waiting"])
+    CIRCUIT_OPEN.set(1 if stats["circuit"]["state"] == "open" else 0)
+    JOBS_QUEUED.set(job_queue.queued())
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {
+        "generation": generation_cache.stats(),
+        "references": reference_cache.stats(),
+        "referenceVariants": reference_preprocessor.stats(),
+        "scenes": scene_cache.stats(),
+        "thumbnails": thumbnail_service.stats(),
+        "search": search_index.stats(),
+    }
+
 @app.get("/api/characters", response_model=List[Character])
-async def get_characters():
-    return db_characters
+async def get_characters(request: Request, limit: Optional[int] = None, after: Optional[int] = None, fields: Optional[str] = None):
+    return collection_response(request, db_characters, None, limit, after, fields)
 
 # [수정됨] 캐릭터 등록 시 이미지 파일 업로드 처리
 @app.post("/api/characters", response_model=Character)
 async def create_character(name: str = Form(...), image: UploadFile = File(...)):
-    global next_character_id
-
-    # [수정] JavaScript의 Date.now()를 Python의 time.time()으로 변경
-    unique_filename = f"{int(time.time())}_{image.filename}"
-    file_path = os.path.join(IMAGES_DIR, unique_filename)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
-
-    image_url = f"http://localhost:8000/{STATIC_DIR}/images/{unique_filename}"
+    # 같은 초에 올라온 파일도 겹치지 않게 image_store가 이름을 만들고, 복사는 스레드에서
+    try:
+        image_url, _ = await image_store.save_upload(image.file, "character")
+    except InvalidImageError as e:
+        raise HTTPException(status_code=415, detail=str(e))
 
     new_character = Character(
-        id=next_character_id,
+        id=await allocate_character_id(),
         name=name,
         imageUrl=image_url,
         characterSheets=[]
     )
     db_characters.append(new_character)
-    next_character_id += 1
-    save_characters(db_characters)
+    await save_characters([new_character])
     return new_character
 
+@app.get("/api/characters/{character_id}")
+async def get_character(character_id: int):
+    return await get_record(db_characters, character_id)
+
+@app.put("/api/characters/{character_id}")
+async def update_character(character_id: int, character_data: dict, if_match: Optional[str] = Header(None)):
+    character = await replace_record(db_characters, Character, character_id, character_data, if_match)
+    return {"success": True, "character": character.dict()}
+
+@app.delete("/api/characters/{character_id}")
+async def delete_character(character_id: int):
+    return await delete_record(db_characters, delete_characters, character_id)
+
+@app.get("/api/characters/{character_id}/appearances")
+async def get_character_appearances(character_id: int):
+    # 보조 인덱스: 캐릭터 id → 그 캐릭터가 나오는 스토리보드/스토리
+    return {
+        "storyboards": [scene.dict() for scene in db_storyboards.referencing(character_id)],
+        "stories": [story.dict() for story in db_stories.referencing(character_id)],
+    }
+
 @app.post("/api/generate-image")
 async def generate_image(request: ImageGenerationRequest):
-    print(f"[API] Generating image for character: {request.character.name}")
+    log.info("Generating image for character", character=request.character.name)
     await asyncio.sleep(1.5)
     return {"imageUrl": DEFAULT_IMAGE_URL}
 
 @app.post("/api/generate-storyboard", response_model=List[StoryboardScene])
 async def generate_storyboard(request: StoryboardGenerationRequest):
-    print(f"[API] Generating storyboard from image: {request.keyImageUrl}")
+    log.info("Generating storyboard from image", key_image_url=request.keyImageUrl)
     await asyncio.sleep(2.5)
     mock_storyboard = [
         {"id": 1, "imageUrl": DEFAULT_IMAGE_URL, "description": "1. [AI] 소년이 신비로운 숲의 입구를 발견합니다."},
@@ -277,27 +840,31 @@ async def generate_storyboard(request: StoryboardGenerationRequest):
     ]
     return mock_storyboard
 
+def character_image_path(image_url: str) -> str:
+    # --- URL을 로컬 경로로 변환 ---
+    if image_url.startswith("http://localhost:8000/"):
+        local_path = image_url.replace("http://localhost:8000/", "")
+    else:
+        local_path = image_url
+    return os.path.join(".", local_path)
+
 @app.post("/api/generate-character-sheet")
-async def generate_character_sheet(request: CharacterSheetRequest):
-    print(f"[API] Generating character sheet for: {request.character.name}")
-    print(f"[API] Character image URL: {request.character.imageUrl}")
+async def generate_character_sheet(request: CharacterSheetRequest, http_request: Request = None):
+    log.info("Generating character sheet", character=request.character.name, image_url=request.character.imageUrl)
+    timer = stage_timer("generate-character-sheet", http_request)
+    if (request.mode or CHARACTER_SHEET_MODE) == "sections":
+        check_sheet_sections(request)
+        return await generate_character_sheet_sections(request, timer)
+    # 생성하는 동안 캐릭터가 고쳐졌는지 알 수 있게 시작할 때의 리비전을 기억한다
+    revision = await record_revision(characters_store, request.character.id)
     
     try:
-        # --- URL을 로컬 경로로 변환 ---
-        if request.character.imageUrl.startswith("http://localhost:8000/"):
-            local_path = request.character.imageUrl.replace("http://localhost:8000/", "")
-        else:
-            local_path = request.character.imageUrl
-        
-        file_path = os.path.join(".", local_path)
-        print(f"[API] Opening local file: {file_path}")
+        file_path = character_image_path(request.character.imageUrl)
         
-        # 로컬 파일 열기
-        with open(file_path, "rb") as f:
-            image_bytes = f.read()
-        
-        character_image = Image.open(BytesIO(image_bytes))
-        print(f"[API] Image loaded: {character_image.size}")
+        # 로컬 파일 열기 (참조 이미지 캐시 + 전처리 경유)
+        with timer.stage("disk_read"):
+            character_image = await reference_cache.read(file_path)
+        log.debug("Character image loaded", path=file_path, bytes=len(character_image.data), mime_type=character_image.mime_type)
         
         prompt = f"""Based on this character image, generate each of the following 5 images for a complete character sheet:
 
@@ -310,77 +877,341 @@ async def generate_character_sheet(request: CharacterSheetRequest):
 Character name: {request.character.name}
 Please create a comprehensive character sheet with all 5 sections for animation reference."""
         
-        print("[API] Calling Gemini API...")
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=[
-                prompt,
-                types.Part(
-                    inline_data=types.Blob(
-                        mime_type="image/png",
-                        data=image_bytes,
-                    )
+        contents_for_generation = [
+            prompt,
+            types.Part(
+                inline_data=types.Blob(
+                    mime_type=character_image.mime_type,
+                    data=character_image.data,
                 )
-            ],
-        )
-        
-        print(f"[API] Gemini response received")
-        print(f"[API] Number of candidates: {len(response.candidates)}")
-        
+            )
+        ]
+
+        cache_key = generation_key(IMAGE_MODEL, contents_for_generation)
+        cached = None if request.bypassCache else generation_cache.get(cache_key)
+
         generated_images = []
-        if response.candidates and len(response.candidates) > 0:
-            parts = response.candidates[0].content.parts
-            print(f"[API] Number of parts in response: {len(parts)}")
-            
-            for i, part in enumerate(parts):
-                if part.text is not None:
-                    print(f"[API] Part {i}: Text - {part.text[:100]}...")
-                elif part.inline_data is not None:
-                    print(f"[API] Part {i}: Image data found, size: {len(part.inline_data.data)} bytes")
-                    # Save generated image
-                    unique_filename = f"character_sheet_{int(time.time())}_{i}.png"
-                    save_path = os.path.join(IMAGES_DIR, unique_filename)
-                    
-                    image = Image.open(BytesIO(part.inline_data.data))
-                    image.save(save_path)
-                    print(f"[API] Saved image: {save_path}")
-                    
-                    image_url = f"http://localhost:8000/{STATIC_DIR}/images/{unique_filename}"
-                    generated_images.append(image_url)
-        
+        if cached is not None:
+            log.info("Generation cache hit", endpoint="generate-character-sheet")
+            generated_images = cached["characterSheetImages"]
+        else:
+            log.payload("Character sheet prompt", prompt=prompt)
+            with timer.stage("model_call"):
+                response = await generator.generate_content(
+                    model=IMAGE_MODEL,
+                    contents=contents_for_generation,
+                )
+
+            saved_paths = []
+            if response.candidates and len(response.candidates) > 0:
+                parts = response.candidates[0].content.parts
+                log.debug("Model response received", candidates=len(response.candidates), parts=len(parts))
+
+                with timer.stage("image_save"):
+                    for i, part in enumerate(parts):
+                        if part.text is not None:
+                            log.payload("Model text part", index=i, text=part.text)
+                        elif part.inline_data is not None:
+                            # Save generated image
+                            image_url, save_path = await image_store.save(part.inline_data.data, "character_sheet")
+                            log.debug("Saved image", path=save_path, bytes=len(part.inline_data.data))
+                            generated_images.append(image_url)
+                            saved_paths.append(save_path)
+
+            if generated_images:
+                generation_cache.put(cache_key, {"characterSheetImages": generated_images}, saved_paths)
+
         # Update character with generated sheet images
-        for char in db_characters:
-            if char.id == request.character.id:
-                char.characterSheets = generated_images
-                break
-        save_characters(db_characters)
+        with timer.stage("storage_write"):
+            await update_character_sheets(request.character.id, revision, lambda _: generated_images)
         
-        print(f"[API] Generated {len(generated_images)} images")
+        timer.finish(images=len(generated_images), cached=cached is not None)
         return {"characterSheetImages": generated_images}
         
+    except GenerationUnavailableError:
+        raise
     except Exception as e:
-        print(f"[API] Error generating character sheet: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"characterSheetImages": [DEFAULT_IMAGE_URL] * 5}
+        log.error("Error generating character sheet", exc_info=True, error=e)
+        return degraded_response({"characterSheetImages": [DEFAULT_IMAGE_URL] * 5}, e)
+
+# --- 시트별 병렬 생성 (sections 모드) ---
+# 시트마다 프롬프트를 따로 만들어 동시에 호출한다 (동시 호출 수는 generator가 제한).
+# 시트 하나가 끝날 때마다 Character.characterSheets의 그 자리만 바꿔 바로 저장하고 "section" 이벤트를 낸다.
+# 실패한 시트는 자리를 그대로 두고(없으면 기본 이미지) 결과에 failedSections로 알려준다.
+# sections=["expressions"]처럼 보내면 그 시트만 다시 만든다.
+async def update_character_sheets(
+    character_id: int,
+    revision: int,
+    update: Callable[[Optional[List[str]]], List[str]],
+) -> Tuple[Optional[Character], int]:
+    # 시트 생성은 오래 걸려서 그 사이 다른 요청/워커가 캐릭터를 고쳤을 수 있다.
+    # 요청 시작 때 본 리비전으로 쓰고, 충돌하면 최신 레코드를 다시 읽어 시트만 바꿔 다시 쓴다
+    # (이름 등 다른 필드의 수정은 살린다). (저장한 캐릭터, 새 리비전)
+    for _ in range(CHARACTER_SHEET_WRITE_ATTEMPTS):
+        await refresh_collections()
+        char = db_characters.get(character_id)
+        if char is None:
+            return None, revision
+        updated = char.copy(update={"characterSheets": update(char.characterSheets)})
+        try:
+            revision = await asyncio.to_thread(characters_store.put, updated.dict(), revision)
+        except ConflictError as e:
+            log.info("Character changed during sheet generation, merging", character_id=character_id, expected=e.expected, current=e.current)
+            revision = e.current
+            continue
+        # 바뀐 자리의 예전 시트 파일은 참조가 풀려 GC 대상이 된다
+        db_characters.append(updated)
+        db_characters.touch()
+        return updated, revision
+    raise ConflictError(character_id, revision, await record_revision(characters_store, character_id))
+
+def character_sheet_layout_known(sheet_urls: Optional[List[str]]) -> bool:
+    # 5장이어야 어느 자리가 어느 시트인지 안다 (single 모드 결과는 1~N장일 수 있다)
+    return bool(sheet_urls) and len(sheet_urls) == len(CHARACTER_SHEET_SECTIONS)
+
+def character_sheet_slots(sheet_urls: Optional[List[str]]) -> List[str]:
+    # 응답용 시트 5종 자리. 자리를 모르면 기본 이미지로 보여 준다 (레코드에는 저장하지 않는다).
+    if character_sheet_layout_known(sheet_urls):
+        return list(sheet_urls)
+    return [DEFAULT_IMAGE_URL] * len(CHARACTER_SHEET_SECTIONS)
+
+def merge_character_sheets(sheet_urls: Optional[List[str]], updates: Dict[int, str]) -> List[str]:
+    # 자리를 아는 5장이면 바뀐 자리만 바꾼다. 모르면 5종이 모두 있을 때만 통째로 바꾼다.
+    # 기본 이미지 자리 표시를 저장해서 기존 시트를 지우는 일이 없게 한다.
+    if character_sheet_layout_known(sheet_urls):
+        sheets = list(sheet_urls)
+    elif len(updates) == len(CHARACTER_SHEET_SECTIONS):
+        sheets = [""] * len(CHARACTER_SHEET_SECTIONS)
+    else:
+        raise ValueError("Character sheet layout is unknown; regenerate all sections")
+    for index, image_url in updates.items():
+        sheets[index] = image_url
+    return sheets
+
+def check_sheet_sections(request: CharacterSheetRequest):
+    # 예전 single 모드 결과(5장이 아님)나 빈 시트에서 일부만 다시 만들면 나머지 시트를 잃는다
+    if not request.sections or set(request.sections) >= set(CHARACTER_SHEET_SECTION_NAMES):
+        return
+    current = db_characters.get(request.character.id) or request.character
+    if not character_sheet_layout_known(current.characterSheets):
+        raise HTTPException(
+            status_code=409,
+            detail="This character has no 5-section sheet layout yet; regenerate all sections (omit 'sections')",
+        )
 
-@app.post("/api/create-storyboard")
-async def create_storyboard(request: StoryboardCreationRequest):
-    print(f"[API] Creating storyboard with {len(request.characters)} characters")
-    print(f"[API] User prompt: {request.prompt}")
-    print(f"[API] Requested aspect ratio: {request.aspectRatio}")
-    
+def character_sheet_section_prompt(character_name: str, description: str) -> str:
+    return f"""Based on this character image, generate ONE image for this section of a character sheet:
+
+{description}
+
+Character name: {character_name}
+Draw only this section, as a single clean sheet for animation reference. Keep the character's design exactly as in the image."""
+
+async def store_character_sheets(character_id: int, updates: Dict[int, str], revision: int) -> int:
+    # 그 자리만 바꾼다 (다른 요청이 바꾼 다른 자리는 그대로). 새 리비전을 돌려준다.
+    _, revision = await update_character_sheets(character_id, revision, lambda sheet_urls: merge_character_sheets(sheet_urls, updates))
+    return revision
+
+async def generate_sheet_section(
+    index: int,
+    character: Character,
+    character_part: "types.Part",
+    bypass_cache: bool,
+    timer: StageTimer,
+) -> Tuple[str, bool]:
+    # (이미지 URL, 캐시 적중 여부)
+    _, description = CHARACTER_SHEET_SECTIONS[index]
+    prompt = character_sheet_section_prompt(character.name, description)
+    log.payload("Character sheet section prompt", section=CHARACTER_SHEET_SECTION_NAMES[index], prompt=prompt)
+    contents_for_generation = [prompt, character_part]
+
+    cache_key = generation_key(IMAGE_MODEL, contents_for_generation)
+    cached = None if bypass_cache else generation_cache.get(cache_key)
+    if cached is not None:
+        return cached["imageUrl"], True
+
+    async def generate() -> Optional[dict]:
+        with timer.stage("model_call"):
+            response = await generator.generate_content(
+                model=IMAGE_MODEL,
+                contents=contents_for_generation,
+            )
+        if response.candidates and response.candidates[0].content:
+            for part in response.candidates[0].content.parts or []:
+                if part.inline_data is not None:
+                    with timer.stage("image_save"):
+                        image_url, save_path = await image_store.save(part.inline_data.data, "character_sheet")
+                    log.debug("Saved image", path=save_path, bytes=len(part.inline_data.data))
+                    result = {"imageUrl": image_url}
+                    generation_cache.put(cache_key, result, [save_path])
+                    return result
+        return None
+
+    result, _ = await coalesced_generation(cache_key, generate, timer)
+    if result is None:
+        raise ValueError("No image generated from response")
+    return result["imageUrl"], False
+
+async def character_sheet_pipeline(request: CharacterSheetRequest, timer: StageTimer) -> AsyncIterator[Tuple[str, dict]]:
+    # 시트가 끝나는 순서대로 "section", 마지막에 "result"
+    names = request.sections or CHARACTER_SHEET_SECTION_NAMES
+    indexes = [CHARACTER_SHEET_SECTION_NAMES.index(name) for name in dict.fromkeys(names)]
+    revision = await record_revision(characters_store, request.character.id)
+    current = db_characters.get(request.character.id) or request.character
+    sheets = character_sheet_slots(current.characterSheets)
+    # 자리를 모르면(예전 single 모드 결과) 5종이 모두 나온 뒤에 한 번에 저장한다
+    deferred: Optional[Dict[int, str]] = None if character_sheet_layout_known(current.characterSheets) else {}
+
+    file_path = character_image_path(request.character.imageUrl)
+    with timer.stage("disk_read"):
+        character_image = await reference_cache.read(file_path)
+    character_part = types.Part(
+        inline_data=types.Blob(
+            mime_type=character_image.mime_type,
+            data=character_image.data,
+        )
+    )
+
+    async def run_section(index: int):
+        try:
+            return index, await generate_sheet_section(index, request.character, character_part, request.bypassCache, timer), None
+        except Exception as e:
+            log.warning("Character sheet section failed", section=CHARACTER_SHEET_SECTION_NAMES[index], error=e)
+            return index, None, e
+
+    tasks = [asyncio.create_task(run_section(index)) for index in indexes]
+    failures: Dict[str, Exception] = {}
+    cached_count = 0
     try:
-        # --- 1. Vision Analysis: 캐릭터 위치 파악 ---
-        print("[API] Analyzing character positions...")
-        
+        for next_done in asyncio.as_completed(tasks):
+            index, section, error = await next_done
+            name = CHARACTER_SHEET_SECTION_NAMES[index]
+            if error is not None:
+                failures[name] = error
+                yield "section", {"section": name, "index": index, "error": str(error), "retryAfter": retry_after(error)}
+                continue
+            image_url, cached = section
+            cached_count += cached
+            sheets[index] = image_url
+            if deferred is None:
+                with timer.stage("storage_write"):
+                    revision = await store_character_sheets(request.character.id, {index: image_url}, revision)
+            else:
+                deferred[index] = image_url
+            yield "section", {"section": name, "index": index, "imageUrl": image_url, "cached": cached}
+    finally:
+        # 스트림이 끊기면 남은 시트 작업을 멈춘다 (진행 중인 모델 호출은 끝까지 돌아 캐시에 남는다)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    if failures and len(failures) == len(indexes):
+        # 전부 실패: 모델 쪽 문제면 503, 아니면 첫 오류
+        unavailable = [e for e in failures.values() if isinstance(e, GenerationUnavailableError)]
+        raise unavailable[0] if unavailable else next(iter(failures.values()))
+
+    if deferred:
+        if failures:
+            # 일부만 나왔으면 기존 시트를 그대로 둔다. 성공한 시트는 생성 캐시에 있으므로 다시 요청하면 바로 나온다.
+            log.info("Keeping previous character sheets until every section succeeds", character_id=request.character.id, failed=list(failures))
+        else:
+            with timer.stage("storage_write"):
+                revision = await store_character_sheets(request.character.id, deferred, revision)
+
+    timer.finish(images=len(indexes) - len(failures), failed=len(failures), cached=cached_count)
+    result = {"characterSheetImages": sheets, "sections": CHARACTER_SHEET_SECTION_NAMES}
+    if failures:
+        result.update(
+            partial=True,
+            failedSections=list(failures),
+            errors={name: str(e) for name, e in failures.items()},
+            retryAfter=max((retry_after(e) or 0 for e in failures.values()), default=0) or None,
+        )
+        if deferred is not None:
+            result["saved"] = False
+    yield "result", result
+
+async def generate_character_sheet_sections(request: CharacterSheetRequest, timer: StageTimer) -> dict:
+    try:
+        result = None
+        async for stage, data in character_sheet_pipeline(request, timer):
+            if stage == "result":
+                result = data
+        return result
+    except GenerationUnavailableError:
+        raise
+    except Exception as e:
+        log.error("Error generating character sheet", exc_info=True, error=e)
+        return degraded_response({"characterSheetImages": [DEFAULT_IMAGE_URL] * 5}, e)
+
+@app.post("/api/generate-character-sheet/stream")
+async def generate_character_sheet_stream(request: CharacterSheetRequest, http_request: Request = None):
+    # sections 모드 전용: 시트가 하나 끝날 때마다 "section", 마지막에 "result"
+    log.info("Generating character sheet (stream)", character=request.character.name, sections=request.sections)
+    if request.mode == "single":
+        raise HTTPException(status_code=400, detail="Streaming is only available in sections mode")
+    check_sheet_sections(request)
+    timer = stage_timer("generate-character-sheet", http_request)
+
+    async def events():
+        try:
+            async for stage, data in character_sheet_pipeline(request, timer):
+                yield sse_event(stage, data)
+        except Exception as e:
+            log.error("Error generating character sheet", exc_info=True, error=e)
+            yield sse_event("error", {**degraded_response({"characterSheetImages": [DEFAULT_IMAGE_URL] * 5}, e), "retryAfter": retry_after(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# --- 스토리보드 생성 파이프라인 ---
+# 0. 배경 디코드/전처리와 캐릭터 시트 로딩을 동시에 시작
+# 1. 비전 분석으로 장면 설명 생성 (스케치+위치+프롬프트가 같으면 캐시 재사용) → "scene"
+# 2. 시트 로딩 완료 → "references", 이미지 생성/저장 → "image", 최종 결과 → "result"
+async def storyboard_pipeline(
+    request: StoryboardCreationRequest,
+    preloaded: Optional[Dict[str, "types.Part"]] = None,
+    timer: Optional[StageTimer] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    timer = timer or stage_timer("create-storyboard")
+
+    background = None
+    if request.backgroundAssetId:
+        # 업로드된 asset: base64 디코드 없이 읽고, 전처리 결과는 참조 이미지 캐시로 재사용
+        with timer.stage("disk_read"):
+            background = await reference_cache.read(blob_store.path(request.backgroundAssetId))
+    else:
         # base64 이미지를 바이트로 변환
-        if request.backgroundImage.startswith('data:image'):
-            header, data = request.backgroundImage.split(',', 1)
-            background_bytes = base64.b64decode(data)
+        with timer.stage("base64_decode"):
+            if request.backgroundImage.startswith('data:image'):
+                header, data = request.backgroundImage.split(',', 1)
+                background_bytes = base64.b64decode(data)
+            else:
+                background_bytes = base64.b64decode(request.backgroundImage)
+
+    # 각 캐릭터의 캐릭터 시트 이미지들 - 비전 분석과 겹쳐서 로드
+    sheet_instructions = ""
+    for char_data in request.characters:
+        char = char_data["character"]
+        if char.get("characterSheets") and len(char["characterSheets"]) > 0:
+            sheet_instructions += f"\n\nFor {char['name']}: Reference the character sheets provided - use these exact designs for clothing, hair, facial features, and overall appearance."
+    sheets_task = asyncio.create_task(load_reference_parts(storyboard_sheet_references(request), preloaded))
+
+    try:
+        # 모델 업로드 전에 축소/재인코딩 (스레드에서)
+        if background is not None:
+            background_bytes, background_mime_type = background.data, background.mime_type
         else:
-            background_bytes = base64.b64decode(request.backgroundImage)
-        
+            with timer.stage("preprocess"):
+                background_bytes, background_mime_type = await asyncio.to_thread(reference_preprocessor.prepare, background_bytes)
+        background_part = types.Part(
+            inline_data=types.Blob(
+                mime_type=background_mime_type,
+                data=background_bytes,
+            )
+        )
+
+        # --- 1. Vision Analysis: 캐릭터 위치 파악 ---
+
         # 캐릭터 위치 분석 프롬프트
         position_analysis_prompt = f"""
         Analyze this sketch image and describe the positions of characters that should be placed at these coordinates:
@@ -393,30 +1224,34 @@ async def create_storyboard(request: StoryboardCreationRequest):
             position_analysis_prompt += f"\n- {char['name']}: positioned at {x_percent:.1f}% from left, {y_percent:.1f}% from top"
         
         position_analysis_prompt += f"\n\nUser's story context: {request.prompt}\n\nBased on the sketch and character positions, create a detailed scene description for generating a storyboard image."
-        
-        vision_response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=[
-                position_analysis_prompt,
-                types.Part(
-                    inline_data=types.Blob(
-                        mime_type="image/png",
-                        data=background_bytes,
-                    )
+
+        vision_contents = [position_analysis_prompt, background_part]
+        scene_key = generation_key(VISION_MODEL, vision_contents)
+        cached_scene = None if request.bypassCache else scene_cache.get(scene_key)
+
+        if cached_scene is not None:
+            log.info("Scene description cache hit")
+            scene_description = cached_scene["sceneDescription"]
+        else:
+            log.payload("Position analysis prompt", prompt=position_analysis_prompt)
+            with timer.stage("vision_call"):
+                vision_response = await generator.generate_content(
+                    model=VISION_MODEL,
+                    contents=vision_contents,
                 )
-            ],
-        )
-        
-        scene_description = ""
-        if vision_response.candidates and len(vision_response.candidates) > 0:
-            for part in vision_response.candidates[0].content.parts:
-                if part.text:
-                    scene_description += part.text
-        
-        print(f"[API] Generated scene description: {scene_description[:200]}...")
-        
+
+            scene_description = ""
+            if vision_response.candidates and len(vision_response.candidates) > 0:
+                for part in vision_response.candidates[0].content.parts:
+                    if part.text:
+                        scene_description += part.text
+            if scene_description:
+                scene_cache.put(scene_key, {"sceneDescription": scene_description}, [])
+
+        log.payload("Generated scene description", scene_description=scene_description)
+        yield "scene", {"sceneDescription": scene_description, "cached": cached_scene is not None}
+
         # --- 2. 이미지 생성: 스케치 + 캐릭터 시트 이미지들 ---
-        print("[API] Generating storyboard image...")
         
         # 비율에 따른 추가 프롬프트
         ratio_prompts = {
@@ -439,175 +1274,325 @@ async def create_storyboard(request: StoryboardCreationRequest):
         
         Character positioning instructions:"""
         
-        print(f"[API] Final storyboard prompt sent to Gemini: {generation_prompt}")
+        log.payload("Final storyboard prompt", prompt=generation_prompt)
         
         for char_data in request.characters:
             char = char_data["character"]
             x_percent = (char_data["x"] / 600) * 100
             y_percent = (char_data["y"] / 500) * 100
             generation_prompt += f"\n- Place {char['name']} at {x_percent:.1f}% from left, {y_percent:.1f}% from top, using the exact design from their character sheet."
-        
-        contents_for_generation = [generation_prompt]
-        
-        # 배경 스케치 추가
-        contents_for_generation.append(
-            types.Part(
-                inline_data=types.Blob(
-                    mime_type="image/png",
-                    data=background_bytes,
-                )
-            )
-        )
-        
-        # 각 캐릭터의 캐릭터 시트 이미지들 추가 (모든 시트 이미지 포함)
-        for char_data in request.characters:
-            char = char_data["character"]
-            if char.get("characterSheets") and len(char["characterSheets"]) > 0:
-                # 모든 캐릭터 시트 이미지 추가
-                for i, sheet_url in enumerate(char["characterSheets"]):
-                    if sheet_url.startswith("http://localhost:8000/"):
-                        local_path = sheet_url.replace("http://localhost:8000/", "")
-                        sheet_file_path = os.path.join(".", local_path)
-                        
-                        try:
-                            with open(sheet_file_path, "rb") as f:
-                                sheet_bytes = f.read()
-                            
-                            contents_for_generation.append(
-                                types.Part(
-                                    inline_data=types.Blob(
-                                        mime_type="image/png",
-                                        data=sheet_bytes,
-                                    )
-                                )
-                            )
-                            print(f"[API] Added character sheet {i+1} for {char['name']}")
-                        except Exception as e:
-                            print(f"[API] Failed to load character sheet {i+1} for {char['name']}: {e}")
-                
-                # 캐릭터 시트 설명 추가
-                contents_for_generation[0] += f"\n\nFor {char['name']}: Reference the character sheets provided - use these exact designs for clothing, hair, facial features, and overall appearance."
-        
+
+        # 배경 스케치 + 캐릭터 시트 (비전 분석과 겹쳐서 읽었으므로 남은 대기 시간만 잰다)
+        with timer.stage("disk_read"):
+            sheet_parts = await sheets_task
+        yield "references", {"count": len(sheet_parts)}
+        contents_for_generation = [generation_prompt + sheet_instructions, background_part, *sheet_parts]
+
+        cache_key = generation_key(IMAGE_MODEL, contents_for_generation, request.aspectRatio)
+        cached = None if request.bypassCache else generation_cache.get(cache_key)
+        if cached is not None:
+            log.info("Generation cache hit", endpoint="create-storyboard")
+            timer.finish(images=len(cached["storyboardImages"]), cached=True)
+            yield "result", cached
+            return
+
         # 이미지 생성 요청
-        generation_response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=contents_for_generation,
-        )
+        with timer.stage("model_call"):
+            generation_response = await generator.generate_content(
+                model=IMAGE_MODEL,
+                contents=contents_for_generation,
+            )
         
         generated_images = []
+        saved_paths = []
         if generation_response.candidates and len(generation_response.candidates) > 0:
             candidate = generation_response.candidates[0]
-            print(f"[API] Candidate content: {candidate.content}")
             
             if candidate.content and hasattr(candidate.content, 'parts'):
                 parts = candidate.content.parts
-                print(f"[API] Number of parts in response: {len(parts)}")
+                log.debug("Model response received", parts=len(parts))
                 
                 for i, part in enumerate(parts):
                     if hasattr(part, 'inline_data') and part.inline_data is not None:
-                        print(f"[API] Part {i}: Image data found, size: {len(part.inline_data.data)} bytes")
                         # 스토리보드 이미지 저장
-                        unique_filename = f"storyboard_{int(time.time())}_{i}.png"
-                        save_path = os.path.join(IMAGES_DIR, unique_filename)
-                        
-                        image = Image.open(BytesIO(part.inline_data.data))
-                        image.save(save_path)
-                        print(f"[API] Saved storyboard image: {save_path}")
-                        
-                        image_url = f"http://localhost:8000/{STATIC_DIR}/images/{unique_filename}"
+                        with timer.stage("image_save"):
+                            image_url, save_path = await image_store.save(part.inline_data.data, "storyboard")
+                        log.debug("Saved storyboard image", path=save_path, bytes=len(part.inline_data.data))
                         generated_images.append(image_url)
+                        saved_paths.append(save_path)
+                        yield "image", {"imageUrl": image_url}
                     elif hasattr(part, 'text') and part.text:
-                        print(f"[API] Part {i}: Text response - {part.text[:100]}...")
+                        log.payload("Model text part", index=i, text=part.text)
             else:
-                print("[API] No content or parts found in response")
-                # 응답 구조 디버깅
-                print(f"[API] Full response structure: {dir(candidate)}")
-                if hasattr(candidate, 'finish_reason'):
-                    print(f"[API] Finish reason: {candidate.finish_reason}")
+                log.warning("No content or parts in model response", finish_reason=getattr(candidate, "finish_reason", None))
         else:
-            print("[API] No candidates in response")
+            log.warning("No candidates in model response")
         
-        print(f"[API] Generated {len(generated_images)} storyboard images")
-        return {
+        result = {
             "storyboardImages": generated_images,
             "sceneDescription": scene_description
         }
+        if generated_images:
+            generation_cache.put(cache_key, result, saved_paths)
+        timer.finish(images=len(generated_images), cached=False)
+        yield "result", result
+    finally:
+        if not sheets_task.done():
+            sheets_task.cancel()
+
+STORYBOARD_ERROR_RESULT = {
+    "storyboardImages": [DEFAULT_IMAGE_URL],
+    "sceneDescription": "Error generating scene description"
+}
+
+@app.post("/api/create-storyboard")
+async def create_storyboard(request: StoryboardCreationRequest, http_request: Request = None):
+    log.info("Creating storyboard", characters=len(request.characters), aspect_ratio=request.aspectRatio)
+    log.payload("Storyboard user prompt", prompt=request.prompt)
+    
+    try:
+        result = dict(STORYBOARD_ERROR_RESULT)
+        async for stage, data in storyboard_pipeline(request, timer=stage_timer("create-storyboard", http_request)):
+            if stage == "result":
+                result = data
+        return result
         
+    except GenerationUnavailableError:
+        raise
     except Exception as e:
-        print(f"[API] Error creating storyboard: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "storyboardImages": [DEFAULT_IMAGE_URL],
-            "sceneDescription": "Error generating scene description"
-        }
+        log.error("Error creating storyboard", exc_info=True, error=e)
+        return degraded_response(STORYBOARD_ERROR_RESULT, e)
+
+@app.post("/api/create-storyboard/stream")
+async def create_storyboard_stream(request: StoryboardCreationRequest, http_request: Request = None):
+    # 단계별 결과를 SSE로 바로 흘려보낸다: scene → references → image... → result
+    log.info("Creating storyboard (stream)", characters=len(request.characters), aspect_ratio=request.aspectRatio)
+    timer = stage_timer("create-storyboard", http_request)
+
+    async def events():
+        try:
+            async for stage, data in storyboard_pipeline(request, timer=timer):
+                yield sse_event(stage, data)
+        except Exception as e:
+            log.error("Error creating storyboard", exc_info=True, error=e)
+            yield sse_event("error", {**degraded_response(STORYBOARD_ERROR_RESULT, e), "retryAfter": retry_after(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.get("/api/sketches")
-async def get_sketches():
-    return {"sketches": [sketch.dict() for sketch in db_sketches]}
+async def get_sketches(request: Request, limit: Optional[int] = None, after: Optional[int] = None, fields: Optional[str] = None):
+    return collection_response(request, db_sketches, "sketches", limit, after, fields)
 
 @app.post("/api/sketches")
 async def save_sketch(sketch_data: dict):
     try:
         new_sketch = Sketch(**sketch_data)
+        if new_sketch.dataUrl:
+            # base64 디코드와 파일 쓰기는 이벤트 루프 밖에서
+            await asyncio.to_thread(move_sketch_to_blob_store, new_sketch)
+        elif new_sketch.blobId:
+            attach_sketch_blob(new_sketch)
         db_sketches.append(new_sketch)
-        save_sketches(db_sketches)
+        await save_sketches([new_sketch])
         return {"success": True, "sketch": new_sketch.dict()}
     except Exception as e:
-        print(f"Error saving sketch: {e}")
+        log.error("Error saving sketch", error=e)
         return {"success": False, "error": str(e)}
 
+@app.get("/api/sketches/{sketch_id}")
+async def get_sketch(sketch_id: int):
+    return await get_record(db_sketches, sketch_id)
+
+@app.put("/api/sketches/{sketch_id}")
+async def update_sketch(sketch_id: int, sketch_data: dict, if_match: Optional[str] = Header(None)):
+    if db_sketches.get(sketch_id) is None:
+        raise HTTPException(status_code=404, detail=f"sketches {sketch_id} not found")
+    try:
+        sketch = Sketch(**{**sketch_data, "id": sketch_id})
+        if not sketch.dataUrl and sketch.blobId:
+            attach_sketch_blob(sketch)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if sketch.dataUrl:
+        await asyncio.to_thread(move_sketch_to_blob_store, sketch)
+    await put_record(db_sketches, sketch, if_match)
+    return {"success": True, "sketch": sketch.dict()}
+
+@app.delete("/api/sketches/{sketch_id}")
+async def delete_sketch(sketch_id: int):
+    return await delete_record(db_sketches, delete_sketches, sketch_id)
+
+@app.get(f"/{STATIC_DIR}/thumbs/{{width}}/{{filename:path}}")
+async def get_thumbnail(request: Request, width: int, filename: str):
+    try:
+        path, etag = await thumbnail_service.get(width, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ThumbnailNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except ThumbnailUnsupported as e:
+        # svg 등 벡터 원본은 원본으로 보내고, 디코드할 수 없는 원본은 415
+        if not is_raster(filename):
+            return RedirectResponse(f"{IMAGES_URL}/{filename}", status_code=307)
+        raise HTTPException(status_code=415, detail=f"Cannot create a thumbnail for {e}")
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=thumbnail_service.media_type, headers=headers)
+
+# --- Upload API ---
+# 큰 캔버스를 base64 JSON으로 보내지 않고 바이너리 그대로 올린다.
+#   POST /api/uploads  본문 = 이미지 원본 바이트 (Content-Type: image/png 등)
+#                      또는 multipart/form-data의 file 필드
+# 본문은 청크 단위로 blob store 임시 파일에 바로 쓰고, 돌려준 assetId를
+# 생성 요청(backgroundAssetId)이나 스케치 저장(blobId)에서 참조한다.
+
+def check_upload_length(http_request: Request, limit: int):
+    # 선언된 크기가 한도를 넘으면 본문을 읽기 전에 거절한다
+    length = http_request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit")
+
+async def upload_file_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+async def store_upload(chunks: AsyncIterator[bytes]) -> dict:
+    writer = await asyncio.to_thread(blob_store.writer)
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(writer.write, chunk)
+        mime_type = sniff_mime_type(writer.head)
+        if mime_type is None:
+            raise HTTPException(status_code=415, detail="Upload is not a PNG, JPEG, WEBP or GIF image")
+        blob_id = await asyncio.to_thread(writer.commit, mime_type)
+    except BlobTooLargeError as e:
+        writer.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        writer.abort()
+        raise
+
+    log.info("Stored upload", asset_id=blob_id, bytes=writer.size)
+    return {
+        "assetId": blob_id,
+        "url": f"{BLOBS_URL}/{blob_id}",
+        "mimeType": mime_type,
+        "size": writer.size,
+    }
+
+@app.post("/api/uploads")
+async def upload_asset(http_request: Request):
+    content_type = http_request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # multipart 파서는 본문을 끝까지 읽어 임시 파일로 모으므로 크기를 미리 알 수 있어야 한다
+        # (chunked 전송이면 한도를 건너뛰게 되니 거절). 경계/헤더 몫으로 한 청크만큼 여유를 둔다.
+        if not http_request.headers.get("content-length", "").isdigit():
+            raise HTTPException(status_code=411, detail="multipart uploads need a Content-Length header; send raw bytes to stream without one")
+        check_upload_length(http_request, UPLOAD_MAX_BYTES + UPLOAD_CHUNK_SIZE)
+        async with http_request.form(max_files=1, max_fields=8) as form:
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=422, detail="multipart upload needs a 'file' field")
+            return await store_upload(upload_file_chunks(upload))
+
+    check_upload_length(http_request, UPLOAD_MAX_BYTES)
+    return await store_upload(http_request.stream())
+
+@app.get("/api/blobs/{blob_id}")
+async def get_blob(blob_id: str):
+    if not blob_store.exists(blob_id):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    # 내용 주소 기반이라 바뀌지 않으므로 오래 캐시해도 된다
+    return FileResponse(
+        blob_store.path(blob_id),
+        media_type=blob_store.mime_type(blob_id),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
 @app.get("/api/storyboards")
-async def get_storyboards():
-    return {"storyboards": [storyboard.dict() for storyboard in db_storyboards]}
+async def get_storyboards(request: Request, limit: Optional[int] = None, after: Optional[int] = None, fields: Optional[str] = None):
+    return collection_response(request, db_storyboards, "storyboards", limit, after, fields)
 
 @app.post("/api/storyboards")
 async def save_storyboard_scenes(scenes_data: dict):
     try:
         new_scenes = [StoryboardScene(**scene) for scene in scenes_data["scenes"]]
         db_storyboards.extend(new_scenes)
-        save_storyboards(db_storyboards)
+        await save_storyboards(new_scenes)
         return {"success": True, "scenes": [scene.dict() for scene in new_scenes]}
     except Exception as e:
-        print(f"Error saving storyboard scenes: {e}")
+        log.error("Error saving storyboard scenes", error=e)
         return {"success": False, "error": str(e)}
 
+@app.get("/api/storyboards/{scene_id}")
+async def get_storyboard_scene(scene_id: int):
+    return await get_record(db_storyboards, scene_id)
+
+@app.put("/api/storyboards/{scene_id}")
+async def update_storyboard_scene(scene_id: int, scene_data: dict, if_match: Optional[str] = Header(None)):
+    scene = await replace_record(db_storyboards, StoryboardScene, scene_id, scene_data, if_match)
+    return {"success": True, "scene": scene.dict()}
+
+@app.delete("/api/storyboards/{scene_id}")
+async def delete_storyboard_scene(scene_id: int):
+    return await delete_record(db_storyboards, delete_storyboards, scene_id)
+
 # --- Stories API ---
 @app.get("/api/stories")
-async def get_stories():
-    return {"stories": [story.dict() for story in db_stories]}
+async def get_stories(request: Request, limit: Optional[int] = None, after: Optional[int] = None, fields: Optional[str] = None):
+    return collection_response(request, db_stories, "stories", limit, after, fields)
 
 @app.post("/api/stories")
 async def save_story(story_data: dict):
     try:
         new_story = Story(**story_data)
         db_stories.append(new_story)
-        save_stories(db_stories)
+        await save_stories([new_story])
         return {"success": True, "story": new_story.dict()}
     except Exception as e:
-        print(f"Error saving story: {e}")
+        log.error("Error saving story", error=e)
         return {"success": False, "error": str(e)}
 
 @app.put("/api/stories/{story_id}")
-async def update_story(story_id: int, story_data: dict):
-    try:
-        for i, story in enumerate(db_stories):
-            if story.id == story_id:
-                updated_story = Story(**story_data)
-                db_stories[i] = updated_story
-                save_stories(db_stories)
-                return {"success": True, "story": updated_story.dict()}
-        return {"success": False, "error": "Story not found"}
+async def update_story(story_id: int, story_data: dict, if_match: Optional[str] = Header(None)):
+    try:
+        if db_stories.get(story_id) is None:
+            return {"success": False, "error": "Story not found"}
+        updated_story = Story(**{**story_data, "id": story_id})
+        await put_record(db_stories, updated_story, if_match)
+        return {"success": True, "story": updated_story.dict()}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error updating story: {e}")
+        log.error("Error updating story", error=e)
         return {"success": False, "error": str(e)}
 
+@app.get("/api/stories/{story_id}")
+async def get_story(story_id: int):
+    return await get_record(db_stories, story_id)
+
+@app.delete("/api/stories/{story_id}")
+async def delete_story(story_id: int):
+    return await delete_record(db_stories, delete_stories, story_id)
+
 @app.post("/api/generate-story-image")
-async def generate_story_image(request: StoryImageRequest):
+async def generate_story_image(request: StoryImageRequest, http_request: Request = None):
+    return await render_story_image(request, timer=stage_timer("generate-story-image", http_request))
+
+async def render_story_image(
+    request: StoryImageRequest,
+    preloaded: Optional[Dict[str, "types.Part"]] = None,
+    timer: Optional[StageTimer] = None,
+) -> dict:
+    timer = timer or stage_timer("generate-story-image")
     try:
-        print(f"[API] Generating image for story: {request.story}")
-        print(f"[API] Characters involved: {len(request.characters)}")
-        print(f"[API] Requested aspect ratio: {request.aspectRatio}")
+        log.info("Generating story image", characters=len(request.characters), aspect_ratio=request.aspectRatio)
+        log.payload("Story text", story=request.story)
         
         # 비율에 따른 추가 프롬프트
         ratio_prompts = {
@@ -628,110 +1613,75 @@ The scene should capture the emotion and action described in the story text.
 
 {ratio_prompts.get(request.aspectRatio, ratio_prompts["1:1"])}"""
 
-        print(f"[API] Final prompt sent to Gemini: {prompt}")
+        log.payload("Final story image prompt", prompt=prompt)
         contents_for_generation = [prompt]
         
         # 캐릭터 이미지들 추가
-        for char in request.characters:
-            if char.get("characterSheets") and len(char["characterSheets"]) > 0:
-                for sheet_url in char["characterSheets"]:
-                    if sheet_url.startswith("http://localhost:8000/"):
-                        local_path = sheet_url.replace("http://localhost:8000/", "")
-                        sheet_file_path = os.path.join(".", local_path)
-                        
-                        try:
-                            with open(sheet_file_path, "rb") as f:
-                                sheet_bytes = f.read()
-                            
-                            contents_for_generation.append(
-                                types.Part(
-                                    inline_data=types.Blob(
-                                        mime_type="image/png",
-                                        data=sheet_bytes,
-                                    )
-                                )
-                            )
-                            print(f"[API] Added character sheet for {char['name']}")
-                        except Exception as e:
-                            print(f"[API] Failed to load character sheet for {char['name']}: {e}")
-            elif char.get("imageUrl"):
-                # 캐릭터 기본 이미지 사용
-                if char["imageUrl"].startswith("http://localhost:8000/"):
-                    local_path = char["imageUrl"].replace("http://localhost:8000/", "")
-                    char_file_path = os.path.join(".", local_path)
-                    
-                    try:
-                        with open(char_file_path, "rb") as f:
-                            char_bytes = f.read()
-                        
-                        contents_for_generation.append(
-                            types.Part(
-                                inline_data=types.Blob(
-                                    mime_type="image/png",
-                                    data=char_bytes,
-                                )
-                            )
-                        )
-                        print(f"[API] Added character image for {char['name']}")
-                    except Exception as e:
-                        print(f"[API] Failed to load character image for {char['name']}: {e}")
+        with timer.stage("disk_read"):
+            contents_for_generation.extend(await load_reference_parts(story_image_references(request), preloaded))
+
+        cache_key = generation_key(IMAGE_MODEL, contents_for_generation, request.aspectRatio)
+        cached = None if request.bypassCache else generation_cache.get(cache_key)
+        if cached is not None:
+            log.info("Generation cache hit", endpoint="generate-story-image")
+            timer.finish(cached=True)
+            return cached
+
+        async def generate() -> Optional[dict]:
+            # 이미지 생성 요청
+            with timer.stage("model_call"):
+                generation_response = await generator.generate_content(
+                    model=IMAGE_MODEL,
+                    contents=contents_for_generation,
+                )
 
-        # 이미지 생성 요청
-        generation_response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=contents_for_generation,
-        )
+            if generation_response.candidates and len(generation_response.candidates) > 0:
+                candidate = generation_response.candidates[0]
+
+                if candidate.content and hasattr(candidate.content, 'parts'):
+                    parts = candidate.content.parts
+
+                    for i, part in enumerate(parts):
+                        if hasattr(part, 'inline_data') and part.inline_data is not None:
+                            # 스토리 이미지 저장
+                            with timer.stage("image_save"):
+                                image_url, save_path = await image_store.save(part.inline_data.data, "story")
+                            log.debug("Saved story image", path=save_path, bytes=len(part.inline_data.data))
+                            result = {"imageUrl": image_url}
+                            generation_cache.put(cache_key, result, [save_path])
+                            return result
+            return None
+
+        result, coalesced = await coalesced_generation(cache_key, generate, timer)
+        if result is not None:
+            timer.finish(cached=False, coalesced=coalesced)
+            return result
         
-        if generation_response.candidates and len(generation_response.candidates) > 0:
-            candidate = generation_response.candidates[0]
-            
-            if candidate.content and hasattr(candidate.content, 'parts'):
-                parts = candidate.content.parts
-                
-                for i, part in enumerate(parts):
-                    if hasattr(part, 'inline_data') and part.inline_data is not None:
-                        # 스토리 이미지 저장
-                        unique_filename = f"story_{int(time.time())}_{i}.png"
-                        save_path = os.path.join(IMAGES_DIR, unique_filename)
-                        
-                        image = Image.open(BytesIO(part.inline_data.data))
-                        image.save(save_path)
-                        print(f"[API] Saved story image: {save_path}")
-                        
-                        image_url = f"http://localhost:8000/{STATIC_DIR}/images/{unique_filename}"
-                        return {"imageUrl": image_url}
-        
-        print("[API] No image generated from response")
+        log.warning("No image generated from response", endpoint="generate-story-image")
         return {"imageUrl": DEFAULT_IMAGE_URL}
         
+    except GenerationUnavailableError:
+        raise
     except Exception as e:
-        print(f"[API] Error generating story image: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"imageUrl": DEFAULT_IMAGE_URL}
-
-@app.post("/api/generate-next-scene")
-async def generate_next_scene(request: NextSceneRequest):
-    try:
-        print(f"[API] Generating next scene from: {request.startFrameUrl}")
-        print(f"[API] Custom prompt: {request.prompt}")
-        print(f"[API] Aspect ratio: {request.aspectRatio}")
-        
-        # 비율에 따른 추가 프롬프트
-        ratio_prompts = {
-            "1:1": "IMPORTANT: Generate a SQUARE image with 1:1 aspect ratio. The image must be exactly square shaped, with equal width and height. Do not create vertical or horizontal rectangles.",
-            "16:9": "IMPORTANT: Generate a WIDE HORIZONTAL image with 16:9 aspect ratio. The image must be wider than it is tall, like a movie screen or landscape photo.",
-            "9:16": "IMPORTANT: Generate a TALL VERTICAL image with 9:16 aspect ratio. The image must be taller than it is wide, like a smartphone screen or portrait photo."
-        }
-
-        # 기본 프롬프트 또는 사용자 프롬프트 사용
-        if request.prompt:
-            scene_instruction = f"Create the next scene with this direction: {request.prompt}"
-        else:
-            scene_instruction = "Create a natural next scene that logically follows from the start frame. Show what happens next in this story sequence."
-
-        # Gemini로 다음 장면 생성 프롬프트 구성
-        prompt = f"""You are given a START FRAME image. Create an END FRAME that shows the next logical scene in the sequence.
+        log.error("Error generating story image", exc_info=True, error=e)
+        return degraded_response({"imageUrl": DEFAULT_IMAGE_URL}, e)
+
+def next_scene_prompt(direction: Optional[str], aspect_ratio: str) -> str:
+    # 비율에 따른 추가 프롬프트
+    ratio_prompts = {
+        "1:1": "IMPORTANT: Generate a SQUARE image with 1:1 aspect ratio. The image must be exactly square shaped, with equal width and height. Do not create vertical or horizontal rectangles.",
+        "16:9": "IMPORTANT: Generate a WIDE HORIZONTAL image with 16:9 aspect ratio. The image must be wider than it is tall, like a movie screen or landscape photo.",
+        "9:16": "IMPORTANT: Generate a TALL VERTICAL image with 9:16 aspect ratio. The image must be taller than it is wide, like a smartphone screen or portrait photo."
+    }
+
+    # 기본 프롬프트 또는 사용자 프롬프트 사용
+    if direction:
+        scene_instruction = f"Create the next scene with this direction: {direction}"
+    else:
+        scene_instruction = "Create a natural next scene that logically follows from the start frame. Show what happens next in this story sequence."
+
+    # Gemini로 다음 장면 생성 프롬프트 구성
+    return f"""You are given a START FRAME image. Create an END FRAME that shows the next logical scene in the sequence.
 
 START FRAME: This is the current scene (provided as image)
 
@@ -745,64 +1695,466 @@ REQUIREMENTS:
 
 Style: High-quality anime art, detailed characters, vibrant colors, dynamic composition that matches the start frame.
 
-{ratio_prompts.get(request.aspectRatio, ratio_prompts["1:1"])}"""
-
-        contents_for_generation = [prompt]
-        
-        # Start frame 이미지 추가
-        if request.startFrameUrl.startswith("http://localhost:8000/"):
-            local_path = request.startFrameUrl.replace("http://localhost:8000/", "")
-            start_frame_path = os.path.join(".", local_path)
-            
-            try:
-                with open(start_frame_path, "rb") as f:
-                    start_frame_bytes = f.read()
-                
-                contents_for_generation.append(
-                    types.Part(
-                        inline_data=types.Blob(
-                            mime_type="image/png",
-                            data=start_frame_bytes,
-                        )
-                    )
+{ratio_prompts.get(aspect_ratio, ratio_prompts["1:1"])}"""
+
+async def render_next_scene(
+    prompt: str,
+    aspect_ratio: str,
+    start_frame: Optional[ReferenceImage],
+    bypass_cache: bool = False,
+    timer: Optional[StageTimer] = None,
+) -> Tuple[dict, Optional[bytes]]:
+    # (응답, 생성된 이미지 바이트). 캐시 적중이거나 이미지가 없으면 바이트는 None.
+    timer = timer or stage_timer("generate-next-scene")
+    log.payload("Final next scene prompt", prompt=prompt)
+    contents_for_generation = [prompt]
+    if start_frame is not None:
+        contents_for_generation.append(
+            types.Part(
+                inline_data=types.Blob(
+                    mime_type=start_frame.mime_type,
+                    data=start_frame.data,
                 )
-                print(f"[API] Added start frame image: {start_frame_path}")
-            except Exception as e:
-                print(f"[API] Failed to load start frame: {e}")
-                return {"endFrameUrl": DEFAULT_IMAGE_URL}
+            )
+        )
 
-        print(f"[API] Final next scene prompt sent to Gemini: {prompt}")
+    cache_key = generation_key(IMAGE_MODEL, contents_for_generation, aspect_ratio)
+    cached = None if bypass_cache else generation_cache.get(cache_key)
+    if cached is not None:
+        log.info("Generation cache hit", endpoint=timer.endpoint)
+        timer.finish(cached=True)
+        return cached, None
 
+    async def generate() -> Tuple[Optional[dict], Optional[bytes]]:
         # 이미지 생성 요청
-        generation_response = client.models.generate_content(
-            model="gemini-2.5-flash-image-preview",
-            contents=contents_for_generation,
-        )
-        
+        with timer.stage("model_call"):
+            generation_response = await generator.generate_content(
+                model=IMAGE_MODEL,
+                contents=contents_for_generation,
+            )
+
         if generation_response.candidates and len(generation_response.candidates) > 0:
             candidate = generation_response.candidates[0]
-            
+
             if candidate.content and hasattr(candidate.content, 'parts'):
                 parts = candidate.content.parts
-                
+
                 for i, part in enumerate(parts):
                     if hasattr(part, 'inline_data') and part.inline_data is not None:
                         # End frame 이미지 저장
-                        unique_filename = f"next_scene_{int(time.time())}_{i}.png"
-                        save_path = os.path.join(IMAGES_DIR, unique_filename)
-                        
-                        image = Image.open(BytesIO(part.inline_data.data))
-                        image.save(save_path)
-                        print(f"[API] Saved next scene image: {save_path}")
-                        
-                        end_frame_url = f"http://localhost:8000/{STATIC_DIR}/images/{unique_filename}"
-                        return {"endFrameUrl": end_frame_url}
-        
-        print("[API] No image generated from response")
-        return {"endFrameUrl": DEFAULT_IMAGE_URL}
+                        with timer.stage("image_save"):
+                            end_frame_url, save_path = await image_store.save(part.inline_data.data, "next_scene")
+                        log.debug("Saved next scene image", path=save_path, bytes=len(part.inline_data.data))
+                        result = {"endFrameUrl": end_frame_url}
+                        generation_cache.put(cache_key, result, [save_path])
+                        return result, part.inline_data.data
+        return None, None
+
+    (result, image_data), coalesced = await coalesced_generation(cache_key, generate, timer)
+    if result is not None:
+        timer.finish(cached=False, coalesced=coalesced)
+        return result, image_data
+    
+    log.warning("No image generated from response", endpoint=timer.endpoint)
+    return {"endFrameUrl": DEFAULT_IMAGE_URL}, None
+
+@app.post("/api/generate-next-scene")
+async def generate_next_scene(request: NextSceneRequest, http_request: Request = None):
+    timer = stage_timer("generate-next-scene", http_request)
+    try:
+        log.info("Generating next scene", start_frame_url=request.startFrameUrl, aspect_ratio=request.aspectRatio)
+        log.payload("Next scene direction", prompt=request.prompt)
+
+        prompt = next_scene_prompt(request.prompt, request.aspectRatio)
+
+        # Start frame 이미지 추가
+        start_frame = None
+        start_frame_path = reference_path(request.startFrameUrl)
+        if start_frame_path:
+            try:
+                with timer.stage("disk_read"):
+                    start_frame = await reference_cache.read(start_frame_path)
+            except Exception as e:
+                log.warning("Failed to load start frame", path=start_frame_path, error=e)
+                return {"endFrameUrl": DEFAULT_IMAGE_URL}
+
+        result, _ = await render_next_scene(prompt, request.aspectRatio, start_frame, request.bypassCache, timer)
+        return result
         
+    except GenerationUnavailableError:
+        raise
     except Exception as e:
-        print(f"[API] Error generating next scene: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"endFrameUrl": DEFAULT_IMAGE_URL}
+        log.error("Error generating next scene", exc_info=True, error=e)
+        return degraded_response({"endFrameUrl": DEFAULT_IMAGE_URL}, e)
+
+
+# --- Next Scene Chain API ---
+# 시작 프레임 + K개의 연출 지시로 프레임을 서버에서 연달아 만든다.
+# 직전 프레임은 디스크를 다시 읽지 않고 메모리의 바이트를 그대로 다음 단계에 넘기며,
+# 프레임이 하나 끝날 때마다 SSE로 보낸다. 체인 상태는 단계마다 data/chains/{id}.json에 저장되므로
+# 중간에 실패해도 chainId로 실패한 단계부터 이어서 생성할 수 있다 (이미 만든 프레임은 다시 만들지 않음).
+running_chains = set()
+
+def chain_path(chain_id: str) -> str:
+    return os.path.join(CHAINS_DIR, f"{chain_id}.json")
+
+def load_chain(chain_id: str) -> Optional[dict]:
+    if not chain_id.isalnum():
+        return None
+    try:
+        with open(chain_path(chain_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+async def save_chain(chain: dict):
+    # 단계마다 저장한다: 열기/fsync는 이벤트 루프 밖에서
+    chain["updatedAt"] = time.time()
+    await asyncio.to_thread(write_chain, chain)
+
+def write_chain(chain: dict):
+    os.makedirs(CHAINS_DIR, exist_ok=True)
+    write_json_atomic(chain_path(chain["id"]), chain)
+
+async def prepare_frame(data: bytes) -> ReferenceImage:
+    # 단일 호출과 같은 전처리를 거쳐야 모델 입력(과 캐시 키)이 같아진다
+    return ReferenceImage(*await asyncio.to_thread(reference_preprocessor.prepare, data))
+
+@app.post("/api/generate-next-scene/chain")
+async def generate_next_scene_chain(request: NextSceneChainRequest):
+    if request.chainId:
+        chain = await asyncio.to_thread(load_chain, request.chainId)
+        if chain is None:
+            raise HTTPException(status_code=404, detail="Chain not found")
+        if request.directions:
+            chain["directions"] = list(request.directions)
+    else:
+        if not request.startFrameUrl or not request.directions:
+            raise HTTPException(status_code=422, detail="startFrameUrl and directions are required for a new chain")
+        chain = {
+            "id": uuid.uuid4().hex,
+            "startFrameUrl": request.startFrameUrl,
+            "directions": list(request.directions),
+            "aspectRatio": request.aspectRatio,
+            "frames": [],
+            "status": "running",
+            "error": None,
+            "failedStep": None,
+            "createdAt": time.time(),
+        }
+
+    # 기본은 마지막으로 성공한 다음 단계부터. fromStep을 주면 그 단계부터 다시 만든다.
+    from_step = len(chain["frames"]) if request.fromStep is None else request.fromStep
+    if from_step < 0 or from_step > len(chain["frames"]):
+        raise HTTPException(status_code=422, detail=f"fromStep must be between 0 and {len(chain['frames'])}")
+    if chain["id"] in running_chains:
+        raise HTTPException(status_code=409, detail="Chain is already running")
+
+    async def events():
+        # 실행 자리는 스트림 안에서 잡는다: 응답이 시작되지 않거나 클라이언트가 끊어도 finally에서 반드시 풀린다
+        if chain["id"] in running_chains:
+            yield sse_event("error", {"chainId": chain["id"], "error": "Chain is already running"})
+            return
+        running_chains.add(chain["id"])
+        step = from_step
+        try:
+            chain["frames"] = chain["frames"][:from_step]
+            chain["status"] = "running"
+            chain["error"] = None
+            chain["failedStep"] = None
+            await save_chain(chain)
+            log.info("Running next scene chain", chain_id=chain["id"], from_step=from_step, steps=len(chain["directions"]))
+            yield sse_event("chain", {"chainId": chain["id"], "fromStep": from_step, "steps": len(chain["directions"])})
+
+            # 첫 단계의 시작 프레임만 디스크(캐시)에서 읽는다
+            start_frame_url = chain["frames"][-1] if chain["frames"] else chain["startFrameUrl"]
+            start_frame_path = reference_path(start_frame_url)
+            start_frame = await reference_cache.read(start_frame_path) if start_frame_path else None
+
+            for step in range(from_step, len(chain["directions"])):
+                prompt = next_scene_prompt(chain["directions"][step], chain["aspectRatio"])
+                timer = stage_timer("next-scene-chain")
+                result, frame_bytes = await render_next_scene(prompt, chain["aspectRatio"], start_frame, request.bypassCache, timer)
+                if result["endFrameUrl"] == DEFAULT_IMAGE_URL:
+                    raise RuntimeError("No image generated")
+
+                chain["frames"].append(result["endFrameUrl"])
+                await save_chain(chain)
+                yield sse_event("frame", {"step": step, "endFrameUrl": result["endFrameUrl"], "cached": frame_bytes is None})
+
+                if step + 1 < len(chain["directions"]):
+                    if frame_bytes is not None:
+                        start_frame = await prepare_frame(frame_bytes)
+                    else:
+                        # 캐시 적중이면 바이트가 없으므로 저장된 파일을 읽는다
+                        start_frame = await reference_cache.read(local_path_from_url(result["endFrameUrl"]))
+
+            chain["status"] = "succeeded"
+            await save_chain(chain)
+            yield sse_event("done", {"chainId": chain["id"], "frames": chain["frames"]})
+        except Exception as e:
+            log.warning("Next scene chain failed", chain_id=chain["id"], step=step, error=e)
+            chain["status"] = "failed"
+            chain["error"] = str(e)
+            chain["failedStep"] = step
+            await save_chain(chain)
+            yield sse_event("error", {
+                "chainId": chain["id"],
+                "step": step,
+                "error": str(e),
+                "degraded": isinstance(e, GenerationUnavailableError),
+                "retryAfter": retry_after(e),
+                "frames": chain["frames"],
+            })
+        finally:
+            running_chains.discard(chain["id"])
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/api/generate-next-scene/chain/{chain_id}")
+async def get_next_scene_chain(chain_id: str):
+    chain = await asyncio.to_thread(load_chain, chain_id)
+    if chain is None:
+        raise HTTPException(status_code=404, detail="Chain not found")
+    return chain
+
+
+# --- Jobs API ---
+# 생성 요청을 큐에 넣고 jobId를 바로 돌려준다. 결과는 /api/jobs/{id}로 조회한다.
+JOB_HANDLERS = {
+    "generate-character-sheet": (CharacterSheetRequest, generate_character_sheet),
+    "create-storyboard": (StoryboardCreationRequest, create_storyboard),
+    "generate-story-image": (StoryImageRequest, generate_story_image),
+    "generate-next-scene": (NextSceneRequest, generate_next_scene),
+}
+
+async def run_generation_job(kind: str, payload: dict) -> dict:
+    request_model, handler = JOB_HANDLERS[kind]
+    result = await handler(request_model(**payload))
+    if result.get("degraded"):
+        # 기본 이미지로 대신한 응답은 실패한 잡이다 (결과는 그대로 남겨 클라이언트가 볼 수 있게)
+        raise JobFailed(result.get("error") or "Generation degraded", result)
+    return result
+
+# sqlite 모드에서는 잡도 공유 파일에 둔다: 제출받은 워커가 실행하고, 조회는 어느 워커로 와도 된다
+job_queue = JobQueue(SqliteJobStore(shared_database()) if STORAGE_BACKEND == "sqlite" else InMemoryJobStore(), run_generation_job)
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(submission: JobSubmission):
+    if submission.kind not in JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {submission.kind}")
+
+    # 잘못된 payload는 큐에 넣기 전에 거른다
+    request_model, _ = JOB_HANDLERS[submission.kind]
+    try:
+        request_model(**submission.payload)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        job = await job_queue.submit(submission.kind, submission.payload, submission.priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"jobId": job.id, "status": job.status}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    # wait > 0 이면 long-poll (최대 60초)
+    if wait > 0:
+        job = await job_queue.wait(job_id, min(wait, 60.0))
+    else:
+        job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.dict(exclude={"payload", "worker"})
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job_queue.events(job_id), media_type="text/event-stream")
+
+
+# --- Storyboard Batch API ---
+# 여러 패널을 한 요청으로 받아 제한된 병렬도로 생성한다.
+# 패널들이 공유하는 캐릭터 시트는 배치 시작 시 한 번만 읽고/전처리해서 모든 패널이 같이 쓴다.
+# 패널 결과는 끝나는 대로 SSE로 보내고, 만들어진 StoryboardScene은 마지막에 한 번에 저장한다.
+STORYBOARD_BATCH_CONCURRENCY = int(os.getenv("STORYBOARD_BATCH_CONCURRENCY", "3"))
+
+BATCH_PANEL_KINDS = {
+    "create-storyboard": StoryboardCreationRequest,
+    "generate-story-image": StoryImageRequest,
+}
+
+async def allocate_storyboard_ids(count: int) -> List[int]:
+    # 프론트엔드와 같은 Date.now() 기반 id. 저장소에서 연속 count개를 원자적으로 잡으므로
+    # 여러 워커가 같은 밀리초에 배치를 만들어도 겹치지 않는다.
+    if count == 0:
+        return []
+    floor = max(int(time.time() * 1000), max((scene.id for scene in db_storyboards), default=0) + 1)
+    first = await asyncio.to_thread(storyboards_store.allocate_id, "next_id", floor, count)
+    return list(range(first, first + count))
+
+async def run_batch_panel(kind: str, request, preloaded: Dict[str, "types.Part"]) -> Tuple[dict, List[str], str, List[int]]:
+    # (응답, 생성된 이미지 URL들, 장면 설명, 등장 캐릭터 id)
+    if kind == "create-storyboard":
+        result = dict(STORYBOARD_ERROR_RESULT)
+        async for stage, data in storyboard_pipeline(request, preloaded):
+            if stage == "result":
+                result = data
+        images = result["storyboardImages"]
+        description = f"AI 생성: {result['sceneDescription']}"
+        character_ids = [c["character"]["id"] for c in request.characters if "id" in c["character"]]
+    else:
+        result = await render_story_image(request, preloaded)
+        images = [result["imageUrl"]]
+        description = request.story
+        character_ids = [c["id"] for c in request.characters if "id" in c]
+    images = [url for url in images if url != DEFAULT_IMAGE_URL]
+    return result, images, description, character_ids
+
+@app.post("/api/storyboards/batch")
+async def create_storyboard_batch(batch: StoryboardBatchRequest):
+    panels = []
+    for index, panel in enumerate(batch.panels):
+        request_model = BATCH_PANEL_KINDS.get(panel.kind)
+        if request_model is None:
+            raise HTTPException(status_code=400, detail=f"Unknown panel kind: {panel.kind} (panel {index})")
+        try:
+            panels.append((panel.kind, request_model(**panel.payload)))
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"panel {index}: {e}")
+
+    concurrency = min(batch.concurrency or STORYBOARD_BATCH_CONCURRENCY, STORYBOARD_BATCH_CONCURRENCY)
+    concurrency = max(concurrency, 1)
+    log.info("Running storyboard batch", panels=len(panels), concurrency=concurrency)
+
+    async def events():
+        # 공유 참조 이미지는 배치당 한 번만
+        reference_urls = []
+        for kind, request in panels:
+            references = storyboard_sheet_references(request) if kind == "create-storyboard" else story_image_references(request)
+            reference_urls.extend(url for _, url in references)
+        preloaded = await read_reference_parts(reference_urls)
+        yield sse_event("references", {"requested": len(reference_urls), "loaded": len(preloaded)})
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, kind: str, request):
+            async with semaphore:
+                try:
+                    return index, await run_batch_panel(kind, request, preloaded), None
+                except Exception as e:
+                    log.warning("Storyboard batch panel failed", index=index, error=e)
+                    return index, None, e
+
+        tasks = [asyncio.create_task(run(index, kind, request)) for index, (kind, request) in enumerate(panels)]
+        finished = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, outcome, error = await next_done
+                if outcome is not None and not outcome[1]:
+                    error = RuntimeError("No image generated")
+                finished[index] = outcome if error is None else None
+                yield sse_event("panel", {
+                    "index": index,
+                    "kind": panels[index][0],
+                    "status": "failed" if error else "succeeded",
+                    "result": outcome[0] if outcome else None,
+                    "error": str(error) if error else None,
+                    "degraded": isinstance(error, GenerationUnavailableError),
+                })
+        finally:
+            # 클라이언트가 끊으면 남은 패널은 취소한다
+            for task in tasks:
+                task.cancel()
+
+        # 패널 순서대로 장면을 만들어 한 번에 저장
+        succeeded = [finished[index] for index in sorted(finished) if finished[index] is not None]
+        scene_specs = [(url, description, character_ids) for _, images, description, character_ids in succeeded for url in images]
+        scenes = [
+            StoryboardScene(id=scene_id, imageUrl=url, description=description, characterIds=character_ids)
+            for scene_id, (url, description, character_ids) in zip(await allocate_storyboard_ids(len(scene_specs)), scene_specs)
+        ]
+        if scenes:
+            db_storyboards.extend(scenes)
+            started = time.perf_counter()
+            await save_storyboards(scenes)
+            GENERATION_STAGE_SECONDS.observe(time.perf_counter() - started, endpoint="storyboard-batch", stage="storage_write")
+        yield sse_event("done", {
+            "succeeded": len(succeeded),
+            "failed": len(panels) - len(succeeded),
+            "scenes": [scene.dict() for scene in scenes],
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# --- Asset API ---
+# 레코드(캐릭터, 스토리보드)는 컬렉션이 인덱싱할 때 asset_registry에 참조를 등록한다.
+# 그 밖에 파일을 붙잡고 있는 것들은 GC 루트로 등록한다.
+# sqlite(멀티 워커) 모드에서도 루트는 모든 워커의 것을 본다: 레코드와 작업 결과는 공유 DB에서,
+# 체인은 공유 data/chains에서 읽는다. 다른 워커의 생성 캐시 항목만 보이지 않는데,
+# 파일이 지워진 항목은 GenerationCache.get이 미스로 처리하므로 다시 생성될 뿐이다.
+# 아직 어디에도 저장되지 않은 생성 직후 결과는 ASSET_GC_GRACE_PERIOD가 보호한다.
+def read_chain_asset_urls() -> List[str]:
+    urls = []
+    if not os.path.isdir(CHAINS_DIR):
+        return urls
+    for name in os.listdir(CHAINS_DIR):
+        if name.endswith(".json"):
+            chain = load_chain(name[:-5])
+            if chain is not None:
+                urls.append(chain.get("startFrameUrl"))
+                urls.extend(chain.get("frames", []))
+    return urls
+
+async def chain_asset_urls() -> List[str]:
+    return await asyncio.to_thread(read_chain_asset_urls)
+
+async def job_asset_urls() -> List[str]:
+    # 아직 보관 중인 작업 결과의 이미지 URL (클라이언트가 결과를 가져가 레코드로 저장하기 전)
+    urls = []
+
+    def visit(value):
+        if isinstance(value, str):
+            urls.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item)
+
+    for job in await job_queue.list():
+        visit(job.result)
+    return urls
+
+async def loaded_record_assets() -> List[str]:
+    # 지연 시작 모드: 아직 안 읽은 컬렉션의 참조가 빠진 채로 GC가 돌지 않게 먼저 읽는다.
+    # sqlite 모드: 다른 워커가 바꾼 컬렉션도 다시 읽어 최신 레코드로 표시한다.
+    # 읽으면서 레코드 참조가 registry에 올라가므로 돌려줄 URL은 없다.
+    await refresh_collections()
+    for collection in (db_characters, db_storyboards):
+        collection.load()
+    return []
+
+asset_registry.add_root(loaded_record_assets)
+asset_registry.add_root(generation_cache.files)
+asset_registry.add_root(chain_asset_urls)
+asset_registry.add_root(job_asset_urls)
+asset_registry.add_root(lambda: [DEFAULT_IMAGE_URL])
+
+@app.get("/api/assets/report")
+async def get_asset_report():
+    return await asset_registry.report()
+
+@app.post("/api/assets/gc")
+async def collect_assets(dry_run: bool = False):
+    return await asset_registry.collect(dry_run=dry_run)
+
+
+
+# --- Static 파일 마운트 ---
+# 위의 /static/thumbs 라우트가 먼저 매칭되도록 마지막에 마운트한다
+app.mount(f"/{STATIC_DIR}", StaticFiles(directory=STATIC_DIR), name="static")
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import importlib
+import os
+import random
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, List, Optional, Tuple
+
+from telemetry import get_logger
+
+
+# --- 모델 백엔드 설정 ---
+# MODEL_BACKEND=fake 이면 네트워크 없이 합성 응답을 돌려주는 로컬 백엔드를 쓴다 (부하 테스트용)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()
+
+# fake 백엔드: 지연은 로그정규분포(중앙값 FAKE_LATENCY_MS, 퍼짐 FAKE_LATENCY_SIGMA),
+# 오류는 FAKE_ERROR_RATE 확률로 FAKE_ERROR_CODES 중 하나
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "2000"))
+FAKE_LATENCY_SIGMA = float(os.getenv("FAKE_LATENCY_SIGMA", "0.5"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+FAKE_ERROR_CODES = tuple(int(code) for code in os.getenv("FAKE_ERROR_CODES", "429,503").split(",") if code.strip())
+FAKE_IMAGE_SIZE = int(os.getenv("FAKE_IMAGE_SIZE", "512"))
+FAKE_IMAGES_PER_RESPONSE = int(os.getenv("FAKE_IMAGES_PER_RESPONSE", "1"))
+
+# 합성 이미지 인코딩은 비싸므로 몇 가지 변형만 만들어 두고 돌려 쓴다
+FAKE_IMAGE_VARIANTS = 16
+
+log = get_logger("backend")
+
+
+class LazyModule:
+    # 속성을 처음 읽을 때 import 한다. google.genai는 import만 수백 ms가 걸려서
+    # 서버 시작 시가 아니라 첫 생성 요청(또는 SDK 타입을 처음 쓰는 곳)에서 읽는다.
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+types = LazyModule("google.genai.types")
+errors = LazyModule("google.genai.errors")
+
+
+class ModelBackend(ABC):
+    # 생성 핸들러가 모델을 부르는 유일한 통로. GenerationGateway가 이 인터페이스를 호출한다.
+    name = "base"
+
+    @abstractmethod
+    async def generate_content(self, model: str, contents: List[Any]) -> "types.GenerateContentResponse":
+        ...
+
+
+class GeminiBackend(ModelBackend):
+    name = "gemini"
+
+    # 클라이언트는 첫 생성 호출 때 만든다 (시작 시간 단축, 키가 없어도 서버는 뜬다)
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client(api_key=self._api_key or os.getenv("GOOGLE_API_KEY"))
+        return self._client
+
+    async def generate_content(self, model: str, contents: List[Any]) -> "types.GenerateContentResponse":
+        return await self.client.aio.models.generate_content(model=model, contents=contents)
+
+
+class FakeBackend(ModelBackend):
+    # 결정적인 로컬 백엔드. 같은 seed면 같은 순서의 호출에 같은 지연/오류가 나오고,
+    # 이미지는 입력 내용 해시로 정해지는 합성 PNG다. 응답 타입은 실제 SDK 타입과 같다.
+    name = "fake"
+
+    def __init__(
+        self,
+        seed: int = FAKE_SEED,
+        latency_ms: float = FAKE_LATENCY_MS,
+        latency_sigma: float = FAKE_LATENCY_SIGMA,
+        error_rate: float = FAKE_ERROR_RATE,
+        error_codes: Tuple[int, ...] = FAKE_ERROR_CODES,
+        image_size: int = FAKE_IMAGE_SIZE,
+        images_per_response: int = FAKE_IMAGES_PER_RESPONSE,
+    ):
+        self._rng = random.Random(seed)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_codes = error_codes or (503,)
+        self.image_size = image_size
+        self.images_per_response = max(1, images_per_response)
+        self.calls = 0
+        self.errors = 0
+        self._images: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def sample_latency(self) -> float:
+        # 초 단위
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000.0
+
+    async def generate_content(self, model: str, contents: List[Any]) -> "types.GenerateContentResponse":
+        self.calls += 1
+        # 지연/오류는 호출 순서대로 미리 뽑아 둔다 (동시 호출이 섞여도 시퀀스가 같다)
+        latency = self.sample_latency()
+        fail = self._rng.random() < self.error_rate
+        error_code = self._rng.choice(self.error_codes)
+        await asyncio.sleep(latency)
+
+        if fail:
+            self.errors += 1
+            message = {"error": {"code": error_code, "message": "Synthetic error from fake backend", "status": "FAKE"}}
+            if error_code >= 500:
+                raise errors.ServerError(error_code, message)
+            raise errors.ClientError(error_code, message)
+
+        digest = _contents_digest(model, contents)
+        parts = [types.Part(text=f"Synthetic response {digest[:12]} from fake backend for {model}.")]
+        if "image" in model:
+            for i in range(self.images_per_response):
+                data = await self._image(int(digest[:8], 16) + i)
+                parts.append(types.Part(inline_data=types.Blob(mime_type="image/png", data=data)))
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=parts),
+                    finish_reason=types.FinishReason.STOP,
+                )
+            ]
+        )
+
+    async def _image(self, key: int) -> bytes:
+        variant = key % FAKE_IMAGE_VARIANTS
+        data = self._images.get(variant)
+        if data is None:
+            data = await asyncio.to_thread(_render_image, variant, self.image_size)
+            self._images[variant] = data
+        return data
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+def create_backend(name: str = MODEL_BACKEND) -> ModelBackend:
+    if name == "fake":
+        log.info("Using fake model backend (no network calls)")
+        return FakeBackend()
+    if name != "gemini":
+        raise ValueError(f"Unknown MODEL_BACKEND: {name}")
+    return GeminiBackend()
+
+
+def _contents_digest(model: str, contents: List[Any]) -> str:
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for item in contents:
+        if isinstance(item, str):
+            digest.update(item.encode("utf-8"))
+        elif isinstance(item, types.Part):
+            if item.text:
+                digest.update(item.text.encode("utf-8"))
+            if item.inline_data is not None and item.inline_data.data:
+                digest.update(item.inline_data.data)
+    return digest.hexdigest()
+
+
+def _render_image(variant: int, size: int) -> bytes:
+    # 단색 + 노이즈: 실제 생성 이미지처럼 압축이 잘 안 되는 크기를 흉내 낸다
+    from PIL import Image
+
+    rng = random.Random(variant)
+    color = tuple(rng.randrange(256) for _ in range(3))
+    noise = Image.frombytes("L", (size, size), rng.randbytes(size * size)).convert("RGB")
+    image = Image.blend(Image.new("RGB", (size, size), color), noise, 0.35)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
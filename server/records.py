@@ -0,0 +1,245 @@
+import hashlib
+import json
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+
+# 프로세스마다 다른 값. 재시작 후 version이 0부터 다시 올라가도 예전 ETag와 겹치지 않게 한다.
+_EPOCH = uuid.uuid4().hex[:8]
+
+# 컬렉션별로 보관할 직렬화 결과 수 (쿼리 조합별)
+RESPONSE_CACHE_SIZE = 32
+
+
+class RecordCollection:
+    # 메모리 상의 레코드 목록 + 변경 버전 + id 인덱스.
+    # 레코드가 바뀌면 touch()로 버전을 올리고, 직렬화 캐시는 그때 비운다.
+    # references가 주어지면 "레코드가 참조하는 키(예: 캐릭터 id) → 레코드 id" 보조 인덱스도 유지한다.
+    # assets + registry가 주어지면 레코드가 참조하는 이미지 URL을 asset registry에 등록한다 (refcount).
+    # search + search_index가 주어지면 레코드의 (텍스트, 캐릭터 id)를 검색 색인에 넣는다 (색인이 켜져 있을 때).
+    # items 대신 loader를 주면 처음 접근할 때 읽는다 (지연 시작).
+    def __init__(
+        self,
+        name: str,
+        items: Iterable[BaseModel] = (),
+        references: Optional[Callable[[BaseModel], Iterable[Any]]] = None,
+        decorate: Optional[Callable[[BaseModel], dict]] = None,
+        assets: Optional[Callable[[BaseModel], Iterable[str]]] = None,
+        registry: Optional[Any] = None,
+        search: Optional[Callable[[BaseModel], Tuple[str, Iterable[Any]]]] = None,
+        search_index: Optional[Any] = None,
+        loader: Optional[Callable[[], Iterable[BaseModel]]] = None,
+    ):
+        self.name = name
+        self._items: List[BaseModel] = []
+        self.version = 0
+        self._responses: "OrderedDict[tuple, Tuple[bytes, Optional[Any]]]" = OrderedDict()
+        self._by_id: Dict[Any, BaseModel] = {}
+        self._positions: Dict[Any, int] = {}
+        self._references = references
+        self._decorate = decorate
+        self._by_reference: Dict[Any, Set[Any]] = {}
+        self._reference_keys: Dict[Any, Set[Any]] = {}
+        self._assets = assets if registry is not None else None
+        self._registry = registry
+        self._search = search if search_index is not None else None
+        self._search_index = search_index
+        self._loader = loader
+        self.extend(items)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def load(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            self.extend(loader())
+
+    @property
+    def items(self) -> List[BaseModel]:
+        self.load()
+        return self._items
+
+    def __iter__(self) -> Iterator[BaseModel]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index: int) -> BaseModel:
+        return self.items[index]
+
+    def __setitem__(self, index: int, item: BaseModel):
+        self._unindex(self.items[index])
+        self.items[index] = item
+        self._index(item, index)
+
+    def append(self, item: BaseModel):
+        # 같은 id가 이미 있으면 그 자리를 교체한다 (id는 유일)
+        self.load()
+        position = self._positions.get(item.id)
+        if position is not None:
+            self[position] = item
+            return
+        self._items.append(item)
+        self._index(item, len(self._items) - 1)
+
+    def extend(self, items: Iterable[BaseModel]):
+        for item in items:
+            self.append(item)
+
+    def get(self, record_id: Any) -> Optional[BaseModel]:
+        self.load()
+        return self._by_id.get(record_id)
+
+    def remove(self, record_id: Any) -> Optional[BaseModel]:
+        self.load()
+        position = self._positions.get(record_id)
+        if position is None:
+            return None
+        item = self.items.pop(position)
+        self._unindex(item)
+        # 뒤쪽 레코드의 위치를 당긴다
+        for i in range(position, len(self.items)):
+            self._positions[self.items[i].id] = i
+        return item
+
+    def reindex(self, item: BaseModel):
+        # 레코드를 제자리에서 수정한 뒤(예: char.characterSheets = ...) 보조 인덱스를 갱신
+        self.load()
+        position = self._positions.get(item.id)
+        if position is not None:
+            self[position] = item
+
+    def referencing(self, key: Any) -> List[BaseModel]:
+        self.load()
+        ids = self._by_reference.get(key, ())
+        return sorted((self._by_id[record_id] for record_id in ids), key=lambda item: self._positions[item.id])
+
+    def _index(self, item: BaseModel, position: int):
+        self._by_id[item.id] = item
+        self._positions[item.id] = position
+        if self._references is not None:
+            keys = set(self._references(item))
+            self._reference_keys[item.id] = keys
+            for key in keys:
+                self._by_reference.setdefault(key, set()).add(item.id)
+        if self._assets is not None:
+            self._registry.retain(f"{self.name}:{item.id}", self._assets(item))
+        if self._search is not None and self._search_index.active:
+            text, character_ids = self._search(item)
+            self._search_index.add(self.name, item.id, text, character_ids)
+
+    def _unindex(self, item: BaseModel):
+        self._by_id.pop(item.id, None)
+        self._positions.pop(item.id, None)
+        # 제자리 수정된 레코드도 예전 키로 지울 수 있게 인덱싱 당시의 키를 쓴다
+        for key in self._reference_keys.pop(item.id, ()):
+            ids = self._by_reference.get(key)
+            if ids is not None:
+                ids.discard(item.id)
+                if not ids:
+                    del self._by_reference[key]
+        if self._registry is not None:
+            self._registry.release(f"{self.name}:{item.id}")
+        if self._search_index is not None and self._search_index.active:
+            self._search_index.remove(self.name, item.id)
+
+    def index_search(self):
+        # 검색 색인을 나중에 켠 경우 이미 읽은 레코드를 한꺼번에 넣는다 (안 읽었으면 읽으면서 들어간다)
+        if not self.loaded:
+            self.load()
+            return
+        for item in self._items:
+            text, character_ids = self._search(item)
+            self._search_index.add(self.name, item.id, text, character_ids)
+
+    def serialize(self, item: BaseModel, include: Optional[Set[str]] = None) -> dict:
+        # decorate가 주는 파생 필드(예: 썸네일 URL)도 함께 붙인다
+        record = item.dict(include=include)
+        if self._decorate is not None:
+            extra = self._decorate(item)
+            record.update(extra if include is None else {k: v for k, v in extra.items() if k in include})
+        return record
+
+    def reset(self, items: Iterable[BaseModel]):
+        # 저장소에서 다시 읽은 목록으로 통째로 바꾼다 (다른 워커가 바꾼 경우)
+        self._loader = None
+        for item in self._items:
+            self._unindex(item)
+        self._items = []
+        self.extend(items)
+        self.touch()
+
+    def touch(self):
+        self.version += 1
+        self._responses.clear()
+
+    def position(self, record_id: Any) -> Optional[int]:
+        self.load()
+        return self._positions.get(record_id)
+
+    def page(self, limit: Optional[int] = None, after: Optional[Any] = None) -> Tuple[List[BaseModel], Optional[Any]]:
+        # cursor는 마지막으로 받은 레코드의 id. 모르는 id면 빈 페이지.
+        start = 0
+        if after is not None:
+            position = self.position(after)
+            if position is None:
+                return [], None
+            start = position + 1
+        if limit is None:
+            return self.items[start:], None
+        items = self.items[start:start + limit]
+        next_cursor = items[-1].id if items and start + limit < len(self.items) else None
+        return items, next_cursor
+
+    def etag(self, *query: Any) -> str:
+        query_hash = hashlib.sha1(repr(query).encode("utf-8")).hexdigest()[:10]
+        return f'W/"{_EPOCH}-{self.name}-{self.version}-{query_hash}"'
+
+    def render(
+        self,
+        wrap: Optional[str],
+        limit: Optional[int] = None,
+        after: Optional[Any] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[bytes, Optional[Any]]:
+        # 같은 버전/쿼리면 직렬화한 바이트를 그대로 재사용한다
+        key = (wrap, limit, after, tuple(fields) if fields else None)
+        cached = self._responses.get(key)
+        if cached is not None:
+            self._responses.move_to_end(key)
+            return cached
+
+        items, next_cursor = self.page(limit, after)
+        include = set(fields) | {"id"} if fields else None
+        records = [self.serialize(item, include) for item in items]
+        if wrap is None:
+            payload: Any = records
+        else:
+            payload = {wrap: records}
+            if limit is not None:
+                payload["nextCursor"] = next_cursor
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+        self._responses[key] = (body, next_cursor)
+        while len(self._responses) > RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
+        return body, next_cursor
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return sorted({field.strip() for field in fields.split(",") if field.strip()})
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,112 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from image_preprocess import sniff_mime_type
+
+
+# --- 참조 이미지 캐시 설정 ---
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+
+class ReferenceImage(NamedTuple):
+    data: bytes
+    mime_type: str
+
+
+class ReferenceByteCache:
+    # 캐릭터 시트/시작 프레임 같은 참조 이미지 바이트의 LRU 캐시.
+    # 키는 (경로, mtime, 크기)라서 파일이 바뀌면 자연히 새로 읽는다.
+    # stat과 실제 파일 읽기(+ prepare 변환)는 한 번의 스레드 호출에서 하고(적중이면 읽지 않음),
+    # 같은 파일을 동시에 요청하면 한 번만 확인/읽는다.
+    def __init__(
+        self,
+        max_bytes: int = REFERENCE_CACHE_MAX_BYTES,
+        prepare: Optional[Callable[[bytes], Tuple[bytes, str]]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self._prepare = prepare
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int, int], ReferenceImage]" = OrderedDict()
+        self._total_bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    async def read(self, path: str) -> ReferenceImage:
+        path = os.path.abspath(path)
+        pending = self._loading.get(path)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[path] = future
+        try:
+            key, image, cached = await asyncio.to_thread(self._lookup, path)
+            if cached:
+                self.hits += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+                self._insert(key, image)
+            future.set_result(image)
+            return image
+        except BaseException as e:
+            future.set_exception(e)
+            # 기다리는 쪽이 없으면 "exception was never retrieved" 경고가 나므로 소비해 둔다
+            future.exception()
+            raise
+        finally:
+            del self._loading[path]
+
+    async def read_many(self, paths: List[str]) -> List[Union[ReferenceImage, BaseException]]:
+        # 순서를 유지한다. 실패한 항목은 예외 객체로 돌려준다.
+        return await asyncio.gather(*(self.read(path) for path in paths), return_exceptions=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _lookup(self, path: str) -> Tuple[Tuple[str, int, int], ReferenceImage, bool]:
+        # 스레드에서: (키, 이미지, 캐시 적중 여부). 키는 (경로, mtime, 크기)
+        st = os.stat(path)
+        key = (path, st.st_mtime_ns, st.st_size)
+        image = self._entries.get(key)
+        if image is not None:
+            return key, image, True
+        return key, self._load(path), False
+
+    def _load(self, path: str) -> ReferenceImage:
+        with open(path, "rb") as f:
+            data = f.read()
+        if self._prepare is not None:
+            return ReferenceImage(*self._prepare(data))
+        return ReferenceImage(data, sniff_mime_type(data) or "image/png")
+
+    def _insert(self, key: Tuple[str, int, int], image: ReferenceImage):
+        if len(image.data) > self.max_bytes:
+            return
+        # 같은 경로의 예전 버전은 버린다
+        for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+            self._total_bytes -= len(self._entries.pop(old_key).data)
+        self._entries[key] = image
+        self._total_bytes += len(image.data)
+        while self._total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= len(evicted.data)
+
+
+def local_path_from_url(url: str, base_url: str = "http://localhost:8000/") -> Optional[str]:
+    # 이 서버가 서빙하는 URL만 로컬 파일 경로로 바꾼다
+    if not url.startswith(base_url):
+        return None
+    return os.path.join(".", url[len(base_url):])
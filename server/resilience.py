@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+from telemetry import get_logger
+
+
+# --- 재시도/레이트 리밋/서킷 브레이커 설정 ---
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))   # 초
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20.0"))
+# 쿼터에 맞춘 클라이언트 측 호출 속도 (분당 요청 수, 0이면 제한 없음)와 한 번에 몰아 쓸 수 있는 양
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# 일시적인 오류로 보고 재시도하는 HTTP 상태 코드
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+log = get_logger("resilience")
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit queue is full; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    # SDK 오류(google.genai.errors.APIError)는 .code, 그 밖의 HTTP 오류는 .status_code로 판단한다
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    # httpx는 SDK가 쓸 때만 import 되어 있다 (시작 시 import 하지 않는다)
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code in RETRYABLE_STATUS_CODES
+
+
+class RetryPolicy:
+    # 지수 백오프 + full jitter: 0 ~ min(max_delay, base * 2^attempt) 사이에서 무작위
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class TokenBucket:
+    # rate_per_minute 속도로 토큰이 차고, 최대 capacity개까지 모인다.
+    # 토큰이 없으면 차례대로 기다리고, 기다릴 시간이 max_wait를 넘으면 바로 거절한다.
+    def __init__(self, rate_per_minute: float = RATE_LIMIT_PER_MINUTE, capacity: int = RATE_LIMIT_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self.waited = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, max_wait: Optional[float] = None) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # 토큰을 먼저 예약한다 (음수면 앞선 대기자 뒤에 줄을 선 것)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        if max_wait is not None and wait > max_wait:
+            self.tokens += 1
+            self.rejected += 1
+            raise RateLimitExceeded(wait)
+        self.waited += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.tokens += 1
+            raise
+        return wait
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "ratePerMinute": self.rate * 60,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+            "waited": self.waited,
+            "rejected": self.rejected,
+        }
+
+
+class CircuitBreaker:
+    # closed: 정상. 연속 실패가 failure_threshold에 닿으면 open.
+    # open: reset_timeout 동안 호출하지 않고 바로 실패시킨다.
+    # half_open: 시험 호출 하나만 보내서 성공하면 closed, 실패하면 다시 open.
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> bool:
+        # half_open의 시험 호출이면 True
+        if self.state == "open":
+            remaining = self.retry_after()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            if self._probing:
+                raise CircuitOpenError(self.reset_timeout)
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        # 시험 호출이 성공/실패 기록 없이 끝났을 때(취소 등): 다음 호출이 다시 시험할 수 있게 한다
+        self._probing = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                log.warning("Circuit opened", consecutive_failures=self.failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.failures,
+            "opened": self.opened,
+            "retryAfter": round(self.retry_after(), 1),
+        }
@@ -0,0 +1,166 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from telemetry import get_logger
+
+
+# --- 생성 결과 캐시 설정 ---
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# put()이 몰려와도 인덱스 파일은 이 간격(초)으로 한 번만, 스레드에서 다시 쓴다
+GENERATION_CACHE_FLUSH_DELAY = float(os.getenv("GENERATION_CACHE_FLUSH_DELAY", "1.0"))
+
+log = get_logger("cache")
+
+
+def generation_key(model: str, contents: List[Any], aspect_ratio: Optional[str] = None) -> str:
+    # (모델명, 최종 프롬프트, 모든 inline Blob 바이트, 비율)을 순서대로 해싱한다
+    h = hashlib.sha256()
+
+    def feed(tag: bytes, data: bytes):
+        h.update(tag)
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+
+    feed(b"model", model.encode("utf-8"))
+    for item in contents:
+        if isinstance(item, str):
+            feed(b"text", item.encode("utf-8"))
+            continue
+        text = getattr(item, "text", None)
+        if text:
+            feed(b"text", text.encode("utf-8"))
+        blob = getattr(item, "inline_data", None)
+        if blob is not None:
+            feed(b"mime", (blob.mime_type or "").encode("utf-8"))
+            feed(b"blob", blob.data or b"")
+    feed(b"ratio", (aspect_ratio or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+class GenerationCache:
+    # 키 -> 핸들러 결과(dict)와 결과 이미지 파일 목록.
+    # 인덱스는 JSON 파일에 보관하고, 항목 수/결과 파일 총 용량 기준으로 LRU 제거한다.
+    # 제거 시 이미지 파일은 지우지 않는다 (레코드가 참조하고 있을 수 있음).
+    # 인덱스 파일 쓰기는 모아서 이벤트 루프 밖에서 한다 (종료 시 남은 변경은 flush()).
+    def __init__(
+        self,
+        index_path: str,
+        max_entries: int = GENERATION_CACHE_MAX_ENTRIES,
+        max_bytes: int = GENERATION_CACHE_MAX_BYTES,
+    ):
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._total_bytes = 0
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._load()
+        atexit.register(self.flush)
+
+    def files(self) -> List[str]:
+        # 캐시가 붙잡고 있는 결과 파일 (asset GC의 루트)
+        return [path for entry in self._entries.values() for path in entry["files"]]
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None and not all(os.path.exists(path) for path in entry["files"]):
+            # 결과 파일이 사라졌으면 무효
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, key: str, result: dict, files: List[str]):
+        size = 0
+        for path in files:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = {"result": result, "files": files, "size": size, "createdAt": time.time()}
+        self._total_bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+        self._schedule_save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["size"]
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.error("Error loading generation cache index", path=self.index_path, error=e)
+            return
+        # 파일에는 오래된 것부터 저장되어 있다
+        for key, entry in data.get("entries", []):
+            self._entries[key] = entry
+            self._total_bytes += entry.get("size", 0)
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 이벤트 루프 밖(스크립트 등)에서는 바로 쓴다
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(GENERATION_CACHE_FLUSH_DELAY)
+        while self._dirty:
+            self._dirty = False
+            # 목록 복사는 루프에서, 직렬화/쓰기는 스레드에서
+            await asyncio.to_thread(self._save, list(self._entries.items()))
+
+    def flush(self):
+        if self._dirty:
+            self._dirty = False
+            self._save(list(self._entries.items()))
+
+    def _save(self, entries: list):
+        try:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            log.error("Error saving generation cache index", path=self.index_path, error=e)
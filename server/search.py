@@ -0,0 +1,223 @@
+import bisect
+import heapq
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# --- 검색 설정 ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 교집합이 이보다 작으면 전부 점수를 매기고, 크면 임팩트 순 목록으로 상위만 찾는다
+EXHAUSTIVE_SCORING_LIMIT = 1000
+# 평균 문서 길이가 이 비율 이상 바뀌면 임팩트 목록을 다시 만든다
+RANKED_LENGTH_DRIFT = 0.1
+
+# 한글 음절 덩어리 / 그 밖의 글자·숫자 덩어리 (영어 단어 등)
+_TOKEN = re.compile(r"[가-힣]+|[^\W_가-힣]+")
+_HANGUL = re.compile(r"[가-힣]")
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    # 영어 등: 소문자 단어 하나가 토큰
+    # 한글: 조사/어미가 붙어도 찾을 수 있게 음절 bigram ("숲속으로" → 숲속, 속으, 으로).
+    #       한 음절 검색어("숲")도 찾도록 색인할 때는 음절 unigram도 넣는다.
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        word = match.group()
+        if not _HANGUL.match(word):
+            tokens.append(word)
+            continue
+        if len(word) == 1:
+            tokens.append(word)
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        if not for_query:
+            tokens.extend(word)
+    return tokens
+
+
+class SearchIndex:
+    # 여러 컬렉션의 텍스트를 담는 역색인. 문서 키 = (컬렉션 이름, 레코드 id).
+    # add()는 같은 문서를 다시 넣으면 예전 색인을 지우고 바꾼다 (저장/수정마다 증분 갱신).
+    #
+    # 검색:
+    # 1. 모든 검색어 posting(+ 캐릭터/컬렉션 필터)의 교집합(AND)을 집합 연산으로 구해 전체 개수를 센다.
+    # 2. 결과가 적으면 전부 BM25로 점수를 매긴다.
+    # 3. 많으면 term별 "임팩트 순" 목록을 앞에서부터 같이 읽다가, 아직 못 본 문서가 받을 수 있는
+    #    최대 점수가 현재 상위 k번째보다 낮아지면 멈춘다 (threshold algorithm).
+    #    임팩트 목록은 처음 검색될 때 만들고, 이후 add/remove에서 제자리 삽입/삭제로 유지한다.
+    #
+    # active=False로 만들면 컬렉션이 색인을 건너뛰고, 첫 검색 때 한꺼번에 채운다 (지연 시작).
+    def __init__(self, active: bool = True):
+        self.active = active
+        self._postings: Dict[str, Dict[int, int]] = {}       # term → {문서 번호: tf}
+        self._by_character: Dict[Any, Set[int]] = {}          # 캐릭터 id → 문서 번호
+        self._by_kind: Dict[str, Set[int]] = {}               # 컬렉션 이름 → 문서 번호
+        self._doc_numbers: Dict[Tuple[str, Any], int] = {}
+        self._docs: Dict[int, Tuple[str, Any, int, Tuple[Any, ...], Tuple[str, ...]]] = {}  # (컬렉션, id, 길이, 캐릭터, term)
+        self._next_number = 0
+        self._total_length = 0
+        # term → [(-임팩트, 문서 번호)] 오름차순 = 임팩트 내림차순
+        self._ranked: Dict[str, List[Tuple[float, int]]] = {}
+        self._ranked_length: Optional[float] = None  # 임팩트 계산에 쓴 평균 문서 길이
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, kind: str, record_id: Any, text: str, character_ids: Iterable[Any] = ()):
+        self.remove(kind, record_id)
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        number = self._next_number
+        self._next_number += 1
+        length = len(tokens)
+        characters = tuple(dict.fromkeys(character_ids))
+        self._doc_numbers[(kind, record_id)] = number
+        self._docs[number] = (kind, record_id, length, characters, tuple(counts))
+        self._total_length += length
+        self._by_kind.setdefault(kind, set()).add(number)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[number] = tf
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                bisect.insort(ranked, (-self._impact(tf, length), number))
+        for character_id in characters:
+            self._by_character.setdefault(character_id, set()).add(number)
+
+    def remove(self, kind: str, record_id: Any):
+        number = self._doc_numbers.pop((kind, record_id), None)
+        if number is None:
+            return
+        _, _, length, characters, terms = self._docs.pop(number)
+        self._total_length -= length
+        self._by_kind[kind].discard(number)
+        for term in terms:
+            posting = self._postings[term]
+            tf = posting.pop(number)
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                entry = (-self._impact(tf, length), number)
+                index = bisect.bisect_left(ranked, entry)
+                if index < len(ranked) and ranked[index] == entry:
+                    del ranked[index]
+            if not posting:
+                del self._postings[term]
+                self._ranked.pop(term, None)
+        for character_id in characters:
+            numbers = self._by_character[character_id]
+            numbers.discard(number)
+            if not numbers:
+                del self._by_character[character_id]
+
+    def search(
+        self,
+        query: str,
+        kinds: Optional[Set[str]] = None,
+        character_id: Optional[Any] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[Tuple[float, str, Any]], int]:
+        # ([(점수, 컬렉션, id)], 조건에 맞는 전체 개수)
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not terms:
+            return [], 0
+        postings = []
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                return [], 0
+            postings.append(posting)
+
+        filters: List[Any] = [posting.keys() for posting in postings]
+        if character_id is not None:
+            filters.append(self._by_character.get(character_id, set()))
+        filters.sort(key=len)
+        matching = set(filters[0])
+        for other in filters[1:]:
+            matching.intersection_update(other)
+        if kinds is not None:
+            if len(kinds) == 1:
+                matching.intersection_update(self._by_kind.get(next(iter(kinds)), set()))
+            else:
+                for kind, numbers in self._by_kind.items():
+                    if kind not in kinds:
+                        matching.difference_update(numbers)
+        if not matching:
+            return [], 0
+
+        self._check_ranked_length()
+        doc_count = len(self._docs)
+        idfs = [math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5)) for posting in postings]
+        docs = self._docs
+
+        def score(number: int) -> float:
+            length = docs[number][2]
+            return sum(idf * self._impact(posting[number], length) for idf, posting in zip(idfs, postings))
+
+        wanted = offset + limit
+        if len(matching) <= EXHAUSTIVE_SCORING_LIMIT:
+            top = heapq.nlargest(wanted, ((score(number), number) for number in matching))
+        else:
+            top = self._top_by_threshold(terms, idfs, matching, score, wanted)
+
+        results = []
+        for value, number in top[offset:]:
+            kind, record_id = docs[number][:2]
+            results.append((value, kind, record_id))
+        return results, len(matching)
+
+    def _top_by_threshold(self, terms: List[str], idfs: List[float], matching: Set[int], score, wanted: int) -> List[Tuple[float, int]]:
+        lists = [self._ranked_list(term) for term in terms]
+        heap: List[Tuple[float, int]] = []
+        seen: Set[int] = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            exhausted = True
+            for idf, ranked in zip(idfs, lists):
+                if depth >= len(ranked):
+                    continue
+                exhausted = False
+                negative_impact, number = ranked[depth]
+                threshold -= idf * negative_impact
+                if number in seen or number not in matching:
+                    continue
+                seen.add(number)
+                item = (score(number), number)
+                if len(heap) < wanted:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+            # 같은 점수인 못 본 문서가 (점수, 번호) 순으로 앞설 수 있으므로 최솟값이 threshold보다 커야 멈춘다
+            # (전수 점수와 같은 순서여야 offset 페이지끼리 겹치거나 빠지지 않는다)
+            if exhausted or (len(heap) >= wanted and heap[0][0] > threshold):
+                break
+            depth += 1
+        return sorted(heap, reverse=True)
+
+    def _impact(self, tf: int, length: int) -> float:
+        # BM25에서 idf를 뺀 부분. 평균 길이는 임팩트 목록을 만들 때의 값으로 고정한다.
+        average = self._ranked_length or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+        return tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _check_ranked_length(self):
+        # 평균 문서 길이가 RANKED_LENGTH_DRIFT 이상 달라졌으면 임팩트를 다시 계산한다
+        average = self._total_length / len(self._docs) if self._docs else 1.0
+        if self._ranked_length is None or abs(average - self._ranked_length) > self._ranked_length * RANKED_LENGTH_DRIFT:
+            self._ranked_length = max(average, 1.0)
+            self._ranked.clear()
+
+    def _ranked_list(self, term: str) -> List[Tuple[float, int]]:
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            docs = self._docs
+            ranked = sorted((-self._impact(tf, docs[number][2]), number) for number, tf in self._postings[term].items())
+            self._ranked[term] = ranked
+        return ranked
+
+    def stats(self) -> dict:
+        return {"active": self.active, "documents": len(self._docs), "terms": len(self._postings), "rankedTerms": len(self._ranked)}
@@ -0,0 +1,495 @@
+import atexit
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from telemetry import REGISTRY, get_logger
+
+
+# --- 저장 엔진 설정 ---
+# 변경 사항은 append-only 로그에 쓰고, fsync는 STORAGE_FSYNC_INTERVAL 간격으로 모아서 한다.
+# 로그가 STORAGE_COMPACT_THRESHOLD 줄을 넘으면 백그라운드에서 스냅샷으로 합친다.
+STORAGE_FSYNC_INTERVAL = float(os.getenv("STORAGE_FSYNC_INTERVAL", "0.05"))
+STORAGE_COMPACT_THRESHOLD = int(os.getenv("STORAGE_COMPACT_THRESHOLD", "500"))
+
+# journal(기본): 프로세스 하나가 JSON 스냅샷 + 로그를 소유한다.
+# sqlite: 여러 워커/호스트가 하나의 SQLite 파일을 공유한다 (uvicorn --workers N).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "journal").lower()
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", os.path.join("data", "studio.db"))
+# WAL은 같은 호스트의 프로세스끼리만 안전하다 (공유 메모리 사용).
+# 여러 호스트가 네트워크 볼륨을 공유하면 DELETE(롤백 저널)로 바꾼다.
+STORAGE_SQLITE_JOURNAL_MODE = os.getenv("STORAGE_SQLITE_JOURNAL_MODE", "WAL").upper()
+STORAGE_SQLITE_BUSY_TIMEOUT = float(os.getenv("STORAGE_SQLITE_BUSY_TIMEOUT", "5"))
+
+log = get_logger("storage")
+
+STORAGE_WRITE_SECONDS = REGISTRY.histogram("storage_write_duration_seconds", "Time to append a batch of changes to a collection log", ("collection",))
+STORAGE_WRITE_BYTES = REGISTRY.counter("storage_write_bytes_total", "Bytes appended to collection logs", ("collection",))
+
+
+class ConflictError(Exception):
+    # 낙관적 동시성: 읽은 뒤에 다른 요청/워커가 레코드를 바꿨다
+    def __init__(self, record_id: Any, expected: int, current: int):
+        super().__init__(f"Record {record_id} was modified concurrently (expected revision {expected}, current {current})")
+        self.record_id = record_id
+        self.expected = expected
+        self.current = current
+
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = 2):
+    # temp 파일에 쓰고 fsync 후 rename → 중간에 죽어도 기존 파일은 온전하다
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _apply(records: Dict[Any, dict], meta: Dict[str, Any], entry: dict):
+    op = entry.get("op")
+    if op == "put":
+        record = entry["record"]
+        records[record["id"]] = record
+    elif op == "delete":
+        records.pop(entry["id"], None)
+    elif op == "meta":
+        meta[entry["key"]] = entry["value"]
+
+
+def _replay_log(path: str, records: Dict[Any, dict], meta: Dict[str, Any]) -> int:
+    # 마지막 줄이 쓰다 만 상태면(크래시) 거기서 멈추고 잘라낸다
+    applied = 0
+    good_offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            _apply(records, meta, entry)
+            applied += 1
+            good_offset += len(line)
+    if good_offset < os.path.getsize(path):
+        log.warning("Truncating torn log tail", path=path, offset=good_offset)
+        with open(path, 'r+b') as f:
+            f.truncate(good_offset)
+    return applied
+
+
+def _read_snapshot(snapshot_path: str, collection_key: str) -> Tuple[Dict[Any, dict], Dict[str, Any]]:
+    records: Dict[Any, dict] = {}
+    meta: Dict[str, Any] = {}
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for record in data.get(collection_key, []):
+            records[record["id"]] = record
+        meta = {key: value for key, value in data.items() if key != collection_key}
+    except FileNotFoundError:
+        pass
+    return records, meta
+
+
+class JournaledStore:
+    # 스냅샷 파일 형식은 기존 JSON 파일과 같다: {"<collection>": [...], ...meta}
+    # 로그: <snapshot>.log (활성), <snapshot>.log.<n> (컴팩션 대기 중인 봉인된 로그)
+    def __init__(self, snapshot_path: str, collection_key: str):
+        self.snapshot_path = snapshot_path
+        self.collection_key = collection_key
+        self.log_path = f"{snapshot_path}.log"
+        self._lock = threading.RLock()
+        self._log = None
+        self._log_entries = 0
+        self._dirty = False
+        self._last_fsync = 0.0
+        self._compacting = False
+        self._sealed_seq = 0
+        # 레코드 리비전은 이 프로세스 안에서만 센다. epoch가 ETag에 들어가므로 재시작 전 값과 섞이지 않는다.
+        self.epoch = uuid.uuid4().hex[:8]
+        self._revisions: Dict[Any, int] = {}
+        self._meta: Dict[str, Any] = {}
+
+    # --- 로드 ---
+    def load(self) -> Tuple[List[dict], Dict[str, Any]]:
+        with self._lock:
+            records, meta = _read_snapshot(self.snapshot_path, self.collection_key)
+
+            for sealed_path in self._sealed_logs():
+                _replay_log(sealed_path, records, meta)
+                self._sealed_seq = max(self._sealed_seq, int(sealed_path.rsplit(".", 1)[1]))
+            if os.path.exists(self.log_path):
+                self._log_entries = _replay_log(self.log_path, records, meta)
+
+            self._open_log()
+            self._revisions = {record_id: 1 for record_id in records}
+            self._meta = dict(meta)
+        if self._log_entries >= STORAGE_COMPACT_THRESHOLD or self._sealed_logs():
+            self._start_compaction()
+        return list(records.values()), meta
+
+    # --- 변경 ---
+    def put_many(self, records: Iterable[dict]):
+        records = list(records)
+        with self._lock:
+            for record in records:
+                self._revisions[record["id"]] = self._revisions.get(record["id"], 0) + 1
+        self._append([{"op": "put", "record": record} for record in records])
+
+    def put(self, record: dict, expected_revision: Optional[int] = None) -> int:
+        with self._lock:
+            current = self._revisions.get(record["id"], 0)
+            if expected_revision is not None and expected_revision != current:
+                raise ConflictError(record["id"], expected_revision, current)
+            self.put_many([record])
+            return current + 1
+
+    def delete(self, record_id: Any):
+        with self._lock:
+            self._revisions.pop(record_id, None)
+        self._append([{"op": "delete", "id": record_id}])
+
+    def set_meta(self, key: str, value: Any):
+        with self._lock:
+            self._meta[key] = value
+        self._append([{"op": "meta", "key": key, "value": value}])
+
+    def revision(self, record_id: Any) -> int:
+        return self._revisions.get(record_id, 0)
+
+    def allocate_id(self, key: str, floor: int = 1, count: int = 1) -> int:
+        # meta[key]에 다음 id를 보관한다. floor는 기존 레코드의 최대 id + 1 (meta가 없던 예전 데이터용).
+        # count개를 한 번에 잡으면 돌려준 id부터 연속 count개가 이 호출의 몫이다.
+        with self._lock:
+            next_id = max(int(self._meta.get(key, floor)), floor)
+            self.set_meta(key, next_id + count)
+            return next_id
+
+    def changed(self) -> bool:
+        # 파일을 쓰는 프로세스는 이 하나뿐이라 바깥에서 바뀔 일이 없다
+        return False
+
+    def flush(self):
+        with self._lock:
+            if self._log is not None and self._dirty:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._dirty = False
+                self._last_fsync = time.monotonic()
+
+    def _append(self, entries: List[dict]):
+        if not entries:
+            return
+        started = time.perf_counter()
+        payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with self._lock:
+            if self._log is None:
+                self._open_log()
+            self._log.write(payload)
+            self._log.flush()
+            self._dirty = True
+            self._log_entries += len(entries)
+            # 직전 fsync 이후 간격이 지났으면 바로, 아니면 플러셔 스레드가 묶어서 처리
+            if time.monotonic() - self._last_fsync >= STORAGE_FSYNC_INTERVAL:
+                self.flush()
+            should_compact = self._log_entries >= STORAGE_COMPACT_THRESHOLD and not self._compacting
+        STORAGE_WRITE_SECONDS.observe(time.perf_counter() - started, collection=self.collection_key)
+        STORAGE_WRITE_BYTES.inc(len(payload.encode("utf-8")), collection=self.collection_key)
+        if should_compact:
+            self._start_compaction()
+
+    # --- 컴팩션 ---
+    def _start_compaction(self):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            # 활성 로그를 봉인하고 새 로그를 연다. 컴팩션은 봉인된 로그만 읽는다.
+            if self._log_entries > 0:
+                self.flush()
+                self._log.close()
+                self._sealed_seq += 1
+                os.replace(self.log_path, f"{self.log_path}.{self._sealed_seq}")
+                self._log_entries = 0
+                self._open_log()
+            sealed = self._sealed_logs()
+        threading.Thread(target=self._compact, args=(sealed,), daemon=True).start()
+
+    def _compact(self, sealed: List[str]):
+        try:
+            records, meta = _read_snapshot(self.snapshot_path, self.collection_key)
+            for path in sealed:
+                _replay_log(path, records, meta)
+
+            write_json_atomic(self.snapshot_path, {self.collection_key: list(records.values()), **meta})
+            # 스냅샷이 반영된 뒤에 로그를 지운다 (중간에 죽어도 재적용은 멱등)
+            for path in sealed:
+                os.remove(path)
+        except Exception as e:
+            log.error("Compaction failed", path=self.snapshot_path, exc_info=True, error=e)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def wait_for_compaction(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while self._compacting and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _sealed_logs(self) -> List[str]:
+        paths = glob.glob(f"{glob.escape(self.log_path)}.*")
+        paths = [path for path in paths if path.rsplit(".", 1)[1].isdigit()]
+        return sorted(paths, key=lambda path: int(path.rsplit(".", 1)[1]))
+
+    def _open_log(self):
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+
+# --- 공유 저장소 (SQLite) ---
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (collection, id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+);
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class SqliteDatabase:
+    # 프로세스당 쓰기 연결 하나와 읽기 연결 하나를 모든 컬렉션이 같이 쓴다.
+    # 쓰기는 BEGIN IMMEDIATE로 워커 간 직렬화되고, 잠겨 있으면 busy timeout만큼 기다린다.
+    # 읽기(load/changed/revision)는 따로 된 연결이라 잠금을 기다리는 쓰기 뒤에 줄 서지 않는다.
+    # 호출하는 쪽(main.py)은 둘 다 스레드에서 부른다.
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._read_lock = threading.RLock()
+        self._conn = self._connect()
+        self._conn.execute(f"PRAGMA journal_mode={STORAGE_SQLITE_JOURNAL_MODE}")
+        self._read_conn = self._connect()
+        with self.transaction() as conn:
+            for statement in _SQLITE_SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            # DB 파일마다 고유한 값. 파일을 새로 만들면 예전 ETag가 맞지 않게 된다.
+            conn.execute("INSERT OR IGNORE INTO meta (collection, key, value) VALUES ('', 'epoch', ?)", (json.dumps(uuid.uuid4().hex[:8]),))
+            self.epoch = json.loads(conn.execute("SELECT value FROM meta WHERE collection = '' AND key = 'epoch'").fetchone()[0])
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=STORAGE_SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        # immediate=False는 읽기 전용 트랜잭션 (읽기 연결)
+        lock, conn = (self._lock, self._conn) if immediate else (self._read_lock, self._read_conn)
+        with lock:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def data_version(self) -> int:
+        # 읽기 연결 밖에서 커밋하면 바뀐다 (다른 워커, 이 프로세스의 쓰기 연결).
+        # 자기 쓰기는 SqliteStore가 본 버전을 따라가므로 다시 읽지 않는다.
+        with self._read_lock:
+            return self._read_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+class SqliteStore:
+    # JournaledStore와 같은 인터페이스. 레코드는 JSON 문자열로, 순서는 rowid(처음 넣은 순서)로 유지한다.
+    # 컬렉션마다 version을 두고 쓸 때마다 올린다. 다른 워커가 올렸으면 changed()가 True → 다시 load.
+    def __init__(self, db: SqliteDatabase, snapshot_path: str, collection_key: str):
+        self.db = db
+        self.snapshot_path = snapshot_path
+        self.collection_key = collection_key
+        self.epoch = db.epoch
+        self._seen_version: Optional[int] = None
+        self._seen_data_version: Optional[int] = None
+        self._import_journal()
+
+    def _import_journal(self):
+        # 처음 열 때 기존 JSON 스냅샷 + 로그를 가져온다 (동시에 뜬 워커 중 하나만)
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM collections WHERE name = ?", (self.collection_key,)).fetchone():
+                return
+            conn.execute("INSERT INTO collections (name, version) VALUES (?, 0)", (self.collection_key,))
+            records, meta = read_journal(self.snapshot_path, self.collection_key)
+            self._upsert(conn, records.values())
+            for key, value in meta.items():
+                self._write_meta(conn, key, value)
+        if records:
+            log.info("Imported journal into SQLite", collection=self.collection_key, records=len(records))
+
+    # --- 로드 ---
+    def load(self) -> Tuple[List[dict], Dict[str, Any]]:
+        with self.db.transaction(immediate=False) as conn:
+            self._seen_version = self._version(conn)
+            rows = conn.execute("SELECT data FROM records WHERE collection = ? ORDER BY rowid", (self.collection_key,)).fetchall()
+            meta_rows = conn.execute("SELECT key, value FROM meta WHERE collection = ?", (self.collection_key,)).fetchall()
+        self._seen_data_version = self.db.data_version()
+        return [json.loads(data) for data, in rows], {key: json.loads(value) for key, value in meta_rows}
+
+    def changed(self) -> bool:
+        data_version = self.db.data_version()
+        if data_version == self._seen_data_version:
+            return False
+        self._seen_data_version = data_version
+        with self.db.transaction(immediate=False) as conn:
+            return self._version(conn) != self._seen_version
+
+    # --- 변경 ---
+    def put_many(self, records: Iterable[dict]):
+        records = list(records)
+        if not records:
+            return
+        self._write(lambda conn: self._upsert(conn, records))
+
+    def put(self, record: dict, expected_revision: Optional[int] = None) -> int:
+        def write(conn: sqlite3.Connection) -> int:
+            current = self._revision(conn, record["id"])
+            if expected_revision is not None and expected_revision != current:
+                raise ConflictError(record["id"], expected_revision, current)
+            self._upsert(conn, [record])
+            return current + 1
+        return self._write(write)
+
+    def delete(self, record_id: Any):
+        self._write(lambda conn: conn.execute("DELETE FROM records WHERE collection = ? AND id = ?", (self.collection_key, json.dumps(record_id))))
+
+    def set_meta(self, key: str, value: Any):
+        self._write(lambda conn: self._write_meta(conn, key, value))
+
+    def revision(self, record_id: Any) -> int:
+        with self.db.transaction(immediate=False) as conn:
+            return self._revision(conn, record_id)
+
+    def allocate_id(self, key: str, floor: int = 1, count: int = 1) -> int:
+        # 읽고 올리는 것이 한 트랜잭션이라 워커끼리 같은 id를 받지 않는다
+        def write(conn: sqlite3.Connection) -> int:
+            row = conn.execute("SELECT value FROM meta WHERE collection = ? AND key = ?", (self.collection_key, key)).fetchone()
+            next_id = max(int(json.loads(row[0])) if row else floor, floor)
+            self._write_meta(conn, key, next_id + count)
+            return next_id
+        return self._write(write)
+
+    def flush(self):
+        pass
+
+    def _write(self, apply):
+        started = time.perf_counter()
+        with self.db.transaction() as conn:
+            result = apply(conn)
+            conn.execute("UPDATE collections SET version = version + 1 WHERE name = ?", (self.collection_key,))
+            version = self._version(conn)
+        # 그 사이 다른 워커가 쓰지 않았을 때만 본 버전을 따라간다 (썼으면 다음 changed()에서 다시 읽는다)
+        if self._seen_version is not None and version == self._seen_version + 1:
+            self._seen_version = version
+        STORAGE_WRITE_SECONDS.observe(time.perf_counter() - started, collection=self.collection_key)
+        return result
+
+    def _upsert(self, conn: sqlite3.Connection, records: Iterable[dict]):
+        conn.executemany(
+            "INSERT INTO records (collection, id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data, revision = revision + 1",
+            [(self.collection_key, json.dumps(record["id"]), json.dumps(record, ensure_ascii=False)) for record in records],
+        )
+
+    def _write_meta(self, conn: sqlite3.Connection, key: str, value: Any):
+        conn.execute(
+            "INSERT INTO meta (collection, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, key) DO UPDATE SET value = excluded.value",
+            (self.collection_key, key, json.dumps(value)),
+        )
+
+    def _revision(self, conn: sqlite3.Connection, record_id: Any) -> int:
+        row = conn.execute("SELECT revision FROM records WHERE collection = ? AND id = ?", (self.collection_key, json.dumps(record_id))).fetchone()
+        return row[0] if row else 0
+
+    def _version(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT version FROM collections WHERE name = ?", (self.collection_key,)).fetchone()
+        return row[0] if row else 0
+
+
+def read_journal(snapshot_path: str, collection_key: str) -> Tuple[Dict[Any, dict], Dict[str, Any]]:
+    # 스냅샷 + 봉인된 로그 + 활성 로그를 읽기만 한다 (SQLite로 옮길 때)
+    records, meta = _read_snapshot(snapshot_path, collection_key)
+    log_path = f"{snapshot_path}.log"
+    sealed = glob.glob(f"{glob.escape(log_path)}.*")
+    sealed = sorted((path for path in sealed if path.rsplit(".", 1)[1].isdigit()), key=lambda path: int(path.rsplit(".", 1)[1]))
+    for path in sealed + [log_path]:
+        if os.path.exists(path):
+            _replay_log(path, records, meta)
+    return records, meta
+
+
+# --- 배치 fsync 플러셔 ---
+_stores: List[JournaledStore] = []
+_flusher: Optional[threading.Thread] = None
+
+
+def _flush_loop():
+    while True:
+        time.sleep(STORAGE_FSYNC_INTERVAL)
+        for store in list(_stores):
+            try:
+                store.flush()
+            except Exception as e:
+                log.error("fsync failed", path=store.log_path, error=e)
+
+
+_database: Optional[SqliteDatabase] = None
+
+
+def shared_database() -> SqliteDatabase:
+    # sqlite 모드에서 레코드 컬렉션과 잡 저장소가 같이 쓰는 연결
+    global _database
+    if _database is None:
+        _database = SqliteDatabase()
+    return _database
+
+
+def open_store(snapshot_path: str, collection_key: str, backend: str = STORAGE_BACKEND):
+    global _flusher
+    if backend == "sqlite":
+        return SqliteStore(shared_database(), snapshot_path, collection_key)
+    if backend != "journal":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    store = JournaledStore(snapshot_path, collection_key)
+    _stores.append(store)
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, daemon=True)
+        _flusher.start()
+    return store
+
+
+def flush_all():
+    for store in _stores:
+        store.flush()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+# --- 로깅 설정 ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+# 1이면 프롬프트/모델 응답 같은 큰 본문도 DEBUG 로그로 남긴다 (기본은 포맷 자체를 하지 않음)
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    # logfmt 비슷한 한 줄: 시간 레벨 로거: 메시지 key=value ...
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line = f"{line} {fields}"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+_root = logging.getLogger("studio")
+if not _root.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+    _root.addHandler(_handler)
+    _root.setLevel(LOG_LEVEL)
+    _root.propagate = False
+
+
+class StructuredLogger:
+    # log.info("Saved image", path=path, bytes=len(data))
+    # 레벨이 꺼져 있으면 레코드를 만들지 않고, 필드 값은 출력할 때만 문자열로 바뀐다.
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"studio.{name}")
+
+    def _log(self, level: int, message: str, exc_info: bool, fields: dict):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, message: str, **fields):
+        self._log(logging.DEBUG, message, False, fields)
+
+    def info(self, message: str, **fields):
+        self._log(logging.INFO, message, False, fields)
+
+    def warning(self, message: str, **fields):
+        self._log(logging.WARNING, message, False, fields)
+
+    def error(self, message: str, exc_info: bool = False, **fields):
+        self._log(logging.ERROR, message, exc_info, fields)
+
+    def payload(self, message: str, **fields):
+        # 프롬프트/응답 본문용. LOG_PAYLOADS=1 이고 DEBUG일 때만 남긴다.
+        if LOG_PAYLOADS:
+            self._log(logging.DEBUG, message, False, fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(name)
+
+
+# --- Prometheus 메트릭 ---
+# 외부 의존성 없이 텍스트 노출 형식(0.0.4)만 직접 만든다.
+LabelKey = Tuple[str, ...]
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        escaped = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + escaped + "}"
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{self._format_labels(key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 라벨 조합별 [버킷별 개수..., 합계, 개수]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket{self._format_labels(key, ('le', _number(bound)))} {count}"
+            yield f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {state[-1]}"
+            yield f"{self.name}_sum{self._format_labels(key)} {_number(state[-2])}"
+            yield f"{self.name}_count{self._format_labels(key)} {state[-1]}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_DURATION = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_REQUEST_BYTES = REGISTRY.histogram("http_request_size_bytes", "HTTP request body size", ("route",), BYTES_BUCKETS)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram("http_response_size_bytes", "HTTP response body size", ("route",), BYTES_BUCKETS)
+GENERATION_STAGE_SECONDS = REGISTRY.histogram("generation_stage_duration_seconds", "Time spent in each generation stage", ("endpoint", "stage"))
+GENERATION_SECONDS = REGISTRY.histogram("generation_duration_seconds", "End-to-end generation time", ("endpoint",))
+
+
+# --- 생성 단계별 타이밍 ---
+class StageTimer:
+    # 생성 요청 하나의 단계별 소요 시간을 모은다.
+    #   timer = StageTimer("generate-story-image")
+    #   with timer.stage("model_call"): ...
+    #   timer.finish()  → 히스토그램에 기록 + 요청별 요약 로그 한 줄
+    def __init__(self, endpoint: str, request_started: Optional[float] = None):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # 미들웨어가 요청을 받은 시각부터 핸들러 시작까지 = 본문 수신 + 파싱/검증
+        if request_started is not None:
+            self.record("request_parse", self.started - request_started)
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        GENERATION_STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def finish(self, **fields):
+        total = time.perf_counter() - self.started
+        GENERATION_SECONDS.observe(total, endpoint=self.endpoint)
+        _timing_log.info(
+            "Generation timings",
+            endpoint=self.endpoint,
+            total_ms=round(total * 1000, 1),
+            **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            **fields,
+        )
+
+
+_timing_log = get_logger("timing")
+
+
+# --- HTTP 미들웨어 ---
+class MetricsMiddleware:
+    # 순수 ASGI 미들웨어: 스트리밍 응답도 실제로 보낸 바이트 수를 센다.
+    # route 라벨은 매칭된 경로 템플릿(/api/stories/{story_id})이라 카디널리티가 늘지 않는다.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        scope.setdefault("state", {})["request_started"] = started
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_DURATION.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_REQUEST_BYTES.observe(request_bytes, route=route)
+            HTTP_RESPONSE_BYTES.observe(response_bytes, route=route)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import time
+
+from assets import AssetRegistry
+from result_cache import GenerationCache
+
+BASE_URL = "http://localhost:8000/static/images"
+
+
+def write_asset(root, path, age=3600.0):
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(b"png")
+    mtime = time.time() - age
+    os.utime(full_path, (mtime, mtime))
+
+
+def make_registry(tmp_path, grace_period=60.0):
+    root = str(tmp_path / "images")
+    os.makedirs(root)
+    return root, AssetRegistry(root, BASE_URL, grace_period=grace_period)
+
+
+def test_files_held_by_roots_survive(tmp_path):
+    root, registry = make_registry(tmp_path)
+    for name in ("chain", "job", "cache", "default", "record", "orphan"):
+        write_asset(root, f"ab/{name}_1_abc.png")
+
+    async def chain_urls():
+        await asyncio.sleep(0)
+        return [f"{BASE_URL}/ab/chain_1_abc.png"]
+
+    registry.retain("characters:1", [f"{BASE_URL}/ab/record_1_abc.png"])
+    registry.add_root(chain_urls)
+    registry.add_root(lambda: [f"{BASE_URL}/ab/job_1_abc.png"])
+    # 생성 캐시는 URL 대신 파일 경로를 돌려준다
+    cache = GenerationCache(str(tmp_path / "cache.json"))
+    cache.put("key", {"imageUrl": f"{BASE_URL}/ab/cache_1_abc.png"}, [os.path.join(root, "ab", "cache_1_abc.png")])
+    registry.add_root(cache.files)
+    registry.add_root(lambda: [f"{BASE_URL}/ab/default_1_abc.png"])
+
+    result = asyncio.run(registry.collect())
+    assert result["collected"] == 1
+    assert sorted(os.listdir(os.path.join(root, "ab"))) == [
+        "cache_1_abc.png", "chain_1_abc.png", "default_1_abc.png", "job_1_abc.png", "record_1_abc.png",
+    ]
+
+
+def test_files_inside_grace_period_survive(tmp_path):
+    root, registry = make_registry(tmp_path, grace_period=60.0)
+    write_asset(root, "ab/story_1_new.png", age=10)
+    write_asset(root, "ab/story_1_old.png", age=120)
+
+    result = asyncio.run(registry.collect())
+    assert result["collected"] == 1
+    assert os.listdir(os.path.join(root, "ab")) == ["story_1_new.png"]
+
+
+def test_released_file_is_removed(tmp_path):
+    root, registry = make_registry(tmp_path)
+    write_asset(root, "ab/storyboard_1_abc.png")
+    write_asset(root, "legacy.png")
+    registry.retain("storyboards:7", [f"{BASE_URL}/ab/storyboard_1_abc.png"])
+    assert registry.refcount(f"{BASE_URL}/ab/storyboard_1_abc.png") == 1
+
+    registry.release("storyboards:7")
+    result = asyncio.run(registry.collect())
+    assert result["collected"] == 2
+    assert registry.collected == 2
+    assert not os.path.exists(os.path.join(root, "ab", "storyboard_1_abc.png"))
+    assert not os.path.exists(os.path.join(root, "legacy.png"))
+
+
+def test_dry_run_deletes_nothing(tmp_path):
+    root, registry = make_registry(tmp_path)
+    write_asset(root, "ab/storyboard_1_abc.png")
+
+    result = asyncio.run(registry.collect(dry_run=True))
+    assert result["files"] == ["ab/storyboard_1_abc.png"]
+    assert os.path.exists(os.path.join(root, "ab", "storyboard_1_abc.png"))
+    assert registry.runs == 0
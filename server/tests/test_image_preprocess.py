@@ -0,0 +1,45 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+import image_preprocess
+from image_preprocess import ReferencePreprocessor
+
+
+def png_bytes(color) -> bytes:
+    buffer = io.BytesIO()
+    # max_edge(16)보다 크게 만들어 항상 줄인 변형이 저장되게 한다
+    Image.new("RGB", (64, 64), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def variant_files(cache_dir):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(cache_dir) for name in names)
+
+
+def test_recently_used_variants_are_not_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_preprocess, "REFERENCE_VARIANTS_MIN_AGE", 60)
+    preprocessor = ReferencePreprocessor(str(tmp_path), max_bytes=1, max_edge=16)
+    first, _ = preprocessor.prepare(png_bytes((255, 0, 0)))
+    second, _ = preprocessor.prepare(png_bytes((0, 255, 0)))
+    # 용량을 넘었지만 둘 다 방금 쓰였으므로 남는다
+    assert len(variant_files(tmp_path)) == 2
+    assert preprocessor.evictions == 0
+
+    # 오래된 것만 지운다
+    old = variant_files(tmp_path)[0]
+    os.utime(old, (time.time() - 120, time.time() - 120))
+    preprocessor.prepare(png_bytes((0, 0, 255)))
+    assert old not in variant_files(tmp_path)
+    assert preprocessor.evictions == 1
+
+
+def test_cached_variant_is_reused(tmp_path):
+    preprocessor = ReferencePreprocessor(str(tmp_path), max_edge=16)
+    data = png_bytes((255, 0, 0))
+    encoded, mime = preprocessor.prepare(data)
+    assert mime == "image/webp"
+    assert preprocessor.prepare(data) == (encoded, mime)
+    assert len(variant_files(tmp_path)) == 1
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import jobs
+from jobs import InMemoryJobStore, Job, JobFailed, JobQueue, SqliteJobStore
+from storage import SqliteDatabase
+
+
+class Runner:
+    # gate가 열릴 때까지 잡을 붙잡아 둔다. 실행 순서를 기록한다.
+    def __init__(self):
+        self.order = []
+        self.gate = asyncio.Event()
+
+    async def __call__(self, kind, payload):
+        self.order.append(payload["n"])
+        await self.gate.wait()
+        if kind == "fail":
+            raise ValueError("boom")
+        if kind == "degraded":
+            raise JobFailed("model error", {"imageUrl": "default.svg", "degraded": True})
+        return {"n": payload["n"]}
+
+
+def test_higher_priority_runs_first():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(InMemoryJobStore(), runner, workers=1)
+        # 첫 잡이 워커를 잡고 있는 동안 나머지가 큐에 쌓인다
+        first = await queue.submit("ok", {"n": 0})
+        await asyncio.sleep(0.01)
+        submitted = [await queue.submit("ok", {"n": n}, priority=priority) for n, priority in ((1, 0), (2, 5), (3, 0), (4, 9))]
+        runner.gate.set()
+        for job in [first] + submitted:
+            await queue.wait(job.id, 5)
+        await queue.stop()
+        return runner.order
+
+    assert asyncio.run(scenario()) == [0, 4, 2, 1, 3]
+
+
+def test_status_transitions_and_failures():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(InMemoryJobStore(), runner, workers=3)
+        ok = await queue.submit("ok", {"n": 1})
+        failed = await queue.submit("fail", {"n": 2})
+        degraded = await queue.submit("degraded", {"n": 3})
+        assert ok.status == "queued"
+        await asyncio.sleep(0.01)
+        assert (await queue.get(ok.id)).status == "running"
+        assert (await queue.get(ok.id)).startedAt is not None
+        runner.gate.set()
+        results = [await queue.wait(job.id, 5) for job in (ok, failed, degraded)]
+        await queue.stop()
+        return results
+
+    ok, failed, degraded = asyncio.run(scenario())
+    assert (ok.status, ok.result, ok.error) == ("succeeded", {"n": 1}, None)
+    assert (failed.status, failed.result, failed.error) == ("failed", None, "boom")
+    # 기본 이미지로 대신한 결과는 실패로 기록하되 결과는 남긴다
+    assert (degraded.status, degraded.error) == ("failed", "model error")
+    assert degraded.result["degraded"] is True
+    assert ok.finishedAt >= ok.startedAt
+
+
+def test_wait_returns_unfinished_job_after_timeout():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(InMemoryJobStore(), runner, workers=1)
+        job = await queue.submit("ok", {"n": 1})
+        started = time.monotonic()
+        waited = (await queue.wait(job.id, 0.1)).status
+        elapsed = time.monotonic() - started
+        runner.gate.set()
+        finished = await queue.wait(job.id, 5)
+        missing = await queue.wait("missing", 1)
+        await queue.stop()
+        return waited, elapsed, finished, missing
+
+    waited, elapsed, finished, missing = asyncio.run(scenario())
+    assert waited == "running"
+    assert 0.1 <= elapsed < 1
+    assert finished.status == "succeeded"
+    assert missing is None
+
+
+def test_events_stream_each_status_once():
+    async def scenario():
+        runner = Runner()
+        queue = JobQueue(InMemoryJobStore(), runner, workers=1)
+        job = await queue.submit("ok", {"n": 1})
+        asyncio.get_running_loop().call_later(0.2, runner.gate.set)
+        events = [event async for event in queue.events(job.id, heartbeat=0.05)]
+        await queue.stop()
+        return events
+
+    events = asyncio.run(scenario())
+    names = [event.split("\n", 1)[0] for event in events]
+    assert names[0] in ("event: queued", "event: running")
+    assert names[-1] == "event: succeeded"
+    assert ": keep-alive" in names
+    assert len([name for name in names if name.startswith("event: ")]) == len(set(name for name in names if name.startswith("event: ")))
+    data = json.loads(events[-1].split("data: ", 1)[1])
+    assert data["result"] == {"n": 1}
+    assert "payload" not in data and "worker" not in data
+
+
+def test_events_for_unknown_job():
+    async def scenario():
+        queue = JobQueue(InMemoryJobStore(), Runner())
+        return [event async for event in queue.events("missing")]
+
+    assert asyncio.run(scenario()) == ['event: error\ndata: {"error": "Job not found"}\n\n']
+
+
+def test_queued_jobs_of_a_stopped_worker_are_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.3)
+    db = SqliteDatabase(str(tmp_path / "studio.db"))
+    store = SqliteJobStore(db)
+    store.heartbeat("stopped")
+    store.put(Job(id="queued", kind="ok", payload={"n": 1}, createdAt=time.time(), worker="stopped"))
+    store.put(Job(id="running", kind="ok", status="running", payload={"n": 2}, createdAt=time.time(), worker="stopped"))
+
+    async def scenario():
+        runner = Runner()
+        runner.gate.set()
+        queue = JobQueue(SqliteJobStore(db), runner, workers=1)
+        await queue.start()
+        # heartbeat가 남아 있는 동안은 가져가지 않는다
+        await asyncio.sleep(0.05)
+        assert (await queue.get("queued")).status == "queued"
+        results = [await queue.wait(job_id, 5) for job_id in ("queued", "running")]
+        await queue.stop()
+        return queue.worker_id, results
+
+    worker_id, (queued, running) = asyncio.run(scenario())
+    assert (queued.status, queued.result, queued.worker) == ("succeeded", {"n": 1}, worker_id)
+    assert (running.status, running.error) == ("failed", "Worker stopped while running the job")
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_stats_count_jobs_by_status(backend, tmp_path):
+    async def scenario():
+        runner = Runner()
+        runner.gate.set()
+        store = SqliteJobStore(SqliteDatabase(str(tmp_path / "studio.db"))) if backend == "sqlite" else InMemoryJobStore()
+        queue = JobQueue(store, runner, workers=1)
+        job = await queue.submit("ok", {"n": 1})
+        await queue.wait(job.id, 5)
+        stats = await queue.stats()
+        await queue.stop()
+        return stats
+
+    assert asyncio.run(scenario()) == {"workers": 1, "queued": 0, "jobs": {"succeeded": 1}}
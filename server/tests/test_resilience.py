@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from generation import GenerationGateway, GenerationUnavailableError
+from resilience import CircuitBreaker, RetryPolicy, TokenBucket
+
+
+class FakeBackend:
+    # 호출마다 outcomes에서 하나씩 꺼낸다: 예외면 던지고, "hang"이면 취소될 때까지 기다린다
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.started = asyncio.Event()
+
+    async def generate_content(self, model, contents):
+        self.calls += 1
+        self.started.set()
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if outcome == "hang":
+            await asyncio.sleep(3600)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+def make_gateway(backend, rate_limiter=None, breaker=None):
+    return GenerationGateway(
+        backend,
+        timeout=5,
+        retry=RetryPolicy(max_attempts=1, base_delay=0),
+        rate_limiter=rate_limiter or TokenBucket(rate_per_minute=0),
+        breaker=breaker or CircuitBreaker(failure_threshold=1, reset_timeout=0.05),
+    )
+
+
+async def open_circuit(gateway):
+    with pytest.raises(GenerationUnavailableError):
+        await gateway.generate_content("model", ["prompt"])
+    assert gateway.breaker.state == "open"
+    await asyncio.sleep(0.06)
+
+
+def test_probe_released_when_rate_limited_in_half_open():
+    async def scenario():
+        backend = FakeBackend(Unavailable(), "ok")
+        limiter = TokenBucket(rate_per_minute=0)
+        gateway = make_gateway(backend, rate_limiter=limiter)
+        await open_circuit(gateway)
+
+        # 토큰이 바닥난 상태: 거절되어도 시험 자리를 잡지 않아야 한다
+        limiter.rate = 1 / 60.0
+        limiter.tokens = 0.0
+        limiter._updated = time.monotonic()
+        with pytest.raises(GenerationUnavailableError):
+            await gateway.generate_content("model", ["prompt"], timeout=0.01)
+        assert not gateway.breaker._probing
+
+        limiter.rate = 0
+        assert await gateway.generate_content("model", ["prompt"]) == "ok"
+        assert gateway.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_probe_released_when_cancelled():
+    async def scenario():
+        backend = FakeBackend(Unavailable(), "hang", "ok")
+        gateway = make_gateway(backend)
+        await open_circuit(gateway)
+
+        backend.started.clear()
+        probe = asyncio.create_task(gateway.generate_content("model", ["prompt"]))
+        await backend.started.wait()
+        assert gateway.breaker.state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert not gateway.breaker._probing
+        assert await gateway.generate_content("model", ["prompt"]) == "ok"
+        assert gateway.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_only_one_probe_in_half_open():
+    async def scenario():
+        backend = FakeBackend(Unavailable(), "hang")
+        gateway = make_gateway(backend)
+        await open_circuit(gateway)
+
+        backend.started.clear()
+        probe = asyncio.create_task(gateway.generate_content("model", ["prompt"]))
+        await backend.started.wait()
+        with pytest.raises(GenerationUnavailableError):
+            await gateway.generate_content("model", ["prompt"])
+        assert backend.calls == 2
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_call_outside_half_open_keeps_probe():
+    async def scenario():
+        backend = FakeBackend("hang", Unavailable(), "hang")
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        gateway = GenerationGateway(
+            backend,
+            timeout=5,
+            concurrency=4,
+            retry=RetryPolicy(max_attempts=1, base_delay=0),
+            rate_limiter=TokenBucket(rate_per_minute=0),
+            breaker=breaker,
+        )
+        # closed 상태에서 시작된 호출이 나중에 취소되어도 다른 호출의 시험 자리를 풀면 안 된다
+        slow = asyncio.create_task(gateway.generate_content("model", ["prompt"]))
+        await backend.started.wait()
+        await open_circuit(gateway)
+
+        backend.started.clear()
+        probe = asyncio.create_task(gateway.generate_content("model", ["prompt"]))
+        await backend.started.wait()
+        slow.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+        assert breaker._probing
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not breaker._probing
+
+    asyncio.run(scenario())
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from google.genai import types
+
+import result_cache
+from result_cache import GenerationCache, generation_key
+
+
+def make_files(tmp_path, *sizes):
+    paths = []
+    for index, size in enumerate(sizes):
+        path = tmp_path / f"result_{index}.png"
+        path.write_bytes(b"x" * size)
+        paths.append(str(path))
+    return paths
+
+
+def test_generation_key_is_stable_for_equivalent_inputs():
+    blob = types.Part(inline_data=types.Blob(mime_type="image/png", data=b"\x89PNG..."))
+    key = generation_key("image-model", ["draw a cat", blob], "16:9")
+    # 문자열 프롬프트와 text Part는 같은 입력이다
+    assert generation_key("image-model", [types.Part(text="draw a cat"), blob], "16:9") == key
+    same_bytes = types.Part(inline_data=types.Blob(mime_type="image/png", data=bytes(b"\x89PNG...")))
+    assert generation_key("image-model", ["draw a cat", same_bytes], "16:9") == key
+
+    assert generation_key("image-model", ["draw a cat", blob], "1:1") != key
+    assert generation_key("other-model", ["draw a cat", blob], "16:9") != key
+    assert generation_key("image-model", ["draw a dog", blob], "16:9") != key
+    assert generation_key("image-model", ["draw a cat"], "16:9") != key
+    # 경계가 다른 같은 글자들은 다른 키 (길이를 같이 해싱)
+    assert generation_key("m", ["ab", "c"]) != generation_key("m", ["a", "bc"])
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = GenerationCache(str(tmp_path / "index.json"), max_entries=2)
+    a, b, c = make_files(tmp_path, 10, 10, 10)
+    cache.put("a", {"imageUrl": "a"}, [a])
+    cache.put("b", {"imageUrl": "b"}, [b])
+    assert cache.get("a") == {"imageUrl": "a"}
+    cache.put("c", {"imageUrl": "c"}, [c])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"imageUrl": "a"}
+    assert cache.get("c") == {"imageUrl": "c"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts_oldest_entries(tmp_path):
+    cache = GenerationCache(str(tmp_path / "index.json"), max_bytes=25)
+    a, b, c = make_files(tmp_path, 10, 10, 10)
+    cache.put("a", {}, [a])
+    cache.put("b", {}, [b])
+    cache.put("c", {}, [c])
+    assert cache.stats()["bytes"] == 20
+    assert cache.get("a") is None
+    assert sorted(cache.files()) == [b, c]
+
+
+def test_entry_with_missing_file_is_a_miss(tmp_path):
+    cache = GenerationCache(str(tmp_path / "index.json"))
+    (path,) = make_files(tmp_path, 10)
+    cache.put("a", {"imageUrl": "a"}, [path])
+    (tmp_path / "result_0.png").unlink()
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_writes_are_batched_on_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "GENERATION_CACHE_FLUSH_DELAY", 0.05)
+    index_path = tmp_path / "index.json"
+    cache = GenerationCache(str(index_path))
+    paths = make_files(tmp_path, *([10] * 10))
+    saves = []
+    save = cache._save
+    monkeypatch.setattr(cache, "_save", lambda entries: (saves.append(len(entries)), save(entries)))
+
+    async def scenario():
+        for index, path in enumerate(paths):
+            cache.put(f"k{index}", {"imageUrl": path}, [path])
+        # 지연 시간 안에는 아직 쓰지 않는다
+        assert saves == [] and not index_path.exists()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert saves == [10]
+    entries = json.loads(index_path.read_text())["entries"]
+    assert [key for key, _ in entries] == [f"k{index}" for index in range(10)]
+
+    # 다시 열면 순서(LRU)까지 복원된다
+    reopened = GenerationCache(str(index_path), max_entries=9)
+    assert reopened.get("k9") is not None
+    reopened.put("k10", {}, [paths[0]])
+    assert reopened.get("k0") is None
+
+
+def test_index_is_written_immediately_outside_the_event_loop(tmp_path):
+    index_path = tmp_path / "index.json"
+    cache = GenerationCache(str(index_path))
+    (path,) = make_files(tmp_path, 10)
+    cache.put("a", {"imageUrl": "a"}, [path])
+    assert [key for key, _ in json.loads(index_path.read_text())["entries"]] == ["a"]
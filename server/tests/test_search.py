@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import search
+from search import SearchIndex, tokenize
+
+
+def ids(results):
+    return [record_id for _, _, record_id in results]
+
+
+def test_hangul_is_indexed_as_syllable_bigrams():
+    assert tokenize("숲속으로", for_query=True) == ["숲속", "속으", "으로"]
+    # 색인할 때는 한 음절 검색어도 찾도록 unigram을 더 넣는다
+    assert tokenize("숲속으로") == ["숲속", "속으", "으로", "숲", "속", "으", "로"]
+    assert tokenize("숲", for_query=True) == ["숲"]
+    assert tokenize("Hero의 모험, round_2!", for_query=True) == ["hero", "의", "모험", "round", "2"]
+
+
+def test_particles_do_not_hide_hangul_matches():
+    index = SearchIndex()
+    index.add("storyboards", 1, "소녀가 숲속으로 달려간다")
+    index.add("storyboards", 2, "도시의 밤")
+    assert ids(index.search("숲속")[0]) == [1]
+    assert ids(index.search("숲")[0]) == [1]
+    assert ids(index.search("소녀")[0]) == [1]
+
+
+def test_bm25_ranks_by_frequency_length_and_rarity():
+    index = SearchIndex()
+    index.add("storyboards", 1, "dragon castle")
+    index.add("storyboards", 2, "dragon dragon dragon castle")
+    index.add("storyboards", 3, "dragon castle with a very long description of the surrounding forest and river")
+    assert ids(index.search("dragon")[0]) == [2, 1, 3]
+
+    # 드문 term이 더 무겁다: 둘 다 한 번씩이면 드문 term을 가진 문서가 앞선다
+    index.add("storyboards", 4, "castle knight")
+    index.add("storyboards", 5, "castle dragon")
+    results, total = index.search("castle knight")
+    assert (ids(results), total) == ([4], 1)
+    scores = {record_id: value for value, _, record_id in index.search("castle")[0]}
+    knight = index.search("knight")[0][0][0]
+    dragon = {record_id: value for value, _, record_id in index.search("dragon")[0]}
+    assert knight > dragon[5] and scores[4] == pytest.approx(scores[5])
+
+
+def test_threshold_top_k_matches_brute_force(monkeypatch):
+    rng = random.Random(7)
+    words = [f"w{i}" for i in range(30)]
+    index = SearchIndex()
+    for record_id in range(400):
+        text = " ".join(rng.choice(words[:5] if rng.random() < 0.5 else words) for _ in range(rng.randint(2, 30)))
+        index.add("storyboards" if record_id % 3 else "sketches", record_id, text)
+
+    def both(query, **kwargs):
+        monkeypatch.setattr(search, "EXHAUSTIVE_SCORING_LIMIT", 10 ** 9)
+        brute = index.search(query, **kwargs)
+        monkeypatch.setattr(search, "EXHAUSTIVE_SCORING_LIMIT", 0)
+        return brute, index.search(query, **kwargs)
+
+    for query in ("w0", "w1 w2", "w0 w3 w4", "w7"):
+        for kwargs in ({"limit": 10}, {"limit": 5, "offset": 5}, {"limit": 10, "kinds": {"sketches"}}):
+            (brute, brute_total), (fast, fast_total) = both(query, **kwargs)
+            assert fast_total == brute_total
+            assert [(kind, record_id) for _, kind, record_id in fast] == [(kind, record_id) for _, kind, record_id in brute]
+            assert [value for value, _, _ in fast] == pytest.approx([value for value, _, _ in brute])
+
+    # 임팩트 목록이 만들어진 뒤의 증분 추가/삭제도 같은 결과
+    for record_id in range(0, 400, 7):
+        index.remove("storyboards" if record_id % 3 else "sketches", record_id)
+    for record_id in range(400, 440):
+        index.add("storyboards", record_id, "w0 w1 " * rng.randint(1, 4))
+    for query in ("w0", "w0 w1"):
+        (brute, _), (fast, _) = both(query, limit=10)
+        assert ids(fast) == ids(brute)
+
+
+def test_add_replaces_and_remove_drops_documents():
+    index = SearchIndex()
+    index.add("characters", 1, "brave knight", character_ids=[1])
+    index.add("storyboards", 10, "the knight rides", character_ids=[1, 2])
+    index.add("storyboards", 11, "a quiet village", character_ids=[2])
+    assert index.search("knight")[1] == 2
+    assert ids(index.search("knight", kinds={"storyboards"})[0]) == [10]
+    assert ids(index.search("village", character_id=2)[0]) == [11]
+
+    # 같은 문서를 다시 넣으면 예전 텍스트와 캐릭터는 빠진다
+    index.add("storyboards", 10, "the dragon sleeps", character_ids=[3])
+    assert ids(index.search("knight")[0]) == [1]
+    assert ids(index.search("dragon", character_id=3)[0]) == [10]
+    assert index.search("dragon", character_id=1) == ([], 0)
+
+    index.remove("storyboards", 10)
+    index.remove("storyboards", 99)
+    assert index.search("dragon") == ([], 0)
+    assert len(index) == 2
+    assert index.stats()["terms"] == len(set(tokenize("brave knight a quiet village")))
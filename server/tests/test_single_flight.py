@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from generation import SingleFlight
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"imageUrl": "one.png"}
+
+        results = await asyncio.gather(*(flights.run("key", call) for _ in range(10)))
+        return calls, results, flights.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [{"imageUrl": "one.png"}] * 10
+    assert sorted(joined for _, joined in results) == [False] + [True] * 9
+    assert stats == {"inFlight": 0, "started": 1, "coalesced": 9}
+
+
+def test_different_keys_and_later_requests_call_again():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        await asyncio.gather(flights.run("a", call), flights.run("b", call))
+        # 끝난 호출에는 합류하지 않는다 (결과 재사용은 GenerationCache의 몫)
+        await flights.run("a", call)
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        finished = asyncio.Event()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            finished.set()
+            return "done"
+
+        first = asyncio.create_task(flights.run("key", call))
+        second = asyncio.create_task(flights.run("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        result = await second
+        return result, finished.is_set()
+
+    assert asyncio.run(scenario()) == (("done", True), True)
+
+
+def test_call_runs_to_completion_when_every_waiter_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        finished = asyncio.Event()
+
+        async def call():
+            await asyncio.sleep(0.03)
+            finished.set()
+            return "cached"
+
+        waiter = asyncio.create_task(flights.run("key", call))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.wait_for(finished.wait(), 1)
+        await asyncio.sleep(0)
+        return flights.stats()["inFlight"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_failure_is_shared_and_the_key_is_released():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError("model error")
+
+        results = await asyncio.gather(flights.run("key", call), flights.run("key", call), return_exceptions=True)
+        return results, flights.stats()["inFlight"]
+
+    results, in_flight = asyncio.run(scenario())
+    assert [str(error) for error in results] == ["model error", "model error"]
+    assert in_flight == 0
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import importlib
+import io
+import os
+
+import httpx
+import pytest
+from PIL import Image
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    # main은 작업 폴더 기준으로 data/, static/을 쓰므로 임시 폴더에서 import 한다
+    cwd = os.getcwd()
+    backend = os.environ.get("MODEL_BACKEND")
+    os.chdir(tmp_path_factory.mktemp("server"))
+    os.environ["MODEL_BACKEND"] = "fake"
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.chdir(cwd)
+        if backend is None:
+            os.environ.pop("MODEL_BACKEND")
+        else:
+            os.environ["MODEL_BACKEND"] = backend
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (200, 10, 10)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def request(main, method, url, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+
+    return asyncio.run(send())
+
+
+def multipart_chunks(body: bytes):
+    async def chunks():
+        yield body
+
+    return chunks()
+
+
+def test_multipart_upload_without_content_length_is_rejected(main):
+    body = b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n' + png_bytes() + b"\r\n--b--\r\n"
+    # 제너레이터 본문 → chunked 전송 (Content-Length 없음)
+    response = request(main, "POST", "/api/uploads", content=multipart_chunks(body), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 411
+
+
+def test_upload_over_the_size_limit_is_rejected(main, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_MAX_BYTES", 1024)
+    monkeypatch.setattr(main.blob_store, "writer", functools.partial(main.BlobStore.writer, main.blob_store, 1024))
+    big = png_bytes() + b"\0" * 4096
+
+    # 선언된 크기로 본문을 읽기 전에 거절
+    assert request(main, "POST", "/api/uploads", content=big, headers={"Content-Type": "image/png"}).status_code == 413
+    files = {"file": ("a.png", big, "image/png")}
+    assert request(main, "POST", "/api/uploads", files=files).status_code == 413
+    # 크기를 모르는 스트림은 한도를 넘는 순간 중단
+    assert request(main, "POST", "/api/uploads", content=multipart_chunks(big), headers={"Content-Type": "image/png"}).status_code == 413
+
+    small = request(main, "POST", "/api/uploads", content=png_bytes(), headers={"Content-Type": "image/png"})
+    assert small.status_code == 200
+    assert small.json()["mimeType"] == "image/png"
+
+
+def test_character_upload_is_sniffed(main):
+    response = request(main, "POST", "/api/characters", data={"name": "fake"}, files={"image": ("photo.exe", png_bytes(), "application/octet-stream")})
+    assert response.status_code == 200
+    image_url = response.json()["imageUrl"]
+    # 올린 파일명과 상관없이 실제 형식의 확장자로 저장한다
+    assert image_url.endswith(".png")
+    assert os.path.exists(os.path.join(main.IMAGES_DIR, image_url.rsplit("/images/", 1)[1]))
+
+    response = request(main, "POST", "/api/characters", data={"name": "text"}, files={"image": ("a.png", b"not an image", "image/png")})
+    assert response.status_code == 415
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+# --- 썸네일 설정 ---
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "128,256,512,1024").split(","))
+THUMBNAIL_LIST_WIDTH = int(os.getenv("THUMBNAIL_LIST_WIDTH", "256"))  # 목록 응답에 넣는 썸네일 폭
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "WEBP").upper()      # WEBP | JPEG
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+THUMBNAIL_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+THUMBNAIL_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+# 축소본을 만들 수 있는 원본 형식 (svg 같은 벡터 이미지는 원본을 그대로 쓴다)
+RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+
+class ThumbnailNotFound(Exception):
+    pass
+
+
+class ThumbnailUnsupported(Exception):
+    # 래스터 이미지가 아니거나 디코드할 수 없는 원본
+    pass
+
+
+class ThumbnailService:
+    # /static/images 아래 원본에서 폭별 축소본을 처음 요청될 때 만들어 디스크에 보관한다.
+    # 원본의 mtime/크기가 파일명에 들어가므로 원본이 바뀌면 새 축소본이 생긴다.
+    # 캐시 폴더 총 용량이 max_bytes를 넘으면 가장 오래 안 쓰인 것(mtime 기준)부터 지운다.
+    def __init__(
+        self,
+        source_dir: str,
+        cache_dir: str,
+        max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES,
+        image_format: str = THUMBNAIL_FORMAT,
+        quality: int = THUMBNAIL_QUALITY,
+    ):
+        if image_format not in THUMBNAIL_MIME_TYPES:
+            image_format = "WEBP"
+        self.source_dir = os.path.abspath(source_dir)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.quality = quality
+        self.media_type = THUMBNAIL_MIME_TYPES[image_format]
+        self.generated = 0
+        self.served = 0
+        self._total_bytes: Optional[int] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    async def get(self, width: int, filename: str) -> Tuple[str, str]:
+        # (축소본 경로, ETag)
+        if width not in THUMBNAIL_WIDTHS:
+            raise ValueError(f"Unsupported thumbnail width {width}; use one of {THUMBNAIL_WIDTHS}")
+        if not is_raster(filename):
+            raise ThumbnailUnsupported(filename)
+        source_path = os.path.abspath(os.path.join(self.source_dir, filename))
+        if not source_path.startswith(self.source_dir + os.sep):
+            raise ThumbnailNotFound(filename)
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            raise ThumbnailNotFound(filename)
+
+        digest = hashlib.sha1(f"{filename}|{st.st_mtime_ns}|{st.st_size}|{width}|{self.image_format}{self.quality}".encode("utf-8")).hexdigest()
+        etag = f'"{digest[:20]}"'
+        variant_path = os.path.join(self.cache_dir, str(width), digest[:2], digest + THUMBNAIL_EXTENSIONS[self.image_format])
+        self.served += 1
+
+        if os.path.exists(variant_path):
+            _touch(variant_path)
+            return variant_path, etag
+
+        # 같은 축소본을 동시에 요청하면 한 번만 만든다
+        pending = self._pending.get(variant_path)
+        if pending is None:
+            pending = asyncio.ensure_future(self._generate(source_path, variant_path, width))
+            self._pending[variant_path] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(variant_path, None))
+        await asyncio.shield(pending)
+        return variant_path, etag
+
+    async def _generate(self, source_path: str, variant_path: str, width: int):
+        size = await asyncio.to_thread(self._render, source_path, variant_path, width)
+        self.generated += 1
+        if self._total_bytes is None:
+            self._total_bytes = await asyncio.to_thread(_directory_size, self.cache_dir)
+        else:
+            self._total_bytes += size
+        if self._total_bytes > self.max_bytes:
+            self._total_bytes = await asyncio.to_thread(self._evict)
+
+    def _render(self, source_path: str, variant_path: str, width: int) -> int:
+        try:
+            image = Image.open(source_path)
+            image.load()
+        except (Image.UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            raise ThumbnailUnsupported(os.path.basename(source_path)) from e
+        with image:
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            if self.image_format == "JPEG":
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+            tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+            image.save(tmp_path, format=self.image_format, quality=self.quality)
+        os.replace(tmp_path, variant_path)
+        return os.path.getsize(variant_path)
+
+    def _evict(self) -> int:
+        # 용량의 90%까지 오래된 것부터 삭제
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "served": self.served,
+            "generated": self.generated,
+            "bytes": self._total_bytes,
+            "maxBytes": self.max_bytes,
+        }
+
+
+def thumbnail_url(image_url: Optional[str], images_url: str, thumbs_url: str, width: int = THUMBNAIL_LIST_WIDTH) -> Optional[str]:
+    # 이 서버의 static 래스터 이미지일 때만 썸네일 URL을 만든다 (기본 이미지 default.svg는 제외)
+    if not image_url or not image_url.startswith(images_url + "/") or not is_raster(image_url):
+        return None
+    return f"{thumbs_url}/{width}/{image_url[len(images_url) + 1:]}"
+
+
+def is_raster(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in RASTER_EXTENSIONS
+
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
@@ -22,7 +22,9 @@ interface StoryboardScene {
 interface Sketch {
   id: number;
   name: string;
-  dataUrl: string;
+  dataUrl?: string | null;
+  blobId?: string | null;
+  imageUrl?: string | null;
   createdAt: string;
 }
 
@@ -369,7 +371,10 @@ export default function Home() {
       });
 
       if (response.ok) {
-        const updatedSketches = [...sketches, newSketch];
+        // 서버는 이미지를 blob으로 옮기고 blobId/imageUrl을 돌려준다
+        const data = await response.json();
+        const savedSketch: Sketch = data.success ? { ...data.sketch, dataUrl } : newSketch;
+        const updatedSketches = [...sketches, savedSketch];
         setSketches(updatedSketches);
         // 백업용 localStorage도 업데이트
         localStorage.setItem('sketches', JSON.stringify(updatedSketches));
@@ -391,7 +396,7 @@ export default function Home() {
 
   const selectSketch = (sketch: Sketch) => {
     setSelectedSketch(sketch);
-    setKeyImage(sketch.dataUrl);
+    setKeyImage(sketch.imageUrl || sketch.dataUrl || null);
     setStoryboard([]);
     setSelectedScene(null);
   };
@@ -472,8 +477,10 @@ export default function Home() {
 
     setIsLoading(true);
     try {
+      // 서버에 저장된 스케치는 base64 대신 asset id로 배경을 보낸다
+      const sketchAssetId = selectedSketch?.blobId && keyImage === selectedSketch.imageUrl ? selectedSketch.blobId : null;
       const requestData = {
-        backgroundImage: keyImage,
+        ...(sketchAssetId ? { backgroundAssetId: sketchAssetId } : { backgroundImage: keyImage }),
         characters: draggedCharacters.map(dc => ({
           character: dc.character,
           x: dc.x,
@@ -925,7 +932,7 @@ export default function Home() {
                       className={`bg-gray-800 p-2 rounded-lg flex items-start cursor-pointer hover:bg-gray-700 transition-colors ${selectedSketch?.id === sketch.id ? 'ring-2 ring-orange-400' : ''}`}
                     >
                       <div className="relative w-12 h-12 mr-3 flex-shrink-0 bg-white rounded">
-                        <Image src={sketch.dataUrl} alt={sketch.name} fill style={{ objectFit: 'contain' }} className="rounded" />
+                        <Image src={sketch.imageUrl || sketch.dataUrl || ''} alt={sketch.name} fill style={{ objectFit: 'contain' }} className="rounded" />
                       </div>
                       <div className="flex-1 min-w-0">
                         <p className="text-sm font-medium text-white truncate">{sketch.name}</p>